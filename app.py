@@ -1,43 +1,86 @@
 # -*- coding: utf-8 -*-
 import os
-import io
 from datetime import datetime, date, timedelta
-import pytz
+# pandas (the session's lead frame) and st_aggrid (the grid) are used on
+# every run of this page, so they are imported here; heavier imports only
+# some code paths need (plotly.express, openpyxl) stay with that code
 import pandas as pd
-import numpy as np
 import streamlit as st
+import perf
+import sqlprofile
 from st_aggrid import AgGrid, GridOptionsBuilder, GridUpdateMode, DataReturnMode, JsCode
 
 from db import (
     init_db,
     get_engine_session,
     fetch_leads_df,
+    fetch_lead_changes,
+    fetch_lead_history,
+    current_change_seq,
+    get_lead,
+    LeadConflictError,
+    replace_lead_rows,
     insert_lead,
     update_leads_bulk,
     update_single_lead,
     import_initial_from_excel,
     import_from_csv_mapped,
     import_from_excel_mapped,
+    preview_import,
+    commit_import,
     ensure_category_values,
+    EXPORT_HEADERS,
     remove_duplicate_leads,
 )
+from archive import (
+    ARCHIVE_CONVERTED_AFTER_MONTHS,
+    archive_leads,
+    archive_size,
+    count_archive_candidates,
+    restore_leads,
+    search_archive,
+)
+import backup
+import export
+import maintenance
+import options
+import scoring
+import snapshot
+import views
 from utils import (
     slovak_tz_now_date,
     normalize_df_columns,
     clean_dataframe_for_db,
     badges_counts,
     parse_date_safe,
-    categories_from_db,
-    unique_sorted,
+    validate_new_lead,
+    STAV_LEADU_VALUES,
+    PRIORITA_VALUES,
 )
 
 st.set_page_config(page_title="REMARK CRM - Leads", page_icon="📋", layout="wide")
+perf.begin_run("app")
 
 TZ = "Europe/Bratislava"
 
 # Initialize DB and seed from Excel once
+perf.section("app.init")
 engine, SessionLocal = get_engine_session()
-init_db(engine)
+
+
+@st.cache_resource(show_spinner=False)
+def init_database(url: str) -> None:
+    # schema checks once per server process, not on every rerun
+    init_db(engine)
+
+
+init_database(str(engine.url))
+if snapshot.SNAPSHOT_ENABLED:
+    snapshot.attach(SessionLocal)
+backup.maybe_run_scheduled()
+if not backup.is_running():
+    # a vacuum during the backup would only make it restart
+    maintenance.maybe_run_scheduled(SessionLocal)
 
 # Seed from Excel if table is empty
 excel_default_path = "/data/CRM_leads_REMARK_FIXED.xlsx"
@@ -46,14 +89,83 @@ try:
 except Exception as e:
     st.error(f"Import z Excelu zlyhal: {e}")
 
+
+def load_leads_df(force: bool = False) -> pd.DataFrame:
+    """Return this session's lead frame, merging in only the leads changed
+    since its last change sequence number (full read on first use).
+
+    With snapshots on, the base frame is the process-wide memory-mapped
+    snapshot whenever it is at least as new as the session's own frame.
+    """
+    if snapshot.SNAPSHOT_ENABLED:
+        snap = snapshot.read(SessionLocal, "leads")
+        if snap is not None and (force or "df_all" not in st.session_state
+                                 or snap[0] >= st.session_state["leads_seq"]):
+            st.session_state["df_all"], st.session_state["leads_seq"] = snap[1], snap[0]
+            force = False
+    delta = None
+    if not force and "df_all" in st.session_state:
+        delta = fetch_lead_changes(SessionLocal, st.session_state["leads_seq"])
+    if delta is None:
+        seq = current_change_seq(SessionLocal)
+        st.session_state["df_all"] = fetch_leads_df(SessionLocal)
+        st.session_state["leads_seq"] = seq
+        snapshot.request_publish(SessionLocal)
+        return st.session_state["df_all"]
+    records, deleted, seq = delta
+    if records or deleted:
+        st.session_state["df_all"] = replace_lead_rows(st.session_state["df_all"], records, deleted)
+        # the snapshot is behind (e.g. a write from another process)
+        snapshot.request_publish(SessionLocal)
+    st.session_state["leads_seq"] = seq
+    return st.session_state["df_all"]
+
+
+def refresh_leads(ids) -> pd.DataFrame:
+    """Re-read ``ids`` via the lead cache and patch them into the session frames."""
+    recs, missing = [], []
+    for rid in ids:
+        rec = get_lead(SessionLocal, rid)
+        if rec:
+            recs.append(rec)
+        else:
+            missing.append(int(rid))
+    for key in ["df_all", "last_grid_df"]:
+        frame = st.session_state.get(key)
+        if frame is not None:
+            st.session_state[key] = replace_lead_rows(frame, recs, missing)
+    return load_leads_df()
+
+
+def forget_lead_form(rid) -> None:
+    """Drop the detail panel's state of lead ``rid`` (form values, the version
+    they were loaded from, a conflict notice) so it is built from the current
+    row again; called after this session wrote the lead."""
+    suffix = f"_{rid}"
+    for key in [k for k in st.session_state if isinstance(k, str) and k.endswith(suffix)]:
+        del st.session_state[key]
+
+
+def selected_lead_id(grid_response):
+    """Id of the selected grid row (AgGrid returns a list or a DataFrame)."""
+    sel = grid_response.get("selected_rows")
+    if sel is None:
+        return None
+    if isinstance(sel, pd.DataFrame):
+        return None if sel.empty else int(sel.iloc[0]["id"])
+    return int(sel[0]["id"]) if len(sel) else None
+
+
 # Ensure no duplicate leads exist
+perf.section("app.dedup")
 remove_duplicate_leads(SessionLocal)
 
 # Top header
 st.title("📋 REMARK CRM – Leads")
 
 # Info badges (next steps)
-df_all = fetch_leads_df(SessionLocal)
+perf.section("app.load_badges")
+df_all = load_leads_df()
 today = slovak_tz_now_date()
 
 overdue, today_cnt, next7 = badges_counts(df_all, today)
@@ -67,42 +179,108 @@ badge_html = f"""
 """
 st.markdown(badge_html, unsafe_allow_html=True)
 
+# --- Call list (highest score first, one indexed query) ---
+perf.section("app.call_list")
+with st.expander("📞 Komu volať dnes", expanded=False):
+    top = scoring.top_leads_to_call(SessionLocal, n=10)
+    if top:
+        st.dataframe(
+            pd.DataFrame(top).drop(columns=["id"]).rename(columns={
+                "meno_zakaznika": "Meno", "telefon": "Telefón", "email": "Email", "priorita": "Priorita",
+                "stav_leadu": "Stav", "dalsi_krok": "Ďalší krok", "datum_dalsieho_kroku": "Termín", "score": "Skóre",
+            }),
+            hide_index=True, use_container_width=True,
+        )
+    else:
+        st.caption("Žiadne otvorené leady.")
+
 # --- Controls row ---
+perf.section("app.controls")
 c1, c2, c3, c4, c5 = st.columns([1,1,1,1,2])
 with c1:
     st.caption("Full‑text vyhľadávanie")
-    quick_search = st.text_input("Hľadať", placeholder="meno, email, mesto, poznámky ...", label_visibility="collapsed")
+    quick_search = st.text_input("Hľadať", placeholder="meno, email, mesto, poznámky ...", label_visibility="collapsed",
+                                 key="quick_search")
 with c2:
     if st.button("➕ Nový lead", use_container_width=True):
         st.session_state["show_new_lead_modal"] = True
 with c3:
     uploaded_file = st.file_uploader("Import Excel/CSV", type=["xlsx","xls","csv"], accept_multiple_files=False, label_visibility="collapsed")
-    if uploaded_file is not None:
+    # an upload is parsed once into a preview; the report below writes the
+    # parsed rows when the user confirms
+    if uploaded_file is None:
+        st.session_state.pop("import_preview", None)
+    elif uploaded_file.file_id not in (st.session_state.get("import_preview", {}).get("file_id"),
+                                       st.session_state.get("import_closed")):
         try:
-            name = uploaded_file.name.lower()
-            if name.endswith((".xls", ".xlsx")):
-                imported, skipped = import_from_excel_mapped(SessionLocal, uploaded_file)
-            else:
-                imported, skipped = import_from_csv_mapped(SessionLocal, uploaded_file)
-            remove_duplicate_leads(SessionLocal)
-            st.success(f"Importované: {imported}, Preskočené: {skipped}")
-            df_all = fetch_leads_df(SessionLocal)
+            preview = preview_import(SessionLocal, uploaded_file, uploaded_file.name)
         except Exception as e:
             st.error(f"Import zlyhal: {e}")
+            st.session_state["import_closed"] = uploaded_file.file_id
+        else:
+            preview["file_id"] = uploaded_file.file_id
+            st.session_state["import_preview"] = preview
 with c4:
     # quick refresh
     if st.button("🔁 Obnoviť", use_container_width=True):
-        df_all = fetch_leads_df(SessionLocal)
+        df_all = load_leads_df()
 with c5:
     st.caption("Pozn.: Môžete tiež vložiť súbor 'leads.xlsx' alebo 'leads.csv' do /mnt/data a obnoviť stránku.")
 
+# --- Import report ---
+import_preview = st.session_state.get("import_preview")
+if import_preview is not None:
+    report = import_preview["report"]
+    with st.container(border=True):
+        st.markdown(f"#### 📥 Kontrola importu: {import_preview['source']}")
+        m1, m2, m3, m4, m5 = st.columns(5)
+        m1.metric("Riadkov", report["rows"])
+        m2.metric("Na import", report["to_import"])
+        m3.metric("Už v databáze", report["duplicates_in_db"])
+        m4.metric("Duplicity v súbore", report["duplicates_in_file"])
+        m5.metric("Bez mena (preskočia sa)", report["missing_name"])
+        if report["unmapped"]:
+            st.warning("Nepriradené stĺpce (ignorujú sa): " + ", ".join(report["unmapped"]))
+        problems = (
+            [f"{col}: {n}× neplatný dátum, uloží sa prázdny" for col, n in report["bad_dates"].items()]
+            + [f"{col}: {n}× neplatné číslo, uloží sa prázdne" for col, n in report["bad_numbers"].items()]
+            + [f"{col}: {n}× neznáma hodnota, uloží sa bez zmeny" for col, n in report["unknown_values"].items()]
+        )
+        if problems:
+            st.warning("\n".join(f"- {p}" for p in problems))
+        with st.expander("Priradenie stĺpcov a príklady chýb", expanded=False):
+            st.dataframe(pd.DataFrame(report["columns"], columns=["Stĺpec v súbore", "Stĺpec v databáze"]),
+                         hide_index=True, use_container_width=True)
+            for line in report["examples"]:
+                st.caption(line)
+        b1, b2 = st.columns(2)
+        if b1.button(f"✅ Importovať {report['to_import']} leadov", type="primary",
+                     disabled=not report["to_import"], use_container_width=True):
+            try:
+                imported, skipped = commit_import(SessionLocal, import_preview)
+            except Exception as e:
+                st.error(f"Import zlyhal: {e}")
+            else:
+                remove_duplicate_leads(SessionLocal)
+                st.session_state["import_closed"] = import_preview["file_id"]
+                st.session_state.pop("import_preview", None)
+                st.session_state["import_result"] = (imported, skipped)
+                st.rerun()
+        if b2.button("Zrušiť import", use_container_width=True):
+            st.session_state["import_closed"] = import_preview["file_id"]
+            st.session_state.pop("import_preview", None)
+            st.rerun()
+import_result = st.session_state.pop("import_result", None)
+if import_result is not None:
+    st.success(f"Importované: {import_result[0]}, Preskočené: {import_result[1]}")
+
 # Auto-import from default Excel path if available and not imported yet in this session
 default_excel_path = "/data/leads.xlsx"
 if os.path.exists(default_excel_path) and not st.session_state.get("auto_excel_import_done"):
     import_from_excel_mapped(SessionLocal, default_excel_path)
     remove_duplicate_leads(SessionLocal)
     st.session_state["auto_excel_import_done"] = True
-    df_all = fetch_leads_df(SessionLocal)
+    df_all = load_leads_df()
 
 # Auto-import from default CSV path if available
 default_csv_path = "/data/leads.csv"
@@ -110,46 +288,140 @@ if os.path.exists(default_csv_path) and not st.session_state.get("auto_csv_impor
     import_from_csv_mapped(SessionLocal, default_csv_path)
     remove_duplicate_leads(SessionLocal)
     st.session_state["auto_csv_import_done"] = True
-    df_all = fetch_leads_df(SessionLocal)
+    df_all = load_leads_df()
 
 # --- Filter panel ---
+perf.section("app.filters")
+SORT_COLUMNS = ["score", "datum_dalsieho_kroku", "datum_povodneho_kontaktu", "priorita", "stav_leadu",
+                "meno_zakaznika", "mesto", "orientacna_cena"]
+SORT_LABELS = {**EXPORT_HEADERS, "score": "Skóre"}
+
+
+def panel_filters():
+    return {col: st.session_state.get(f"f_{col}") or [] for col in views.FILTER_COLUMNS}
+
+
+def panel_sort():
+    col = st.session_state.get("f_sort_col")
+    return [(col, "desc" if st.session_state.get("f_sort_desc") else "asc")] if col else []
+
+
+# callbacks run before the widgets are created, so they may set their values
+def apply_view():
+    view_id = st.session_state.get("active_view")
+    view = views.get_view(SessionLocal, view_id) if view_id is not None else None
+    if view is None:
+        return
+    cats = options.filter_options(SessionLocal, st.session_state["leads_seq"])
+    for col in views.FILTER_COLUMNS:
+        st.session_state[f"f_{col}"] = [v for v in view["filters"].get(col, []) if v in cats[col]]
+    st.session_state["quick_search"] = view["search"]
+    sort_col, direction = view["sort"][0] if view["sort"] else (None, "asc")
+    st.session_state["f_sort_col"] = sort_col if sort_col in SORT_COLUMNS else None
+    st.session_state["f_sort_desc"] = direction == "desc"
+    st.session_state["view_name"] = view["name"]
+
+
+def save_view():
+    try:
+        view_id = views.save_view(SessionLocal, st.session_state.get("view_name", ""), panel_filters(),
+                                  st.session_state.get("quick_search"), panel_sort())
+    except ValueError as e:
+        st.toast(str(e))
+        return
+    st.session_state["active_view"] = view_id
+    st.toast("Pohľad uložený")
+
+
+def delete_view():
+    view_id = st.session_state.get("active_view")
+    if view_id is not None:
+        views.delete_view(SessionLocal, view_id)
+        st.session_state["active_view"] = None
+        st.toast("Pohľad zmazaný")
+
+
+saved_views = {v["id"]: v for v in views.list_views(SessionLocal)}
+if st.session_state.get("active_view") not in saved_views:
+    # deleted, possibly from another session
+    st.session_state["active_view"] = None
+
 with st.expander("🔎 Filtery", expanded=False):
-    # category values from DB
-    cats = categories_from_db(df_all)
+    # category values from DB (cached until the next write)
+    cats = options.filter_options(SessionLocal, st.session_state["leads_seq"])
+
+    colv1, colv2, colv3, colv4 = st.columns([2, 2, 1, 1])
+    with colv1:
+        st.selectbox("Uložený pohľad", options=list(saved_views), format_func=lambda i: saved_views[i]["name"],
+                     index=None, placeholder="— žiadny —", key="active_view", on_change=apply_view)
+    with colv2:
+        st.text_input("Názov pohľadu", key="view_name", placeholder="napr. Bratislava – Open, Vysoká")
+    with colv3:
+        st.caption(" ")
+        st.button("💾 Uložiť pohľad", on_click=save_view, use_container_width=True)
+    with colv4:
+        st.caption(" ")
+        st.button("🗑️ Zmazať pohľad", on_click=delete_view, use_container_width=True,
+                  disabled=st.session_state.get("active_view") is None)
 
     colf1, colf2, colf3, colf4, colf5 = st.columns(5)
     with colf1:
-        f_stav_leadu = st.multiselect("Stav leadu", options=cats["stav_leadu"], default=[])
+        f_stav_leadu = st.multiselect("Stav leadu", options=cats["stav_leadu"], key="f_stav_leadu")
     with colf2:
-        f_priorita = st.multiselect("Priorita", options=cats["priorita"], default=[])
+        f_priorita = st.multiselect("Priorita", options=cats["priorita"], key="f_priorita")
     with colf3:
-        f_typ = st.multiselect("Typ dopytu", options=cats["typ_dopytu"], default=[])
+        f_typ = st.multiselect("Typ dopytu", options=cats["typ_dopytu"], key="f_typ_dopytu")
     with colf4:
-        f_mesto = st.multiselect("Mesto", options=cats["mesto"], default=[])
-    # Odstránený filter rozsah (colf5)
+        f_mesto = st.multiselect("Mesto", options=cats["mesto"], key="f_mesto")
+    with colf5:
+        st.selectbox("Zoradiť podľa", options=SORT_COLUMNS, format_func=SORT_LABELS.get, index=None,
+                     placeholder="—", key="f_sort_col")
+        st.checkbox("zostupne", key="f_sort_desc")
 
 # Apply filters and full-text
-df = df_all.copy()
-if f_stav_leadu:
-    df = df[df["stav_leadu"].isin(f_stav_leadu)]
-if f_priorita:
-    df = df[df["priorita"].isin(f_priorita)]
-if f_typ:
-    df = df[df["typ_dopytu"].isin(f_typ)]
-if f_mesto:
-    df = df[df["mesto"].isin(f_mesto)]
-# Odstránený filter podľa dátumu
-#
-if quick_search:
-    q = quick_search.lower().strip()
-    if q:
-        mask = pd.Series(False, index=df.index)
-        for col in ["meno_zakaznika","telefon","email","mesto","typ_dopytu","stav_projektu","reakcia_zakaznika","dalsi_krok","poznamky"]:
-            if col in df.columns:
-                mask = mask | df[col].fillna("").str.lower().str.contains(q)
-        df = df[mask]
+active_view = saved_views.get(st.session_state.get("active_view"))
+sort_spec = panel_sort()
+if active_view is not None and views.matches_view(active_view, panel_filters(), quick_search, sort_spec):
+    # unchanged saved view: its cached id set instead of filtering the frame
+    view_ids = views.view_ids(SessionLocal, active_view, st.session_state["leads_seq"])
+    df = df_all[df_all["id"].isin(view_ids)]
+    perf.count("frame_copies")
+else:
+    df = df_all.copy()
+    perf.count("frame_copies")
+    if f_stav_leadu:
+        df = df[df["stav_leadu"].isin(f_stav_leadu)]
+    if f_priorita:
+        df = df[df["priorita"].isin(f_priorita)]
+    if f_typ:
+        df = df[df["typ_dopytu"].isin(f_typ)]
+    if f_mesto:
+        df = df[df["mesto"].isin(f_mesto)]
+    # Odstránený filter podľa dátumu
+    #
+    if quick_search:
+        q = quick_search.lower().strip()
+        if q:
+            mask = pd.Series(False, index=df.index)
+            for col in ["meno_zakaznika","telefon","email","mesto","typ_dopytu","stav_projektu","reakcia_zakaznika","dalsi_krok","poznamky"]:
+                if col in df.columns:
+                    mask = mask | df[col].fillna("").str.lower().str.contains(q, regex=False)
+            df = df[mask]
+
+# --- Export of the filtered rows ---
+perf.section("app.export")
+export_cond = export.lead_filter(f_stav_leadu, f_priorita, f_typ, f_mesto, quick_search)
+ce1, ce2, _ = st.columns([1, 1, 4])
+with ce1:
+    # built only when clicked (deferred), straight from SQL in chunks
+    st.download_button("⬇️ Export CSV", lambda: export.export_file(SessionLocal, export_cond, "csv"),
+                       file_name=f"leady_{date.today():%Y%m%d}.csv", mime=export.CSV_MIME, on_click="ignore")
+with ce2:
+    st.download_button("⬇️ Export Excel", lambda: export.export_file(SessionLocal, export_cond, "xlsx"),
+                       file_name=f"leady_{date.today():%Y%m%d}.xlsx", mime=export.XLSX_MIME, on_click="ignore")
 
 # Editable fields inline
+perf.section("app.grid_build")
 editable_cols = ["stav_leadu","priorita","stav_projektu","dalsi_krok","datum_dalsieho_kroku","poznamky","nasa_ponuka_orientacna"]
 
 # Build AgGrid
@@ -161,15 +433,21 @@ gb.configure_default_column(
 )
 
 # Select editors for certain columns based on unique values from DB
-stav_leadu_opts = unique_sorted(df_all["stav_leadu"].dropna().tolist() + ["Open","Cold","Converted","Lost"])
-priorita_opts = unique_sorted(df_all["priorita"].dropna().tolist() + ["Vysoká","Stredná","Nízka"])
-stav_proj_opts = unique_sorted(df_all["stav_projektu"].dropna().tolist())
-typ_dopytu_opts = unique_sorted(df_all["typ_dopytu"].dropna().tolist())
+editor_opts = options.editor_options(SessionLocal, st.session_state["leads_seq"])
+stav_leadu_opts = editor_opts["stav_leadu"]
+priorita_opts = editor_opts["priorita"]
+stav_proj_opts = editor_opts["stav_projektu"]
+typ_dopytu_opts = editor_opts["typ_dopytu"]
 
 # Configure columns
 for col in df.columns:
     if col == "id":
         gb.configure_column(col, header_name="ID", hide=True)
+    elif col in ["version", "updated_at"]:
+        gb.configure_column(col, hide=True)
+    elif col == "score":
+        # stored by scoring.py; sort by it instead of by priorita + dates
+        gb.configure_column(col, header_name="Skóre", type=["numericColumn","numberColumnFilter"], editable=False)
     elif col in ["nasa_ponuka_orientacna","orientacna_cena","cena_konkurencie"]:
         gb.configure_column(col, type=["numericColumn","numberColumnFilter","customNumericFormat"], valueFormatter="value==null? '': value.toLocaleString()")
     elif col in ["datum_povodneho_kontaktu","datum_dalsieho_kroku","datum_realizacie"]:
@@ -242,11 +520,20 @@ gb.configure_grid_options(getRowStyle=row_style_js)
 gb.configure_column("datum_dalsieho_kroku", cellStyle=date_cell_style_js)
 
 grid_options = gb.build()
+# initial sort of the panel / saved view; the user can re-sort in the grid
+for sort_index, (sort_col, direction) in enumerate(sort_spec):
+    for col_def in grid_options["columnDefs"]:
+        if col_def.get("field") == sort_col:
+            col_def.update(sort=direction, sortIndex=sort_index)
 
 # Keep cache of last df for change detection
 if "last_grid_df" not in st.session_state:
     st.session_state["last_grid_df"] = df.copy()
 
+perf.section("app.grid_render")
+if perf.ENABLED:
+    perf.count("aggrid_rows", len(df))
+    perf.count("aggrid_bytes", len(df.to_json(orient="records", date_format="iso")))
 grid_resp = AgGrid(
     df,
     gridOptions=grid_options,
@@ -258,8 +545,10 @@ grid_resp = AgGrid(
     allow_unsafe_jscode=True
 )
 
+perf.section("app.inline_edits")
 current_df = pd.DataFrame(grid_resp["data"])
-selected_rows = grid_resp.get("selected_rows", [])
+perf.count("frame_copies")
+selected_id = selected_lead_id(grid_resp)
 
 # Detect inline edits by comparing current_df to last_grid_df for editable columns
 try:
@@ -282,21 +571,45 @@ try:
         consolidated = {}
         for upd in updates:
             rid = upd["id"]
-            consolidated.setdefault(rid, {"id": rid})
+            if rid not in consolidated:
+                consolidated[rid] = {"id": rid}
+                # only write if nobody saved the row since it was loaded
+                if "version" in prev.columns and pd.notna(prev.at[rid, "version"]):
+                    consolidated[rid]["version"] = int(prev.at[rid, "version"])
             consolidated[rid].update(upd)
         update_payload = list(consolidated.values())
         if update_payload:
-            updated_n = update_leads_bulk(SessionLocal, update_payload)
+            conflicts = []
+            updated_n = update_leads_bulk(SessionLocal, update_payload, conflicts=conflicts)
             if updated_n > 0:
                 st.toast(f"Uložené inline zmeny: {updated_n}", icon="✅")
-                # refresh df_all
-                df_all = fetch_leads_df(SessionLocal)
+            if conflicts:
+                st.warning(
+                    "Niektoré riadky medzitým upravil niekto iný, vaše zmeny v nich neboli uložené (ID: "
+                    + ", ".join(str(c["id"]) for c in conflicts) + ")."
+                )
+            if updated_n > 0 or conflicts:
+                # patch only the edited rows into df_all
+                df_all = refresh_leads([u["id"] for u in update_payload])
+                # current_df becomes the base of the next diff; give it the
+                # versions just written, or the next edit of a row conflicts
+                if "version" in current_df.columns:
+                    versions = df_all.set_index("id")["version"]
+                    for i in current_df.index[current_df["id"].isin(list(consolidated))]:
+                        rid = int(current_df.at[i, "id"])
+                        if rid in versions.index:
+                            current_df.at[i, "version"] = int(versions[rid])
+                stale_ids = {int(c["id"]) for c in conflicts}
+                for rid in consolidated:
+                    if rid not in stale_ids:
+                        forget_lead_form(rid)
 except Exception as e:
     st.warning(f"Problém pri ukladaní inline zmien: {e}")
 
-st.session_state["last_grid_df"] = current_df.copy()
+st.session_state["last_grid_df"] = current_df
 
 # --- Detail panel ---
+perf.section("app.detail")
 st.markdown("---")
 left, right = st.columns([2,1], gap="large")
 
@@ -307,9 +620,12 @@ with left:
 
 with right:
     st.subheader("Detail / Rýchle akcie")
-    if selected_rows:
-        row = selected_rows[0]
-        rid = int(row["id"])
+    row = get_lead(SessionLocal, selected_id) if selected_id is not None else None
+    if row:
+        rid = row["id"]
+        # Version the form values were loaded from; saves are conditional on
+        # it.  The session's own writes reset it (forget_lead_form).
+        st.session_state.setdefault(f"ver_{rid}", row["version"])
         with st.form(f"detail_{rid}", clear_on_submit=False):
             st.text_input("Meno zákazníka", key=f"meno_{rid}", value=row.get("meno_zakaznika",""))
             st.text_input("Telefón", key=f"tel_{rid}", value=row.get("telefon",""))
@@ -334,6 +650,7 @@ with right:
             if saved:
                 payload = {
                     "id": rid,
+                    "version": st.session_state[f"ver_{rid}"],
                     "meno_zakaznika": st.session_state[f"meno_{rid}"],
                     "telefon": st.session_state[f"tel_{rid}"],
                     "email": st.session_state[f"email_{rid}"],
@@ -353,9 +670,28 @@ with right:
                     "datum_realizacie": st.session_state.get(f"dr_{rid}"),
                     "poznamky": st.session_state.get(f"poz_{rid}"),
                 }
-                update_single_lead(SessionLocal, payload)
-                st.success("Uložené")
-                st.experimental_rerun()
+                try:
+                    update_single_lead(SessionLocal, payload)
+                except LeadConflictError as e:
+                    st.session_state[f"conflict_{rid}"] = e.current
+                else:
+                    forget_lead_form(rid)
+                    refresh_leads([rid])
+                    st.success("Uložené")
+                    st.rerun()
+
+        conflict = st.session_state.get(f"conflict_{rid}")
+        if conflict is not None:
+            changed_at = conflict.get("updated_at")
+            st.warning(
+                "Lead medzitým uložil niekto iný"
+                + (f" ({changed_at:%Y-%m-%d %H:%M} UTC)" if changed_at else "")
+                + ". Vaše zmeny neboli uložené."
+            )
+            if st.button("Načítať aktuálnu verziu", key=f"btn_reload_{rid}"):
+                forget_lead_form(rid)
+                refresh_leads([rid])
+                st.rerun()
 
         # Quick actions
         st.markdown("#### ⚡ Rýchle akcie")
@@ -364,21 +700,35 @@ with right:
             new_status = st.selectbox("Zmeniť stav", stav_leadu_opts, index=(stav_leadu_opts.index(row.get("stav_leadu")) if row.get("stav_leadu") in stav_leadu_opts else 0), key=f"qa_stav_{rid}")
             if st.button("Uložiť stav", key=f"btn_stav_{rid}", use_container_width=True):
                 update_single_lead(SessionLocal, {"id": rid, "stav_leadu": new_status})
-                st.experimental_rerun()
+                forget_lead_form(rid)
+                refresh_leads([rid])
+                st.rerun()
         with qa2:
             dk = st.text_input("Ďalší krok", value=row.get("dalsi_krok",""), key=f"qa_dk_{rid}")
             dkd = st.date_input("Dátum kroku", value=parse_date_safe(row.get("datum_dalsieho_kroku")), key=f"qa_dkd_{rid}")
             if st.button("Nastaviť krok", key=f"btn_krok_{rid}", use_container_width=True):
                 update_single_lead(SessionLocal, {"id": rid, "dalsi_krok": dk, "datum_dalsieho_kroku": dkd})
-                st.experimental_rerun()
+                forget_lead_form(rid)
+                refresh_leads([rid])
+                st.rerun()
         with qa3:
             if st.button("✅ Konvertovať", key=f"btn_conv_{rid}", type="primary", use_container_width=True):
                 update_single_lead(SessionLocal, {"id": rid, "stav_leadu": "Converted", "datum_realizacie": date.today()})
-                st.experimental_rerun()
+                forget_lead_form(rid)
+                refresh_leads([rid])
+                st.rerun()
+
+        with st.expander("🕓 História zmien", expanded=False):
+            history = fetch_lead_history(SessionLocal, rid)
+            if history:
+                st.dataframe(pd.DataFrame(history), hide_index=True, use_container_width=True)
+            else:
+                st.caption("Zatiaľ bez zaznamenaných zmien.")
     else:
         st.info("Vyberte riadok v tabuľke pre zobrazenie detailu a akcií.")
 
 # --- New lead dialog ---
+perf.section("app.new_lead")
 if st.session_state.get("show_new_lead_modal"):
     @st.dialog("Nový lead")
     def new_lead_dialog():
@@ -399,46 +749,41 @@ if st.session_state.get("show_new_lead_modal"):
             reak = st.text_area("Reakcia zákazníka")
             dalsi = st.text_input("Ďalší krok")
             ddk = st.date_input("Dátum ďalšieho kroku", value=None)
-            prio = st.selectbox("Priorita", ["Vysoká","Stredná","Nízka"], index=1)
-            stavlead = st.selectbox("Stav leadu", ["Open","Cold","Converted","Lost"], index=0)
+            prio = st.selectbox("Priorita", PRIORITA_VALUES, index=1)
+            stavlead = st.selectbox("Stav leadu", STAV_LEADU_VALUES, index=0)
             oc = st.number_input("Orientačná cena", min_value=0.0, step=100.0)
             dr = st.date_input("Dátum realizácie", value=None)
             poz = st.text_area("Poznámky")
             submit = st.form_submit_button("Uložiť")
             if submit:
-                errors = []
-                if not meno.strip():
-                    errors.append("Meno zákazníka je povinné.")
-                if not tel.strip() and not email.strip():
-                    errors.append("Uveďte telefón alebo email.")
-                if not dpc:
-                    errors.append("Dátum pôvodného kontaktu je povinný.")
+                payload = dict(
+                    meno_zakaznika=meno.strip(),
+                    telefon=tel.strip(),
+                    email=email.strip(),
+                    mesto=mesto.strip(),
+                    typ_dopytu=typ.strip(),
+                    datum_povodneho_kontaktu=dpc,
+                    stav_projektu=stavproj.strip(),
+                    konkurencia=konkur.strip(),
+                    cena_konkurencie=cena_k,
+                    nasa_ponuka_orientacna=nasa,
+                    reakcia_zakaznika=reak.strip(),
+                    dalsi_krok=dalsi.strip(),
+                    datum_dalsieho_kroku=ddk,
+                    priorita=prio,
+                    stav_leadu=stavlead,
+                    orientacna_cena=oc,
+                    datum_realizacie=dr,
+                    poznamky=poz.strip(),
+                )
+                errors = validate_new_lead(payload)
                 if errors:
                     for e in errors:
                         st.error(e)
                 else:
-                    payload = dict(
-                        meno_zakaznika=meno.strip(),
-                        telefon=tel.strip(),
-                        email=email.strip(),
-                        mesto=mesto.strip(),
-                        typ_dopytu=typ.strip(),
-                        datum_povodneho_kontaktu=dpc,
-                        stav_projektu=stavproj.strip(),
-                        konkurencia=konkur.strip(),
-                        cena_konkurencie=cena_k,
-                        nasa_ponuka_orientacna=nasa,
-                        reakcia_zakaznika=reak.strip(),
-                        dalsi_krok=dalsi.strip(),
-                        datum_dalsieho_kroku=ddk,
-                        priorita=prio,
-                        stav_leadu=stavlead,
-                        orientacna_cena=oc,
-                        datum_realizacie=dr,
-                        poznamky=poz.strip(),
-                    )
                     rid = insert_lead(SessionLocal, payload)
                     if rid:
+                        refresh_leads([rid])
                         st.success("Lead pridaný.")
                         st.session_state["show_new_lead_modal"] = False
                         st.rerun()
@@ -464,9 +809,87 @@ with st.form("Pridať nový lead"):
         }
         rid = insert_lead(SessionLocal, payload)
         if rid:
+            refresh_leads([rid])
             st.success("Lead pridaný!")
         else:
             st.warning("Lead nebol pridaný (duplicita).")
 
+# --- Archive ---
+perf.section("app.archive")
+with st.expander("🗄️ Archív uzavretých leadov", expanded=False):
+    st.caption(
+        "Lost leady a Converted leady staršie ako zvolený počet mesiacov sa presúvajú do archívu. "
+        "Archív zostáva v štatistikách (Summary) a dá sa prehľadávať."
+    )
+    ca1, ca2, ca3 = st.columns([1, 1, 2])
+    with ca1:
+        arch_months = st.number_input("Converted starší ako (mesiace)", min_value=0, step=1,
+                                      value=ARCHIVE_CONVERTED_AFTER_MONTHS)
+    with ca2:
+        policy = dict(converted_after_months=int(arch_months))
+        st.metric("Kandidáti", count_archive_candidates(SessionLocal, **policy))
+        if st.button("Archivovať teraz", use_container_width=True):
+            moved = archive_leads(SessionLocal, **policy)
+            st.success(f"Archivované: {moved}")
+            df_all = load_leads_df()
+    with ca3:
+        st.metric("V archíve", archive_size(SessionLocal))
+    arch_q = st.text_input("Hľadať v archíve", placeholder="meno, telefón, email, mesto, poznámky ...")
+    if arch_q:
+        found = search_archive(SessionLocal, arch_q)
+        if found:
+            st.dataframe(pd.DataFrame(found), hide_index=True, use_container_width=True)
+            restore_id = st.selectbox("Obnoviť lead z archívu", [None] + [r["id"] for r in found],
+                                      format_func=lambda v: "—" if v is None else f"ID {v}")
+            if restore_id is not None and st.button("♻️ Obnoviť do leadov"):
+                restore_leads(SessionLocal, [restore_id])
+                st.rerun()
+        else:
+            st.caption("Nič sa nenašlo.")
+
+# --- Backups ---
+perf.section("app.backup")
+with st.expander("💾 Zálohy databázy", expanded=False):
+    st.caption(
+        f"Online záloha po častiach (aplikácia medzitým beží ďalej), kontrola integrity kópie, "
+        f"ponecháva sa posledných {backup.BACKUP_KEEP} záloh v {backup.BACKUP_DIR}."
+    )
+    if backup.is_running():
+        st.info("Záloha práve prebieha …")
+    elif st.button("Zálohovať teraz"):
+        backup.start_backup()
+        st.info("Záloha spustená na pozadí.")
+    if backup.last_error:
+        st.error(f"Posledná záloha zlyhala: {backup.last_error}")
+    elif backup.last_result:
+        res = backup.last_result
+        st.caption(
+            f"Posledná záloha: {res['pages']} strán za {res['seconds']:.2f} s "
+            f"({res['pages_per_s']:.0f} strán/s), najdlhšia pauza {res['max_pause_ms']:.1f} ms, "
+            f"integrita {res['integrity']}"
+        )
+    backups = backup.list_backups()
+    if backups:
+        st.dataframe(
+            pd.DataFrame([
+                {"Záloha": b["name"], "Veľkosť (MB)": round(b["bytes"] / 1e6, 1), "Vytvorená": b["mtime"]}
+                for b in backups
+            ]),
+            hide_index=True, use_container_width=True,
+        )
+        chosen = st.selectbox("Stiahnuť zálohu", [None] + [b["name"] for b in backups],
+                              format_func=lambda v: "—" if v is None else v)
+        if chosen is not None:
+            # the file is only read when a backup is picked, not on every rerun
+            with open(os.path.join(backup.BACKUP_DIR, chosen), "rb") as fh:
+                st.download_button("⬇️ Stiahnuť", fh.read(), file_name=chosen,
+                                   mime="application/vnd.sqlite3")
+    else:
+        st.caption("Zatiaľ žiadne zálohy.")
+
 st.caption("⏱️ Časová zóna: Europe/Bratislava")
-st.write("Počet leadov v DB:", fetch_leads_df(SessionLocal).shape[0])
+st.write("Počet leadov v DB:", load_leads_df().shape[0])
+
+perf.render_panel(st)
+sqlprofile.render_panel(st)
+perf.end_run()
@@ -0,0 +1,166 @@
+# -*- coding: utf-8 -*-
+"""Archiving of closed leads.
+
+Lost leads and leads converted long ago are moved from the hot ``leads``
+table into ``leads_archive`` (same columns, original ids kept).  The grid,
+dedup pass and badge counts then only pay for the working set, while the
+Summary page reads both tables through the ``leads_all`` view and the
+archive stays searchable.
+
+Usage from the command line::
+
+    python archive.py --months 12          # archive by the default policy
+    python archive.py --dry-run            # only print how many would move
+"""
+import argparse
+import os
+from datetime import date
+from typing import Any, Dict, List, Optional
+
+from sqlalchemy import DateTime, and_, delete, insert, literal, or_, select
+from sqlalchemy.orm.session import Session
+
+from db import ArchivedLead, Lead, lead_to_dict, run_write, run_write_chunks, _touch, _utcnow
+
+# Converted leads older than this many months are archived (by datum_realizacie,
+# falling back to the last update for leads without a realisation date).
+ARCHIVE_CONVERTED_AFTER_MONTHS = int(os.environ.get("REMARK_CRM_ARCHIVE_MONTHS", "12"))
+
+_LEAD_COLUMNS = [c.name for c in Lead.__table__.columns]
+
+SEARCH_COLUMNS = ["meno_zakaznika", "telefon", "email", "mesto", "poznamky"]
+
+
+def _months_ago(today: date, months: int) -> date:
+    year, month = divmod(today.year * 12 + today.month - 1 - months, 12)
+    return date(year, month + 1, min(today.day, 28))
+
+
+def archive_filter(today: date, archive_lost: bool = True,
+                   converted_after_months: Optional[int] = ARCHIVE_CONVERTED_AFTER_MONTHS):
+    """SQL condition selecting the leads the policy wants archived."""
+    conditions = []
+    if archive_lost:
+        conditions.append(Lead.stav_leadu == "Lost")
+    if converted_after_months is not None:
+        cutoff = _months_ago(today, converted_after_months)
+        conditions.append(and_(
+            Lead.stav_leadu == "Converted",
+            or_(
+                Lead.datum_realizacie < cutoff,
+                and_(Lead.datum_realizacie.is_(None), Lead.updated_at < cutoff),
+            ),
+        ))
+    return or_(*conditions) if conditions else None
+
+
+def count_archive_candidates(SessionLocal, today: Optional[date] = None, **policy) -> int:
+    cond = archive_filter(today or date.today(), **policy)
+    if cond is None:
+        return 0
+    session: Session = SessionLocal()
+    try:
+        return session.query(Lead.id).filter(cond).count()
+    finally:
+        session.close()
+
+
+def archive_leads(SessionLocal, today: Optional[date] = None, batch_size: int = 500, **policy) -> int:
+    """Move leads matching the policy into ``leads_archive``.
+
+    Each batch is copied with ``INSERT ... SELECT`` and deleted from
+    ``leads`` in one transaction, so a lead is always in exactly one table.
+    Batches go through the write queue at bulk priority.  Returns the number
+    of archived leads.
+    """
+    cond = archive_filter(today or date.today(), **policy)
+    if cond is None:
+        return 0
+    session: Session = SessionLocal()
+    try:
+        ids = [rid for (rid,) in session.query(Lead.id).filter(cond).order_by(Lead.id)]
+    finally:
+        session.close()
+    return sum(run_write_chunks(SessionLocal, _archive_batch_tx, ids, batch_size))
+
+
+def _archive_batch_tx(session: Session, chunk: List[int]) -> int:
+    src_cols = [Lead.__table__.c[name] for name in _LEAD_COLUMNS]
+    archived_at = literal(_utcnow(), DateTime)
+    session.execute(
+        insert(ArchivedLead).from_select(
+            _LEAD_COLUMNS + ["archived_at"],
+            select(*src_cols, archived_at).where(Lead.id.in_(chunk)),
+        )
+    )
+    moved = session.execute(delete(Lead).where(Lead.id.in_(chunk))).rowcount
+    _touch(session, chunk)
+    return moved
+
+
+def restore_leads(SessionLocal, ids: List[int]) -> int:
+    """Move archived leads back into ``leads``.
+
+    A lead keeps its id unless an older database reused it for a new lead
+    meanwhile; then it gets a fresh one.
+    """
+    return run_write(SessionLocal, _restore_tx, ids)
+
+
+def _restore_tx(session: Session, ids: List[int]) -> int:
+    rows = session.query(ArchivedLead).filter(ArchivedLead.id.in_(ids)).all()
+    taken = {rid for (rid,) in session.query(Lead.id).filter(Lead.id.in_(ids))}
+    for row in rows:
+        data = {name: getattr(row, name) for name in _LEAD_COLUMNS}
+        if row.id in taken:
+            data.pop("id")
+        session.add(Lead(**data))
+        session.delete(row)
+    _touch(session, ids)
+    return len(rows)
+
+
+def search_archive(SessionLocal, query: str, limit: int = 200) -> List[Dict[str, Any]]:
+    """Case-insensitive substring search over the archive (newest first)."""
+    q = (query or "").strip()
+    session: Session = SessionLocal()
+    try:
+        stmt = session.query(ArchivedLead)
+        if q:
+            pattern = f"%{q}%"
+            stmt = stmt.filter(or_(*[getattr(ArchivedLead, c).ilike(pattern) for c in SEARCH_COLUMNS]))
+        rows = stmt.order_by(ArchivedLead.archived_at.desc()).limit(limit).all()
+        return [dict(lead_to_dict(r), archived_at=r.archived_at) for r in rows]
+    finally:
+        session.close()
+
+
+def archive_size(SessionLocal) -> int:
+    session: Session = SessionLocal()
+    try:
+        return session.query(ArchivedLead.id).count()
+    finally:
+        session.close()
+
+
+def main(argv=None):
+    from db import get_engine_session, init_db
+
+    parser = argparse.ArgumentParser(description="Archivácia uzavretých leadov")
+    parser.add_argument("--months", type=int, default=ARCHIVE_CONVERTED_AFTER_MONTHS,
+                        help="archivovať Converted leady staršie ako N mesiacov")
+    parser.add_argument("--keep-lost", action="store_true", help="nearchivovať Lost leady")
+    parser.add_argument("--dry-run", action="store_true", help="len vypísať počet kandidátov")
+    args = parser.parse_args(argv)
+
+    engine, SessionLocal = get_engine_session()
+    init_db(engine)
+    policy = dict(archive_lost=not args.keep_lost, converted_after_months=args.months)
+    if args.dry_run:
+        print(f"Kandidáti na archiváciu: {count_archive_candidates(SessionLocal, **policy)}")
+    else:
+        print(f"Archivované: {archive_leads(SessionLocal, **policy)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,302 @@
+# -*- coding: utf-8 -*-
+"""Online backups of the CRM database.
+
+Copies the live database with SQLite's online backup API a few pages at a
+time, so the app keeps reading and writing in between: a step holds the
+read lock only while it copies ``pages`` pages, then the writer gets the
+file for ``sleep`` seconds.  Every run reports pages/second and the longest
+step (the longest time writers had to wait).  The copy is checked with
+``PRAGMA integrity_check`` before it replaces anything, and only the
+newest ``REMARK_CRM_BACKUP_KEEP`` copies are kept.
+
+Usage from the command line::
+
+    python backup.py                 # back up now
+    python backup.py --list          # existing backups
+    python backup.py --verify PATH   # integrity check of a copy
+
+The app calls :func:`maybe_run_scheduled` on every rerun; it starts a
+background backup when the newest one is older than
+``REMARK_CRM_BACKUP_HOURS`` (default 24, 0 disables the schedule).
+Replicas sharing the backup directory take turns through an ``flock`` on
+``.backup.lock`` in it; each copy is written to its own temporary file.
+"""
+import argparse
+import logging
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+from contextlib import contextmanager, suppress
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+from db import DB_PATH
+
+try:
+    import fcntl
+except ImportError:  # Windows: only the in-process guard applies
+    fcntl = None
+
+log = logging.getLogger("remark_crm.backup")
+
+BACKUP_DIR = os.environ.get("REMARK_CRM_BACKUP_DIR") or os.path.join(os.path.dirname(DB_PATH), "backups")
+BACKUP_KEEP = int(os.environ.get("REMARK_CRM_BACKUP_KEEP", "7"))
+BACKUP_INTERVAL_HOURS = float(os.environ.get("REMARK_CRM_BACKUP_HOURS", "24"))
+
+PAGES_PER_STEP = 256
+STEP_SLEEP_S = 0.02
+# every write from another connection restarts the copy; after this many
+# restarts the rest is copied in one step instead of chasing the writers
+MAX_RESTARTS = 5
+
+_PREFIX = "remark_crm-"
+_SUFFIX = ".db"
+# flock()ed while a backup runs, so replicas sharing BACKUP_DIR take turns
+_LOCK_NAME = ".backup.lock"
+
+
+class BackupError(Exception):
+    """The copy could not be made or failed verification."""
+
+
+class BackupBusy(BackupError):
+    """Another process is backing up into the same directory."""
+
+
+class _Restart(Exception):
+    pass
+
+
+def _backup_name(now: datetime) -> str:
+    return f"{_PREFIX}{now.strftime('%Y%m%d-%H%M%S')}{_SUFFIX}"
+
+
+@contextmanager
+def _directory_lock(directory: str):
+    """Exclusive lock on ``directory`` across processes; raises
+    :class:`BackupBusy` instead of waiting when another one holds it."""
+    os.makedirs(directory, exist_ok=True)
+    fd = os.open(os.path.join(directory, _LOCK_NAME), os.O_RDWR | os.O_CREAT, 0o644)
+    try:
+        if fcntl is not None:
+            try:
+                fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                raise BackupBusy(f"Do {directory} práve zálohuje iný proces.") from None
+        yield
+    finally:
+        # closing the descriptor releases the lock
+        os.close(fd)
+
+
+def _remove_quietly(path: str) -> None:
+    with suppress(FileNotFoundError):
+        os.remove(path)
+
+
+def list_backups(directory: str = BACKUP_DIR) -> List[Dict[str, Any]]:
+    """Existing backups, newest first, as dicts with path, size and mtime."""
+    if not os.path.isdir(directory):
+        return []
+    found = []
+    for name in os.listdir(directory):
+        if name.startswith(_PREFIX) and name.endswith(_SUFFIX):
+            path = os.path.join(directory, name)
+            try:
+                st = os.stat(path)
+            except FileNotFoundError:
+                # pruned by another process meanwhile
+                continue
+            found.append({"path": path, "name": name, "bytes": st.st_size,
+                          "mtime": datetime.fromtimestamp(st.st_mtime)})
+    found.sort(key=lambda b: b["name"], reverse=True)
+    return found
+
+
+def verify_backup(path: str) -> str:
+    """Run ``PRAGMA integrity_check`` on ``path``; returns "ok" or the first problem."""
+    conn = sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+    try:
+        return conn.execute("PRAGMA integrity_check").fetchone()[0]
+    finally:
+        conn.close()
+
+
+def prune_backups(directory: str = BACKUP_DIR, keep: int = BACKUP_KEEP) -> List[str]:
+    """Delete all but the newest ``keep`` backups; returns the deleted paths."""
+    removed = []
+    for b in list_backups(directory)[max(keep, 1):]:
+        _remove_quietly(b["path"])
+        removed.append(b["path"])
+    return removed
+
+
+def run_backup(db_path: str = DB_PATH, directory: str = BACKUP_DIR, keep: int = BACKUP_KEEP,
+               pages: int = PAGES_PER_STEP, sleep: float = STEP_SLEEP_S,
+               only_if_due: bool = False) -> Optional[Dict[str, Any]]:
+    """Copy ``db_path`` into ``directory`` and return the run's statistics.
+
+    Raises :class:`BackupError` when the copy fails the integrity check; the
+    previous backups are left untouched in that case.  Only one process
+    backs up into a directory at a time, the others get :class:`BackupBusy`.
+    With ``only_if_due`` the schedule is checked again under that lock and
+    None is returned when another process has just made the backup.
+    """
+    with _directory_lock(directory):
+        if only_if_due and not backup_due(directory):
+            return None
+        return _copy(db_path, directory, keep, pages, sleep)
+
+
+def _copy(db_path: str, directory: str, keep: int, pages: int, sleep: float) -> Dict[str, Any]:
+    final = os.path.join(directory, _backup_name(datetime.now()))
+    fd, tmp = tempfile.mkstemp(prefix=os.path.basename(final) + ".", suffix=".tmp", dir=directory)
+    os.close(fd)
+    stats = {"steps": 0, "restarts": 0, "max_pause_ms": 0.0, "pages": 0}
+    last = {"t": None, "remaining": None}
+
+    def progress(status, remaining, total):
+        # the source lock is held from the end of the previous callback to now
+        pause = (time.perf_counter() - last["t"]) * 1000
+        stats["max_pause_ms"] = max(stats["max_pause_ms"], pause)
+        stats["steps"] += 1
+        stats["pages"] = total
+        if last["remaining"] is not None and remaining > last["remaining"]:
+            stats["restarts"] += 1
+            if stats["restarts"] > MAX_RESTARTS:
+                raise _Restart()
+        last["remaining"] = remaining
+        # sqlite3's own ``sleep`` only applies to busy steps; yield the
+        # file to writers between every step instead
+        if remaining and sleep:
+            time.sleep(sleep)
+        last["t"] = time.perf_counter()
+
+    src = sqlite3.connect(f"file:{db_path}?mode=ro", uri=True, timeout=30)
+    dst = sqlite3.connect(tmp)
+    t0 = time.perf_counter()
+    try:
+        last["t"] = t0
+        try:
+            src.backup(dst, pages=pages, progress=progress)
+        except _Restart:
+            t_step = time.perf_counter()
+            src.backup(dst, pages=-1)
+            stats["max_pause_ms"] = max(stats["max_pause_ms"], (time.perf_counter() - t_step) * 1000)
+        elapsed = time.perf_counter() - t0
+    except Exception:
+        dst.close()
+        _remove_quietly(tmp)
+        raise
+    finally:
+        src.close()
+    dst.close()
+
+    integrity = verify_backup(tmp)
+    if integrity != "ok":
+        _remove_quietly(tmp)
+        raise BackupError(f"Kontrola integrity zálohy zlyhala: {integrity}")
+    os.replace(tmp, final)
+    removed = prune_backups(directory, keep)
+
+    result = dict(
+        stats,
+        path=final,
+        bytes=os.path.getsize(final),
+        seconds=round(elapsed, 3),
+        pages_per_s=round(stats["pages"] / elapsed, 1) if elapsed else None,
+        max_pause_ms=round(stats["max_pause_ms"], 2),
+        integrity=integrity,
+        pruned=len(removed),
+    )
+    log.info("Záloha %s: %d strán za %.2f s (%.0f strán/s), najdlhšia pauza %.1f ms, reštarty %d",
+             final, result["pages"], elapsed, result["pages_per_s"] or 0, result["max_pause_ms"], result["restarts"])
+    return result
+
+
+# --- Scheduling ---
+
+_running = threading.Lock()
+last_result: Optional[Dict[str, Any]] = None
+last_error: Optional[str] = None
+
+
+def backup_due(directory: str = BACKUP_DIR, interval_hours: float = BACKUP_INTERVAL_HOURS) -> bool:
+    if interval_hours <= 0:
+        return False
+    backups = list_backups(directory)
+    if not backups:
+        return True
+    return (datetime.now() - backups[0]["mtime"]).total_seconds() >= interval_hours * 3600
+
+
+def start_backup(db_path: str = DB_PATH, directory: str = BACKUP_DIR, **kwargs) -> bool:
+    """Run a backup in a background thread; False when one is already running
+    in this process (one running in another process is reported through
+    :data:`last_error`, or skipped silently with ``only_if_due``)."""
+    if not _running.acquire(blocking=False):
+        return False
+
+    def work():
+        global last_result, last_error
+        try:
+            result = run_backup(db_path, directory, **kwargs)
+            if result is not None:
+                last_result, last_error = result, None
+        except BackupBusy as e:
+            log.info("%s", e)
+            if not kwargs.get("only_if_due"):
+                last_error = str(e)
+        except Exception as e:
+            last_error = f"{type(e).__name__}: {e}"
+            log.exception("Záloha zlyhala")
+        finally:
+            _running.release()
+
+    threading.Thread(target=work, name="remark-backup", daemon=True).start()
+    return True
+
+
+def is_running() -> bool:
+    return _running.locked()
+
+
+def maybe_run_scheduled(db_path: str = DB_PATH, directory: str = BACKUP_DIR) -> bool:
+    """Start a background backup if the schedule says one is due."""
+    if not os.path.exists(db_path) or is_running() or not backup_due(directory):
+        return False
+    return start_backup(db_path, directory, only_if_due=True)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Online záloha databázy CRM")
+    parser.add_argument("--db", default=DB_PATH)
+    parser.add_argument("--dir", default=BACKUP_DIR, help="adresár záloh")
+    parser.add_argument("--keep", type=int, default=BACKUP_KEEP, help="počet ponechaných záloh")
+    parser.add_argument("--pages", type=int, default=PAGES_PER_STEP, help="strán na jeden krok")
+    parser.add_argument("--sleep", type=float, default=STEP_SLEEP_S, help="pauza medzi krokmi (s)")
+    parser.add_argument("--list", action="store_true", help="vypísať existujúce zálohy")
+    parser.add_argument("--verify", metavar="PATH", help="len skontrolovať integritu zálohy")
+    args = parser.parse_args(argv)
+
+    if args.list:
+        for b in list_backups(args.dir):
+            print(f"{b['name']}  {b['bytes'] / 1e6:8.1f} MB")
+        return
+    if args.verify:
+        print(verify_backup(args.verify))
+        return
+    try:
+        res = run_backup(args.db, args.dir, keep=args.keep, pages=args.pages, sleep=args.sleep)
+    except BackupBusy as e:
+        raise SystemExit(str(e))
+    print(
+        f"{res['path']}: {res['pages']} strán, {res['seconds']:.2f} s, {res['pages_per_s']} strán/s, "
+        f"najdlhšia pauza {res['max_pause_ms']:.1f} ms, reštarty {res['restarts']}, integrita {res['integrity']}"
+    )
+
+
+if __name__ == "__main__":
+    main()
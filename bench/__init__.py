@@ -0,0 +1,5 @@
+# -*- coding: utf-8 -*-
+"""Benchmark suite: synthetic Slovak leads and timings of the hot paths.
+
+See :mod:`bench.run` and :mod:`bench.compare`.
+"""
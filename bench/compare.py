@@ -0,0 +1,51 @@
+# -*- coding: utf-8 -*-
+"""Compare two benchmark result files.
+
+    python -m bench.compare bench/results/abc123.json bench/results/def456.json
+
+Exits with status 1 when a case got slower than ``--threshold`` (relative,
+on the median), so it can guard CI or a pre-merge check.
+"""
+import argparse
+import json
+import sys
+
+
+def _load(path):
+    with open(path, encoding="utf-8") as fh:
+        data = json.load(fh)
+    return data.get("meta", {}), {
+        (r["case"], r["size"]): r for r in data["results"] if "median_s" in r
+    }
+
+
+def compare(base, new, threshold=0.2):
+    """Return rows ``(case, size, base_s, new_s, ratio, regressed)``."""
+    rows = []
+    for key in sorted(set(base) & set(new)):
+        b, n = base[key]["median_s"], new[key]["median_s"]
+        ratio = n / b if b else float("inf")
+        rows.append((key[0], key[1], b, n, ratio, ratio > 1 + threshold))
+    return rows
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Porovnanie výsledkov benchmarku")
+    parser.add_argument("base")
+    parser.add_argument("new")
+    parser.add_argument("--threshold", type=float, default=0.2,
+                        help="povolené relatívne spomalenie (0.2 = 20 %%)")
+    args = parser.parse_args(argv)
+
+    base_meta, base = _load(args.base)
+    new_meta, new = _load(args.new)
+    print(f"base: {base_meta.get('revision')}  new: {new_meta.get('revision')}")
+    rows = compare(base, new, args.threshold)
+    for case, size, b, n, ratio, regressed in rows:
+        flag = "  REGRESSION" if regressed else ""
+        print(f"{case:28s} {size:>8d} {b * 1000:10.1f} ms -> {n * 1000:10.1f} ms  x{ratio:5.2f}{flag}")
+    sys.exit(1 if any(r[5] for r in rows) else 0)
+
+
+if __name__ == "__main__":
+    main()
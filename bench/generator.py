@@ -0,0 +1,168 @@
+# -*- coding: utf-8 -*-
+"""Deterministic generator of realistic Slovak leads.
+
+The same ``seed`` and ``n`` always give the same leads, so timings from
+different commits are comparable.  A controlled share of the leads are
+duplicates of earlier ones (at least two of name/phone/email/first contact
+date match, the rule of :func:`db.is_duplicate_lead`).
+"""
+import csv
+import random
+from datetime import date, timedelta
+from typing import Any, Dict, List
+
+from sqlalchemy import insert
+
+FIRST_NAMES = [
+    "Ján", "Peter", "Jozef", "Martin", "Tomáš", "Ľubomír", "Miroslav", "Dušan", "Štefan", "Ondrej",
+    "Mária", "Anna", "Zuzana", "Katarína", "Eva", "Ľudmila", "Jana", "Veronika", "Lenka", "Andrea",
+]
+LAST_NAMES = [
+    "Novák", "Horváth", "Kováč", "Varga", "Tóth", "Nagy", "Baláž", "Szabó", "Molnár", "Lukáč",
+    "Šimko", "Čierny", "Ďurica", "Hudák", "Krajčí", "Múdry", "Žitný", "Bartoš", "Šťastný", "Polák",
+]
+CITIES = [
+    "Bratislava", "Košice", "Prešov", "Žilina", "Nitra", "Banská Bystrica", "Trnava", "Trenčín",
+    "Martin", "Poprad", "Prievidza", "Zvolen", "Považská Bystrica", "Michalovce", "Piešťany",
+]
+TYP_DOPYTU = ["Kuchyňa", "Šatník", "Obývačka", "Kúpeľňa", "Detská izba", "Kancelária", "Predsieň", "Spálňa"]
+STAV_PROJEKTU = ["Dopyt", "Obhliadka", "Návrh", "Cenová ponuka", "Vyjednávanie", "Realizácia"]
+KONKURENCIA = ["Sconto", "IKEA", "Decodom", "Lokálny stolár", "Kuchyne Mária", None]
+DALSI_KROK = ["Zavolať", "Poslať ponuku", "Obhliadka u zákazníka", "Stretnutie v showroome", "Follow-up email"]
+PRIORITA = ["Vysoká", "Stredná", "Nízka"]
+STAV_LEADU = ["Open", "Cold", "Converted", "Lost"]
+STAV_WEIGHTS = [0.5, 0.2, 0.15, 0.15]
+NOTE_WORDS = (
+    "zákazník chce dubové dvierka so skrytými úchytkami a pracovnú dosku z kompaktu "
+    "rozmer miestnosti treba premerať termín montáže najskôr na jar rozpočet flexibilný "
+    "porovnáva s konkurenciou požaduje spotrebiče Bosch a osvetlenie pod skrinkami"
+).split()
+
+# Column headers understood by db.import_from_excel_mapped / import_from_csv_mapped
+EXCEL_HEADERS = {
+    "meno_zakaznika": "Meno zákazníka",
+    "telefon": "Telefón",
+    "email": "Email",
+    "mesto": "Mesto",
+    "typ_dopytu": "Typ dopytu",
+    "datum_povodneho_kontaktu": "Dátum pôvodného kontaktu",
+    "stav_projektu": "Stav projektu",
+    "konkurencia": "Kto je konkurencia",
+    "cena_konkurencie": "Cena konkurencie",
+    "nasa_ponuka_orientacna": "Naša ponuka (orientačná)",
+    "reakcia_zakaznika": "Reakcia zákazníka",
+    "dalsi_krok": "Dohodnutý ďalší krok",
+    "datum_dalsieho_kroku": "Dátum ďalšieho kroku",
+    "priorita": "Priorita",
+    "stav_leadu": "Stav leadu",
+    "orientacna_cena": "Orientačná cena (€)",
+    "datum_realizacie": "Dátum realizácie",
+    "poznamky": "Poznámky",
+}
+CSV_HEADERS = {
+    "meno_zakaznika": "Meno",
+    "email": "Email",
+    "telefon": "Phone",
+    "datum_povodneho_kontaktu": "Vytovorene",
+}
+
+ASCII = str.maketrans("áäčďéíľĺňóôŕšťúýžÁÄČĎÉÍĽĹŇÓÔŔŠŤÚÝŽ", "aacdeillnoorstuyzAACDEILLNOORSTUYZ")
+
+
+def _phone(rng: random.Random) -> str:
+    digits = f"9{rng.randint(0, 99999999):08d}"
+    variant = rng.randrange(4)
+    if variant == 0:
+        return f"0{digits}"
+    if variant == 1:
+        return f"0{digits[:3]} {digits[3:6]} {digits[6:]}"
+    if variant == 2:
+        return f"+421 {digits[:3]} {digits[3:6]} {digits[6:]}"
+    return f"+421{digits}"
+
+
+def _note(rng: random.Random, long_share: float = 0.2) -> str:
+    words = rng.randint(60, 200) if rng.random() < long_share else rng.randint(3, 15)
+    return " ".join(rng.choice(NOTE_WORDS) for _ in range(words)).capitalize() + "."
+
+
+def generate_leads(n: int, seed: int = 42, duplicate_rate: float = 0.05,
+                   today: date = date(2025, 6, 1)) -> List[Dict[str, Any]]:
+    """Return ``n`` lead payloads (DB column names, dates as ``date``)."""
+    rng = random.Random(seed)
+    leads: List[Dict[str, Any]] = []
+    for i in range(n):
+        if leads and rng.random() < duplicate_rate:
+            # same name + one contact: a duplicate by the >= 2 field rule
+            src = rng.choice(leads)
+            dup = dict(src)
+            dup["poznamky"] = _note(rng)
+            if rng.random() < 0.5:
+                dup["email"] = None
+            else:
+                dup["telefon"] = _phone(rng)
+            leads.append(dup)
+            continue
+        first, last = rng.choice(FIRST_NAMES), rng.choice(LAST_NAMES)
+        contact = today - timedelta(days=rng.randint(0, 3 * 365))
+        stav = rng.choices(STAV_LEADU, STAV_WEIGHTS)[0]
+        offer = round(rng.uniform(1500, 25000), -1)
+        competitor = rng.choice(KONKURENCIA)
+        next_step = contact + timedelta(days=rng.randint(1, 120)) if stav in ("Open", "Cold") else None
+        leads.append(dict(
+            meno_zakaznika=f"{first} {last}",
+            telefon=_phone(rng) if rng.random() < 0.9 else None,
+            email=f"{first}.{last}{i}@example.sk".lower().translate(ASCII) if rng.random() < 0.8 else None,
+            mesto=rng.choice(CITIES),
+            typ_dopytu=rng.choice(TYP_DOPYTU),
+            datum_povodneho_kontaktu=contact,
+            stav_projektu=rng.choice(STAV_PROJEKTU),
+            konkurencia=competitor,
+            cena_konkurencie=round(offer * rng.uniform(0.8, 1.2), -1) if competitor else None,
+            nasa_ponuka_orientacna=offer if rng.random() < 0.7 else None,
+            reakcia_zakaznika=_note(rng, 0.05) if rng.random() < 0.5 else None,
+            dalsi_krok=rng.choice(DALSI_KROK) if next_step else None,
+            datum_dalsieho_kroku=next_step,
+            priorita=rng.choice(PRIORITA),
+            stav_leadu=stav,
+            orientacna_cena=round(offer * rng.uniform(0.9, 1.3), -1) if rng.random() < 0.6 else None,
+            datum_realizacie=contact + timedelta(days=rng.randint(30, 240)) if stav == "Converted" else None,
+            poznamky=_note(rng),
+        ))
+    return leads
+
+
+def write_db(SessionLocal, leads: List[Dict[str, Any]], batch_size: int = 5000) -> None:
+    """Bulk-insert ``leads`` as-is (no dedup) into an initialised database."""
+    from db import Lead
+
+    session = SessionLocal()
+    try:
+        for i in range(0, len(leads), batch_size):
+            session.execute(insert(Lead), leads[i:i + batch_size])
+        session.commit()
+    finally:
+        session.close()
+
+
+def write_excel(path: str, leads: List[Dict[str, Any]]) -> None:
+    """Write an .xlsx with the human headers on sheet ``Leads``."""
+    from openpyxl import Workbook
+
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet("Leads")
+    cols = list(EXCEL_HEADERS)
+    ws.append([EXCEL_HEADERS[c] for c in cols])
+    for lead in leads:
+        ws.append([lead.get(c) for c in cols])
+    wb.save(path)
+
+
+def write_csv(path: str, leads: List[Dict[str, Any]]) -> None:
+    """Write a CSV in the layout of the web-form export (Meno/Email/Phone/Vytovorene)."""
+    cols = list(CSV_HEADERS)
+    with open(path, "w", newline="", encoding="utf-8") as fh:
+        writer = csv.writer(fh)
+        writer.writerow([CSV_HEADERS[c] for c in cols])
+        for lead in leads:
+            writer.writerow(["" if lead.get(c) is None else lead.get(c) for c in cols])
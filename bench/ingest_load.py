@@ -0,0 +1,181 @@
+# -*- coding: utf-8 -*-
+"""Load test of the lead ingestion service (``ingest_service.py``).
+
+    python -m bench.ingest_load --clients 8 --batch 1 --duration 15
+    python -m bench.ingest_load --clients 4 --batch 50 --url http://127.0.0.1:8765
+
+Without ``--url`` the service is started as a subprocess on a free port
+over a temporary database pre-filled with ``--leads`` synthetic leads.
+Every client keeps one HTTP connection and posts generated leads (about
+``--dup-rate`` of them duplicates) in batches of ``--batch`` until the
+time is up.  Reports leads/s, request latency percentiles and the
+created / duplicate / invalid counts.
+"""
+import argparse
+import http.client
+import json
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from datetime import date
+from urllib.parse import urlparse
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def _json_lead(lead):
+    return {k: (v.isoformat() if isinstance(v, date) else v) for k, v in lead.items() if v is not None}
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _wait_healthy(host: str, port: int, timeout: float = 30) -> None:
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            conn = http.client.HTTPConnection(host, port, timeout=2)
+            conn.request("GET", "/health")
+            if conn.getresponse().status == 200:
+                return
+        except OSError:
+            time.sleep(0.2)
+    raise RuntimeError("Služba neodpovedá na /health")
+
+
+def _client(host, port, token, leads, batch, deadline, out):
+    headers = {"Content-Type": "application/json"}
+    if token:
+        headers["Authorization"] = f"Bearer {token}"
+    conn = http.client.HTTPConnection(host, port, timeout=60)
+    i = 0
+    while time.time() < deadline and i < len(leads):
+        body = leads[i:i + batch]
+        i += batch
+        data = json.dumps(body[0] if batch == 1 else body).encode("utf-8")
+        t0 = time.perf_counter()
+        try:
+            conn.request("POST", "/leads", body=data, headers=headers)
+            resp = conn.getresponse()
+            payload = json.loads(resp.read())
+        except (OSError, http.client.HTTPException, ValueError) as e:
+            out["errors"].append(f"{type(e).__name__}: {e}")
+            conn.close()
+            conn = http.client.HTTPConnection(host, port, timeout=60)
+            continue
+        out["latency_ms"].append((time.perf_counter() - t0) * 1000)
+        if resp.status != 200:
+            out["errors"].append(f"HTTP {resp.status}: {payload.get('error')}")
+            continue
+        for key in ("created", "duplicates", "invalid"):
+            out[key] += payload[key]
+    conn.close()
+
+
+def run(host, port, token, clients, batch, duration, dup_rate, seed):
+    from bench.generator import generate_leads
+    from sqlprofile import percentile
+
+    # enough leads that no client runs dry at a few thousand leads/s
+    per_client = max(batch, int(duration * 2000 / clients) + batch)
+    outs = []
+    threads = []
+    deadline = time.time() + duration
+    for c in range(clients):
+        leads = [_json_lead(x) for x in generate_leads(per_client, seed=seed * 1000 + c, duplicate_rate=dup_rate)]
+        out = {"latency_ms": [], "errors": [], "created": 0, "duplicates": 0, "invalid": 0}
+        outs.append(out)
+        threads.append(threading.Thread(target=_client, args=(host, port, token, leads, batch, deadline, out)))
+    t0 = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    wall = time.perf_counter() - t0
+
+    lat = sorted(x for o in outs for x in o["latency_ms"])
+    totals = {k: sum(o[k] for o in outs) for k in ("created", "duplicates", "invalid")}
+    leads_done = sum(totals.values())
+    errors = [e for o in outs for e in o["errors"]]
+    return {
+        "clients": clients,
+        "batch": batch,
+        "wall_s": round(wall, 2),
+        "requests": len(lat),
+        "leads_per_s": round(leads_done / wall, 1) if wall else 0,
+        **totals,
+        "errors": len(errors),
+        "error_samples": errors[:5],
+        "latency_ms": {
+            "p50": round(percentile(lat, 50), 1) if lat else None,
+            "p95": round(percentile(lat, 95), 1) if lat else None,
+            "p99": round(percentile(lat, 99), 1) if lat else None,
+        },
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Záťažový test služby na príjem leadov")
+    parser.add_argument("--url", default=None, help="bežiaca služba (inak sa spustí dočasná)")
+    parser.add_argument("--token", default=os.environ.get("REMARK_CRM_INGEST_TOKEN"))
+    parser.add_argument("--clients", default="1,4,8", help="čiarkou oddelené počty klientov")
+    parser.add_argument("--batch", type=int, default=1, help="leadov v jednej požiadavke")
+    parser.add_argument("--duration", type=float, default=10, help="sekúnd na jeden počet klientov")
+    parser.add_argument("--leads", type=int, default=5000, help="veľkosť vygenerovanej DB")
+    parser.add_argument("--dup-rate", type=float, default=0.05)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--out", default=None, help="JSON výstup")
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory(prefix="remark_ingest_") as root:
+        proc = None
+        if args.url:
+            parsed = urlparse(args.url)
+            host, port = parsed.hostname, parsed.port or 80
+        else:
+            host, port = "127.0.0.1", _free_port()
+            env = dict(os.environ, REMARK_CRM_DB=os.path.join(root, "ingest.db"))
+            subprocess.run(
+                [sys.executable, "-c",
+                 "from bench.generator import generate_leads, write_db\n"
+                 "from db import get_engine_session, init_db\n"
+                 "e, S = get_engine_session(); init_db(e)\n"
+                 f"write_db(S, generate_leads({args.leads}, seed={args.seed}))\n"],
+                cwd=ROOT, env=env, check=True,
+            )
+            proc = subprocess.Popen([sys.executable, "ingest_service.py", "--port", str(port)], cwd=ROOT, env=env)
+        try:
+            _wait_healthy(host, port)
+            reports = []
+            for n in [int(s) for s in args.clients.split(",") if s]:
+                rep = run(host, port, args.token, n, args.batch, args.duration, args.dup_rate, args.seed + n)
+                reports.append(rep)
+                lat = rep["latency_ms"]
+                print(
+                    f"{n:3d} klientov × dávka {args.batch}: {rep['leads_per_s']:8.1f} leadov/s, "
+                    f"p50 {lat['p50']} ms, p95 {lat['p95']} ms, p99 {lat['p99']} ms, "
+                    f"nové {rep['created']}, duplicity {rep['duplicates']}, neplatné {rep['invalid']}, "
+                    f"chyby {rep['errors']}"
+                )
+                for sample in rep["error_samples"]:
+                    print(f"    ! {sample[:200]}")
+        finally:
+            if proc is not None:
+                proc.terminate()
+                proc.wait(timeout=30)
+
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as fh:
+            json.dump({"batch": args.batch, "leads": args.leads, "runs": reports}, fh, indent=2, ensure_ascii=False)
+        print(f"-> {args.out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,265 @@
+# -*- coding: utf-8 -*-
+"""Multi-session load test of the Streamlit pages through ``AppTest``.
+
+    python -m bench.loadtest --sessions 1,4,8 --duration 30 --leads 5000
+    python -m bench.loadtest --mode thread --sessions 2 --duration 10
+
+Each simulated session keeps its own ``AppTest`` of ``app.py`` (and of the
+Summary page) and loops over a weighted mix of scenarios on one shared
+SQLite file:
+
+* ``search``       – types into the full-text box and reruns,
+* ``filter``       – picks stav leadu / priorita in the filter panel,
+* ``inline_edit``  – saves a lead the way the grid's inline edit does
+  (AgGrid cannot be driven by AppTest, so the write goes through
+  ``update_leads_bulk`` with the row version) and reruns,
+* ``import``       – imports a small CSV (``file_uploader`` is not supported
+  by AppTest either, so the importer is called directly) and reruns,
+* ``summary``      – reruns the Summary page.
+
+For every session count the harness reports throughput, latency
+percentiles per scenario, "database is locked" errors and other errors.
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+import traceback
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+SCENARIOS = {"search": 4, "filter": 3, "inline_edit": 3, "import": 1, "summary": 2}
+SEARCH_TERMS = ["novák", "bratislava", "kuchyňa", "ján", "0905", "example.sk", "šatník", "zuzana"]
+
+
+def _is_lock_error(text: str) -> bool:
+    return "database is locked" in text or "database table is locked" in text
+
+
+class SimulatedSession:
+    def __init__(self, sid: int, seed: int, csv_dir: str):
+        from streamlit.testing.v1 import AppTest
+
+        self.sid = sid
+        self.rng = random.Random(seed * 1000 + sid)
+        self.csv_dir = csv_dir
+        self.app = AppTest.from_file(os.path.join(ROOT, "app.py"), default_timeout=120)
+        self.summary = AppTest.from_file(os.path.join(ROOT, "pages", "1_Summary.py"), default_timeout=120)
+        self.app.run()
+        self._imports = 0
+
+    def _check(self, at):
+        if at.exception:
+            raise RuntimeError("; ".join(str(e.value) for e in at.exception))
+
+    def _widget(self, widgets, label):
+        for w in widgets:
+            if w.label == label:
+                return w
+        raise LookupError(label)
+
+    def search(self):
+        term = self.rng.choice(SEARCH_TERMS + [""])
+        self._widget(self.app.text_input, "Hľadať").input(term).run()
+        self._check(self.app)
+
+    def filter(self):
+        stav = self._widget(self.app.multiselect, "Stav leadu")
+        prio = self._widget(self.app.multiselect, "Priorita")
+        stav.set_value(self.rng.sample(stav.options, k=self.rng.randint(0, min(2, len(stav.options)))))
+        prio.set_value(self.rng.sample(prio.options, k=self.rng.randint(0, min(1, len(prio.options)))))
+        self.app.run()
+        self._check(self.app)
+
+    def inline_edit(self):
+        from db import get_lead, update_leads_bulk
+
+        _, SessionLocal = _session_factory()
+        rid = self.rng.randint(1, _lead_count())
+        rec = get_lead(SessionLocal, rid)
+        if rec:
+            update_leads_bulk(SessionLocal, [{
+                "id": rid, "version": rec["version"],
+                "poznamky": f"load {self.sid} {time.time():.3f}",
+                "stav_leadu": self.rng.choice(["Open", "Cold", "Converted"]),
+            }])
+        self.app.run()
+        self._check(self.app)
+
+    def import_(self):
+        from bench.generator import generate_leads, write_csv
+        from db import import_from_csv_mapped
+
+        self._imports += 1
+        path = os.path.join(self.csv_dir, f"import_{os.getpid()}_{self.sid}_{self._imports}.csv")
+        write_csv(path, generate_leads(20, seed=self.rng.randrange(10 ** 9)))
+        _, SessionLocal = _session_factory()
+        import_from_csv_mapped(SessionLocal, path)
+        self.app.run()
+        self._check(self.app)
+
+    def summary_(self):
+        self.summary.run()
+        self._check(self.summary)
+
+    def step(self):
+        name = self.rng.choices(list(SCENARIOS), weights=list(SCENARIOS.values()))[0]
+        fn = {"import": self.import_, "summary": self.summary_}.get(name) or getattr(self, name)
+        t0 = time.perf_counter()
+        try:
+            fn()
+            return name, time.perf_counter() - t0, None
+        except Exception as e:
+            text = f"{type(e).__name__}: {e}"
+            return name, time.perf_counter() - t0, ("lock" if _is_lock_error(text) else text)
+
+
+_factory = None
+_count = None
+
+
+def _session_factory():
+    global _factory
+    if _factory is None:
+        from db import get_engine_session
+        _factory = get_engine_session()
+    return _factory
+
+
+def _lead_count():
+    global _count
+    if _count is None:
+        from db import Lead
+        session = _session_factory()[1]()
+        try:
+            _count = session.query(Lead).count() or 1
+        finally:
+            session.close()
+    return _count
+
+
+def _run_session(sid, seed, csv_dir, deadline, results):
+    try:
+        sess = SimulatedSession(sid, seed, csv_dir)
+    except Exception:
+        results.append(("startup", 0.0, traceback.format_exc(limit=2)))
+        return
+    while time.time() < deadline:
+        results.append(sess.step())
+
+
+def _process_worker(args):
+    sid, seed, csv_dir, deadline, db_path = args
+    os.environ["REMARK_CRM_DB"] = db_path
+    sys.path.insert(0, ROOT)
+    results = []
+    _run_session(sid, seed, csv_dir, deadline, results)
+    return results
+
+
+def run_load(sessions: int, duration: float, mode: str, seed: int, db_path: str, csv_dir: str):
+    deadline = time.time() + duration
+    t0 = time.perf_counter()
+    if mode == "thread":
+        results = []
+        threads = [
+            threading.Thread(target=_run_session, args=(sid, seed, csv_dir, deadline, results))
+            for sid in range(sessions)
+        ]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+    else:
+        ctx = multiprocessing.get_context("spawn")
+        with ctx.Pool(sessions) as pool:
+            chunks = pool.map(
+                _process_worker, [(sid, seed, csv_dir, deadline, db_path) for sid in range(sessions)]
+            )
+        results = [r for chunk in chunks for r in chunk]
+    wall = time.perf_counter() - t0
+    return summarize(sessions, results, wall)
+
+
+def summarize(sessions, results, wall):
+    from sqlprofile import percentile
+
+    by_scenario = {}
+    lock_errors, errors = 0, []
+    for name, secs, err in results:
+        if err == "lock":
+            lock_errors += 1
+        elif err:
+            errors.append(f"{name}: {err}")
+        else:
+            by_scenario.setdefault(name, []).append(secs * 1000)
+    ok = sum(len(v) for v in by_scenario.values())
+    return {
+        "sessions": sessions,
+        "wall_s": round(wall, 2),
+        "ops": ok,
+        "throughput_ops_s": round(ok / wall, 2) if wall else 0,
+        "lock_errors": lock_errors,
+        "errors": len(errors),
+        "error_samples": errors[:5],
+        "latency_ms": {
+            name: {
+                "count": len(v),
+                "p50": round(percentile(sorted(v), 50), 1),
+                "p95": round(percentile(sorted(v), 95), 1),
+                "p99": round(percentile(sorted(v), 99), 1),
+            }
+            for name, v in sorted(by_scenario.items())
+        },
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Záťažový test viacerých relácií (AppTest)")
+    parser.add_argument("--sessions", default="1,2,4", help="čiarkou oddelené počty relácií")
+    parser.add_argument("--duration", type=float, default=20, help="sekúnd na jeden počet relácií")
+    parser.add_argument("--leads", type=int, default=2000, help="veľkosť vygenerovanej DB")
+    parser.add_argument("--mode", choices=["process", "thread"], default="process")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--db", default=None, help="existujúca DB (inak sa vygeneruje dočasná)")
+    parser.add_argument("--out", default=None, help="JSON výstup")
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory(prefix="remark_load_") as root:
+        db_path = args.db or os.path.join(root, "load.db")
+        # set before db.py is imported anywhere: DB_PATH is read at import time
+        os.environ["REMARK_CRM_DB"] = db_path
+        if not args.db:
+            from bench.generator import generate_leads, write_db
+            from db import get_engine_session, init_db
+
+            engine, SessionLocal = get_engine_session()
+            init_db(engine)
+            write_db(SessionLocal, generate_leads(args.leads, seed=args.seed))
+            engine.dispose()
+
+        reports = []
+        for n in [int(s) for s in args.sessions.split(",") if s]:
+            rep = run_load(n, args.duration, args.mode, args.seed, db_path, root)
+            reports.append(rep)
+            print(
+                f"{n:3d} relácií: {rep['throughput_ops_s']:7.2f} op/s, zámky {rep['lock_errors']}, "
+                f"chyby {rep['errors']}, "
+                + ", ".join(f"{k} p95 {v['p95']:.0f} ms" for k, v in rep["latency_ms"].items())
+            )
+            for sample in rep["error_samples"]:
+                print(f"    ! {sample[:200]}")
+
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as fh:
+            json.dump({"mode": args.mode, "leads": args.leads, "runs": reports}, fh, indent=2, ensure_ascii=False)
+        print(f"-> {args.out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,246 @@
+# -*- coding: utf-8 -*-
+"""Benchmark the hot paths of the CRM on synthetic data.
+
+    python -m bench.run                              # 1k and 10k leads
+    python -m bench.run --sizes 1000,50000,200000 --repeat 5
+    python -m bench.run --cases fetch_leads_df,badges_counts --out before.json
+    python -m bench.compare before.json after.json
+
+Every case runs on a fresh copy of a generated database, so cases do not
+influence each other.  Each case first runs ``--warmup`` times untimed,
+so lazy imports (pandas, openpyxl) and cold caches do not land in the
+first timed repeat.  Results are written as JSON (see ``--out``).
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+
+from bench.generator import generate_leads, write_csv, write_db, write_excel
+
+DEFAULT_SIZES = [1000, 10000]
+FULL_SIZES = [1000, 10000, 50000, 200000]
+
+# Quadratic or per-row-query cases would take hours at 200k leads; above the
+# cap they are recorded as skipped unless ``--no-caps`` is given.
+CASE_MAX_SIZE = {
+    "remove_duplicate_leads": 2000,
+    "import_from_excel_mapped": 20000,
+    "import_initial_from_excel": 20000,
+    "import_from_csv_mapped": 20000,
+}
+
+
+class Workspace:
+    """Generated data for one size: a template DB plus Excel/CSV exports."""
+
+    def __init__(self, root: str, size: int, seed: int):
+        from db import get_engine_session, init_db
+
+        self.root = root
+        self.size = size
+        self.leads = generate_leads(size, seed=seed)
+        self.template = os.path.join(root, f"leads_{size}.db")
+        engine, SessionLocal = get_engine_session(f"sqlite:///{self.template}")
+        init_db(engine)
+        write_db(SessionLocal, self.leads)
+        engine.dispose()
+        self.excel = os.path.join(root, f"leads_{size}.xlsx")
+        self.csv = os.path.join(root, f"leads_{size}.csv")
+        self._exports_done = False
+        self._n = 0
+
+    def ensure_exports(self):
+        if not self._exports_done:
+            write_excel(self.excel, self.leads)
+            write_csv(self.csv, self.leads)
+            self._exports_done = True
+
+    def session(self, empty: bool = False):
+        """Return ``(engine, SessionLocal)`` on a fresh copy of the template
+        (or a fresh empty database)."""
+        from db import get_engine_session, init_db
+
+        self._n += 1
+        path = os.path.join(self.root, f"work_{self.size}_{self._n}.db")
+        if not empty:
+            shutil.copyfile(self.template, path)
+        engine, SessionLocal = get_engine_session(f"sqlite:///{path}")
+        init_db(engine)
+        return engine, SessionLocal
+
+
+# --- cases: setup(ws) -> state, run(state) is timed ---
+
+def _case_fetch(ws):
+    engine, SessionLocal = ws.session()
+    from db import fetch_leads_df
+    return engine, lambda: fetch_leads_df(SessionLocal)
+
+
+def _case_dedup(ws):
+    engine, SessionLocal = ws.session()
+    from db import remove_duplicate_leads
+    return engine, lambda: remove_duplicate_leads(SessionLocal)
+
+
+def _case_import_excel(ws):
+    ws.ensure_exports()
+    engine, SessionLocal = ws.session(empty=True)
+    from db import import_from_excel_mapped
+    return engine, lambda: import_from_excel_mapped(SessionLocal, ws.excel)
+
+
+def _case_import_initial(ws):
+    # the seed import the app runs at start on an empty database
+    ws.ensure_exports()
+    engine, SessionLocal = ws.session(empty=True)
+    from db import import_initial_from_excel
+    return engine, lambda: import_initial_from_excel(SessionLocal, ws.excel)
+
+
+def _case_import_csv(ws):
+    ws.ensure_exports()
+    engine, SessionLocal = ws.session(empty=True)
+    from db import import_from_csv_mapped
+    return engine, lambda: import_from_csv_mapped(SessionLocal, ws.csv)
+
+
+def _case_update_bulk(ws):
+    engine, SessionLocal = ws.session()
+    from db import update_leads_bulk
+    rng = random.Random(ws.size)
+    ids = rng.sample(range(1, ws.size + 1), min(500, ws.size))
+    updates = [
+        {"id": rid, "stav_leadu": rng.choice(["Open", "Cold", "Converted"]), "poznamky": f"bench {rid}"}
+        for rid in ids
+    ]
+    return engine, lambda: update_leads_bulk(SessionLocal, updates)
+
+
+def _frame_case(fn):
+    def setup(ws):
+        engine, SessionLocal = ws.session()
+        from db import fetch_leads_df
+        df = fetch_leads_df(SessionLocal)
+        return engine, lambda: fn(df)
+    return setup
+
+
+def _badges(df):
+    from utils import badges_counts
+    return badges_counts(df, datetime(2025, 6, 1).date())
+
+
+def _summary(df):
+    import stats
+    for col in ["stav_leadu", "priorita", "typ_dopytu", "mesto"]:
+        stats.counts_by(df, col)
+    stats.conversion_rate(df)
+    stats.avg_days_to_realization(df)
+    stats.prices_long(df)
+    stats.lead_trend(df, "W")
+    stats.lead_trend(df, "M")
+
+
+CASES = {
+    "fetch_leads_df": _case_fetch,
+    "remove_duplicate_leads": _case_dedup,
+    "import_from_excel_mapped": _case_import_excel,
+    "import_initial_from_excel": _case_import_initial,
+    "import_from_csv_mapped": _case_import_csv,
+    "update_leads_bulk": _case_update_bulk,
+    "badges_counts": _frame_case(_badges),
+    "summary_aggregations": _frame_case(_summary),
+}
+
+
+def run_case(name, ws, repeat, warmup=1):
+    times = []
+    for i in range(warmup + repeat):
+        engine, fn = CASES[name](ws)
+        try:
+            t0 = time.perf_counter()
+            fn()
+            if i >= warmup:
+                times.append(time.perf_counter() - t0)
+        finally:
+            engine.dispose()
+    return {
+        "case": name,
+        "size": ws.size,
+        "repeat": repeat,
+        "warmup": warmup,
+        "min_s": min(times),
+        "median_s": statistics.median(times),
+        "max_s": max(times),
+    }
+
+
+def _git_revision():
+    try:
+        out = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, timeout=10)
+        return out.stdout.strip() or None
+    except Exception:
+        return None
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="REMARK CRM benchmark")
+    parser.add_argument("--sizes", default=",".join(map(str, DEFAULT_SIZES)),
+                        help="čiarkou oddelené veľkosti alebo 'full' (1k..200k)")
+    parser.add_argument("--cases", default=",".join(CASES), help="čiarkou oddelené prípady")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--warmup", type=int, default=1, help="nemerané behy pred meraním")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--no-caps", action="store_true", help="ignorovať CASE_MAX_SIZE")
+    parser.add_argument("--out", default=None, help="JSON výstup (predvolene bench/results/<rev>.json)")
+    args = parser.parse_args(argv)
+
+    sizes = FULL_SIZES if args.sizes == "full" else [int(s) for s in args.sizes.split(",") if s]
+    cases = [c for c in args.cases.split(",") if c]
+    unknown = set(cases) - set(CASES)
+    if unknown:
+        parser.error(f"neznáme prípady: {', '.join(sorted(unknown))}")
+
+    revision = _git_revision()
+    results = []
+    with tempfile.TemporaryDirectory(prefix="remark_bench_") as root:
+        for size in sizes:
+            ws = Workspace(root, size, args.seed)
+            for name in cases:
+                cap = CASE_MAX_SIZE.get(name)
+                if cap and size > cap and not args.no_caps:
+                    results.append({"case": name, "size": size, "skipped": f"size > {cap}"})
+                    print(f"{name:28s} {size:>8d}  skipped (> {cap})")
+                    continue
+                res = run_case(name, ws, args.repeat, args.warmup)
+                results.append(res)
+                print(f"{name:28s} {size:>8d}  median {res['median_s'] * 1000:10.1f} ms")
+
+    out = args.out or os.path.join(os.path.dirname(__file__), "results", f"{revision or 'local'}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(out)), exist_ok=True)
+    with open(out, "w", encoding="utf-8") as fh:
+        json.dump({
+            "meta": {
+                "revision": revision,
+                "created": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+                "python": sys.version.split()[0],
+                "platform": platform.platform(),
+                "seed": args.seed,
+            },
+            "results": results,
+        }, fh, indent=2, ensure_ascii=False)
+    print(f"-> {out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,107 @@
+# -*- coding: utf-8 -*-
+"""Import-time check of the app modules.
+
+    python -m bench.startup                                 # compare with the checked-in baseline
+    python -m bench.startup --baseline other.json           # ... or another run
+    python -m bench.startup --no-baseline --out bench/startup_baseline.json   # new baseline
+
+Every target is imported in a fresh interpreter ``--repeat`` times and
+the median in-process import time is reported.  The run fails (exit
+status 1) when
+
+* a target loads a module it must not need (e.g. pandas for ``db`` and the
+  command line tools), or
+* a target got slower than ``--threshold`` (relative) against the
+  baseline: ``bench/startup_baseline.json`` unless ``--baseline`` names
+  another file or ``--no-baseline`` is given.  The checked-in file was
+  measured on the reference machine; re-create it there when an import
+  legitimately gets more expensive.
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BASELINE = os.path.join(ROOT, "bench", "startup_baseline.json")
+
+# name -> (import statement, modules that must stay unloaded)
+TARGETS = {
+    "db": ("import db", ["pandas", "numpy", "plotly", "st_aggrid"]),
+    "cli": ("import archive, backup, export, maintenance, ingest_service", ["pandas", "numpy", "plotly", "streamlit"]),
+    # streamlit itself loads the plotly base package, but not plotly.express
+    "app": ("import streamlit, st_aggrid, pandas, db, utils, backup, export, maintenance, options, scoring, snapshot, views", ["plotly.express"]),
+    "summary": ("import streamlit, db, utils, figcache, snapshot, stats", ["plotly.express"]),
+}
+
+_CHILD = """
+import json, sys, time
+t0 = time.perf_counter()
+{stmt}
+elapsed = time.perf_counter() - t0
+print(json.dumps({{"s": elapsed, "loaded": [m for m in {forbidden!r} if m in sys.modules]}}))
+"""
+
+
+def measure(name: str, repeat: int):
+    stmt, forbidden = TARGETS[name]
+    env = dict(os.environ, REMARK_CRM_DB=os.path.join(tempfile.gettempdir(), "remark_startup.db"))
+    times, loaded = [], set()
+    for _ in range(repeat):
+        out = subprocess.run(
+            [sys.executable, "-c", _CHILD.format(stmt=stmt, forbidden=forbidden)],
+            cwd=ROOT, env=env, capture_output=True, text=True, check=True,
+        )
+        data = json.loads(out.stdout.strip().splitlines()[-1])
+        times.append(data["s"])
+        loaded.update(data["loaded"])
+    return {"target": name, "median_s": statistics.median(times), "min_s": min(times),
+            "unexpected_modules": sorted(loaded)}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Meranie času importu modulov aplikácie")
+    parser.add_argument("--targets", default=",".join(TARGETS))
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--out", default=None, help="JSON výstup")
+    parser.add_argument("--baseline", default=BASELINE, help="predchádzajúci JSON na porovnanie")
+    parser.add_argument("--no-baseline", action="store_true", help="neporovnávať so základom")
+    parser.add_argument("--threshold", type=float, default=0.2,
+                        help="povolené relatívne spomalenie (0.2 = 20 %%)")
+    args = parser.parse_args(argv)
+
+    baseline = {}
+    if args.baseline and not args.no_baseline:
+        with open(args.baseline, encoding="utf-8") as fh:
+            baseline = {r["target"]: r for r in json.load(fh)["results"]}
+
+    failed = False
+    results = []
+    for name in [t for t in args.targets.split(",") if t]:
+        res = measure(name, args.repeat)
+        results.append(res)
+        line = f"{name:10s} {res['median_s'] * 1000:8.1f} ms"
+        base = baseline.get(name)
+        if base:
+            ratio = res["median_s"] / base["median_s"] if base["median_s"] else float("inf")
+            line += f"  (základ {base['median_s'] * 1000:.1f} ms, x{ratio:.2f})"
+            if ratio > 1 + args.threshold:
+                line += "  REGRESSION"
+                failed = True
+        if res["unexpected_modules"]:
+            line += f"  NAČÍTANÉ: {', '.join(res['unexpected_modules'])}"
+            failed = True
+        print(line)
+
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as fh:
+            json.dump({"python": sys.version.split()[0], "results": results}, fh, indent=2)
+        print(f"-> {args.out}")
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
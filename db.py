@@ -1,16 +1,28 @@
 
 # -*- coding: utf-8 -*-
 import os
-from datetime import date, datetime
-from typing import List, Tuple, Dict, Any, Optional
-import pandas as pd
-from sqlalchemy import create_engine, Column, Integer, String, Float, Date, Text, or_
+import threading
+from collections import OrderedDict
+from datetime import date, datetime, timezone
+from typing import TYPE_CHECKING, List, Tuple, Dict, Any, Optional
+from sqlalchemy import (
+    create_engine, event, func, inspect, insert, select, text, update, Column, Index, Integer, String, Float, Date, DateTime,
+    Text, or_,
+)
 from sqlalchemy.orm import sessionmaker, declarative_base
+from sqlalchemy.schema import CreateIndex
 from sqlalchemy.exc import OperationalError
 from sqlalchemy.orm.session import Session
-import io
 
-from utils import normalize_columns_generic, clean_dataframe_for_db, parse_date_safe
+import perf
+import sqlprofile
+import writequeue
+from utils import EXPORT_HEADERS, normalize_columns_generic, clean_dataframe_for_db, parse_date_safe
+
+# pandas is only imported by the frame helpers and importers, so the CLI
+# tools (backup, maintenance, export, archive) and write paths start without it
+if TYPE_CHECKING:
+    import pandas as pd
 
 """Database configuration.
 
@@ -31,9 +43,8 @@ DATABASE_URL = f"sqlite:///{DB_PATH}"
 
 Base = declarative_base()
 
-class Lead(Base):
-    __tablename__ = "leads"
-    id = Column(Integer, primary_key=True, autoincrement=True)
+class LeadColumnsMixin:
+    """Columns shared by the hot ``leads`` table and ``leads_archive``."""
     meno_zakaznika = Column(String)
     telefon = Column(String)
     email = Column(String)
@@ -52,43 +63,181 @@ class Lead(Base):
     orientacna_cena = Column(Float)
     datum_realizacie = Column(Date)
     poznamky = Column(Text)
+    # Optimistic concurrency: bumped on every write, checked by conditional updates
+    version = Column(Integer, nullable=False, default=1, server_default="1")
+    updated_at = Column(DateTime)
+    # call urgency, maintained by scoring.py (not an edit: version stays)
+    score = Column(Float)
+
+
+class Lead(LeadColumnsMixin, Base):
+    __tablename__ = "leads"
+    # AUTOINCREMENT (new databases) keeps ids of archived leads from being reused;
+    # the category indexes serve the filters and options.distinct_values, the
+    # contact ones the OR lookup of is_duplicate_lead
+    __table_args__ = (
+        Index("ix_leads_meno_zakaznika", "meno_zakaznika"),
+        Index("ix_leads_telefon", "telefon"),
+        Index("ix_leads_email", "email"),
+        Index("ix_leads_datum_povodneho_kontaktu", "datum_povodneho_kontaktu"),
+        Index("ix_leads_stav_leadu", "stav_leadu"),
+        Index("ix_leads_priorita", "priorita"),
+        Index("ix_leads_stav_projektu", "stav_projektu"),
+        Index("ix_leads_typ_dopytu", "typ_dopytu"),
+        Index("ix_leads_mesto", "mesto"),
+        Index("ix_leads_score", "score"),
+        {"sqlite_autoincrement": True},
+    )
+    id = Column(Integer, primary_key=True, autoincrement=True)
+
+
+class ArchivedLead(LeadColumnsMixin, Base):
+    """Closed leads moved out of ``leads`` by :mod:`archive`; ids are kept."""
+    __tablename__ = "leads_archive"
+    # is_duplicate_lead checks archived leads too
+    __table_args__ = (
+        Index("ix_leads_archive_meno_zakaznika", "meno_zakaznika"),
+        Index("ix_leads_archive_telefon", "telefon"),
+        Index("ix_leads_archive_email", "email"),
+        Index("ix_leads_archive_datum_povodneho_kontaktu", "datum_povodneho_kontaktu"),
+    )
+    id = Column(Integer, primary_key=True, autoincrement=False)
+    archived_at = Column(DateTime, nullable=False)
+
+
+def _union_view_ddl() -> str:
+    cols = ", ".join(c.name for c in Lead.__table__.columns)
+    return (
+        f"CREATE VIEW leads_all AS "
+        f"SELECT {cols}, 0 AS archived FROM leads "
+        f"UNION ALL SELECT {cols}, 1 AS archived FROM leads_archive"
+    )
+
+
+class LeadChange(Base):
+    """Change log filled by triggers on every insert/update/delete of a lead.
+
+    ``seq`` is monotonically increasing, so a reader that remembers the last
+    ``seq`` it has seen can fetch just the leads changed since then.
+    """
+    __tablename__ = "lead_changes"
+    __table_args__ = {"sqlite_autoincrement": True}
+    seq = Column(Integer, primary_key=True, autoincrement=True)
+    lead_id = Column(Integer, nullable=False)
+    op = Column(String(1), nullable=False)  # I, U, D
+
+
+class LeadEvent(Base):
+    """Append-only history of tracked lead fields (status, next step, ...).
+
+    Events are written in the same transaction as the change itself, so the
+    history never disagrees with the ``leads`` table.
+    """
+    __tablename__ = "lead_events"
+    __table_args__ = (
+        Index("ix_lead_events_lead_ts", "lead_id", "ts"),
+        # fetch_status_events: one field, in (lead_id, ts) order
+        Index("ix_lead_events_field_lead_ts", "field", "lead_id", "ts"),
+    )
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    lead_id = Column(Integer, nullable=False)
+    ts = Column(DateTime, nullable=False)
+    field = Column(String, nullable=False)
+    old_value = Column(Text)
+    new_value = Column(Text)
+
+
+class MaintenanceRun(Base):
+    """One executed maintenance task (see ``maintenance.py``)."""
+    __tablename__ = "maintenance_runs"
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    ts = Column(DateTime, nullable=False, index=True)
+    task = Column(String, nullable=False)
+    seconds = Column(Float)
+    size_before = Column(Integer)
+    size_after = Column(Integer)
+    details = Column(Text)  # JSON
+
+
+class SavedView(Base):
+    """Named combination of the grid's filters, full-text search and sort (see ``views.py``)."""
+    __tablename__ = "saved_views"
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    name = Column(String, nullable=False, unique=True)
+    filters = Column(Text, nullable=False)  # JSON {column: [values]}
+    search = Column(String)
+    sort = Column(Text)  # JSON [[column, "asc" | "desc"], ...]
+    updated_at = Column(DateTime, nullable=False)
+
+
+# Fields whose changes are recorded in ``lead_events``
+TRACKED_FIELDS = [
+    "stav_leadu", "priorita", "stav_projektu", "dalsi_krok", "datum_dalsieho_kroku", "datum_realizacie",
+]
+
+
+LEAD_CHANGE_TRIGGERS = [
+    """CREATE TRIGGER IF NOT EXISTS leads_log_insert AFTER INSERT ON leads
+       BEGIN INSERT INTO lead_changes (lead_id, op) VALUES (NEW.id, 'I'); END""",
+    """CREATE TRIGGER IF NOT EXISTS leads_log_update AFTER UPDATE ON leads
+       BEGIN INSERT INTO lead_changes (lead_id, op) VALUES (NEW.id, 'U'); END""",
+    """CREATE TRIGGER IF NOT EXISTS leads_log_delete AFTER DELETE ON leads
+       BEGIN INSERT INTO lead_changes (lead_id, op) VALUES (OLD.id, 'D'); END""",
+]
+
+
+class LeadConflictError(Exception):
+    """Raised when a lead changed since the version the caller edited."""
+
+    def __init__(self, rid: int, expected: int, current: Optional[Dict[str, Any]]):
+        self.rid = rid
+        self.expected = expected
+        self.current = current
+        actual = current.get("version") if current else None
+        super().__init__(f"Lead {rid} has version {actual}, expected {expected}")
 
 
 def is_duplicate_lead(session: Session, payload: Dict[str, Any]) -> bool:
-    """Return True if a lead with at least two matching fields exists."""
+    """Return True if a lead with at least two matching fields exists.
+
+    Archived leads count too, otherwise re-imports would resurrect them.
+    """
+    perf.count("dedup_lookups")
     name = payload.get("meno_zakaznika")
     phone = payload.get("telefon")
     email = payload.get("email")
     dpc = parse_date_safe(payload.get("datum_povodneho_kontaktu"))
 
-    filters = []
-    if name:
-        filters.append(Lead.meno_zakaznika == name)
-    if phone:
-        filters.append(Lead.telefon == phone)
-    if email:
-        filters.append(Lead.email == email)
-    if dpc:
-        filters.append(Lead.datum_povodneho_kontaktu == dpc)
-    if not filters:
-        return False
-
-    candidates = session.query(Lead).filter(or_(*filters)).all()
-    for c in candidates:
-        matches = 0
-        if name and c.meno_zakaznika == name:
-            matches += 1
-        if phone and c.telefon == phone:
-            matches += 1
-        if email and c.email == email:
-            matches += 1
-        if dpc and c.datum_povodneho_kontaktu == dpc:
-            matches += 1
-        if matches >= 2:
-            return True
+    for model in (Lead, ArchivedLead):
+        filters = []
+        if name:
+            filters.append(model.meno_zakaznika == name)
+        if phone:
+            filters.append(model.telefon == phone)
+        if email:
+            filters.append(model.email == email)
+        if dpc:
+            filters.append(model.datum_povodneho_kontaktu == dpc)
+        if not filters:
+            return False
+
+        candidates = session.query(model).filter(or_(*filters)).all()
+        for c in candidates:
+            matches = 0
+            if name and c.meno_zakaznika == name:
+                matches += 1
+            if phone and c.telefon == phone:
+                matches += 1
+            if email and c.email == email:
+                matches += 1
+            if dpc and c.datum_povodneho_kontaktu == dpc:
+                matches += 1
+            if matches >= 2:
+                return True
     return False
 
 
+@perf.timed("db.remove_duplicate_leads")
 def remove_duplicate_leads(SessionLocal) -> int:
     """Delete duplicate leads based on matching at least two key fields."""
     session: Session = SessionLocal()
@@ -117,138 +266,639 @@ def remove_duplicate_leads(SessionLocal) -> int:
                     matches += 1
                 if matches >= 2:
                     to_delete.add(b.id)
-        if to_delete:
-            session.query(Lead).filter(Lead.id.in_(to_delete)).delete(synchronize_session=False)
-            session.commit()
-            removed = len(to_delete)
-        return removed
     finally:
         session.close()
+    # the scan above is read-only; only the delete goes through the writer
+    if to_delete:
+        removed = run_write(SessionLocal, delete_leads_tx, sorted(to_delete))
+    return removed
+
+
+def delete_leads_tx(session: Session, ids: List[int]) -> int:
+    removed = session.query(Lead).filter(Lead.id.in_(ids)).delete(synchronize_session=False)
+    _touch(session, ids)
+    return removed
+
+def _unicode_lower(value):
+    return value.lower() if isinstance(value, str) else value
+
+
+def _on_connect(dbapi_conn, _record):
+    # SQLite's built-in lower() only folds ASCII; searches need "Ľ" == "ľ"
+    dbapi_conn.create_function("lower", 1, _unicode_lower, deterministic=True)
+
+
+_engines: Dict[str, Tuple[Any, Any]] = {}
+_engines_lock = threading.Lock()
+
+
+def get_engine_session(database_url: str = DATABASE_URL):
+    """Return ``(engine, SessionLocal)`` for ``database_url``.
 
-def get_engine_session():
-    engine = create_engine(DATABASE_URL, echo=False, future=True)
-    SessionLocal = sessionmaker(bind=engine)
-    return engine, SessionLocal
+    Created once per process and URL: Streamlit calls this on every rerun,
+    and all sessions have to share one engine so their writes meet in the
+    same :mod:`writequeue` coordinator.
+    """
+    with _engines_lock:
+        cached = _engines.get(database_url)
+        if cached is not None:
+            return cached
+        engine = create_engine(database_url, echo=False, future=True)
+        event.listen(engine, "connect", _on_connect)
+        perf.install_sql_counter(engine)
+        sqlprofile.maybe_attach(engine)
+        SessionLocal = sessionmaker(bind=engine)
+        event.listen(SessionLocal, "before_flush", _before_flush)
+        event.listen(SessionLocal, "before_commit", _before_commit)
+        event.listen(SessionLocal, "after_commit", _after_commit)
+        event.listen(SessionLocal, "after_rollback", _after_rollback)
+        _engines[database_url] = (engine, SessionLocal)
+        return engine, SessionLocal
+
+def _add_missing_columns(engine):
+    """Add model columns missing from tables created by older app versions."""
+    insp = inspect(engine)
+    with engine.begin() as conn:
+        for table in Base.metadata.sorted_tables:
+            if not insp.has_table(table.name):
+                continue
+            existing = {c["name"] for c in insp.get_columns(table.name)}
+            for col in table.columns:
+                if col.name in existing:
+                    continue
+                ddl = f"ALTER TABLE {table.name} ADD COLUMN {col.name} {col.type.compile(engine.dialect)}"
+                if col.server_default is not None:
+                    ddl += f" NOT NULL DEFAULT {col.server_default.arg}"
+                conn.execute(text(ddl))
+
+def _create_missing_indexes(engine):
+    """Create model indexes missing from tables created by older app versions."""
+    with engine.begin() as conn:
+        for table in Base.metadata.sorted_tables:
+            for index in table.indexes:
+                conn.execute(CreateIndex(index, if_not_exists=True))
 
 def init_db(engine):
-    Base.metadata.create_all(bind=engine)
+    with engine.connect() as conn:
+        if not inspect(conn).get_table_names():
+            # only possible before the first table exists; lets maintenance
+            # return free pages with PRAGMA incremental_vacuum
+            conn.exec_driver_sql("PRAGMA auto_vacuum = INCREMENTAL")
+        Base.metadata.create_all(bind=conn)
+        conn.commit()
+    _add_missing_columns(engine)
+    _create_missing_indexes(engine)
+    with engine.begin() as conn:
+        for ddl in LEAD_CHANGE_TRIGGERS:
+            conn.execute(text(ddl))
+        # recreated when the lead tables gained columns; a DROP/CREATE on
+        # every call would bump the schema version of a running database
+        current = conn.execute(text("SELECT sql FROM sqlite_master WHERE type = 'view' AND name = 'leads_all'")).scalar()
+        if current != _union_view_ddl():
+            conn.execute(text("DROP VIEW IF EXISTS leads_all"))
+            conn.execute(text(_union_view_ddl()))
+
+def lead_to_dict(obj: Lead) -> Dict[str, Any]:
+    """Return a plain ``dict`` with all columns of ``obj``."""
+    return {c.name: getattr(obj, c.name) for c in Lead.__table__.columns}
+
+
+def leads_to_df(records: List[Dict[str, Any]]) -> "pd.DataFrame":
+    """Build the grid frame from lead dicts (dates as ISO strings)."""
+    import pandas as pd
+    if not records:
+        return pd.DataFrame([
+            # ensure columns visible even when empty
+            {c.name: None for c in Lead.__table__.columns}
+        ]).iloc[0:0]
+    df = pd.DataFrame(records)
+    # Ensure consistent ISO formatting for date columns
+    for col in ["datum_povodneho_kontaktu", "datum_dalsieho_kroku", "datum_realizacie"]:
+        if col in df.columns:
+            dt = pd.to_datetime(df[col], errors="coerce")
+            df[col] = dt.dt.strftime("%Y-%m-%d")
+            df.loc[dt.isna(), col] = None
+    return df
+
 
-def fetch_leads_df(SessionLocal) -> pd.DataFrame:
+@perf.timed("db.fetch_leads_df")
+def fetch_leads_df(SessionLocal, include_archived: bool = False) -> "pd.DataFrame":
+    """Return the hot lead table, or with ``include_archived`` the
+    ``leads_all`` union view (extra ``archived`` column) for statistics."""
     session: Session = SessionLocal()
     try:
+        if include_archived:
+            rows = session.execute(text("SELECT * FROM leads_all ORDER BY id")).mappings().all()
+            perf.count("rows_fetched", len(rows))
+            return leads_to_df([dict(r) for r in rows])
         rows = session.query(Lead).all()
-        if not rows:
-            return pd.DataFrame([
-                # ensure columns visible even when empty
-                {c.name: None for c in Lead.__table__.columns}
-            ]).iloc[0:0]
-        data = []
-        for r in rows:
-            d = {
-                "id": r.id,
-                "meno_zakaznika": r.meno_zakaznika,
-                "telefon": r.telefon,
-                "email": r.email,
-                "mesto": r.mesto,
-                "typ_dopytu": r.typ_dopytu,
-                "datum_povodneho_kontaktu": r.datum_povodneho_kontaktu,
-                "stav_projektu": r.stav_projektu,
-                "konkurencia": r.konkurencia,
-                "cena_konkurencie": r.cena_konkurencie,
-                "nasa_ponuka_orientacna": r.nasa_ponuka_orientacna,
-                "reakcia_zakaznika": r.reakcia_zakaznika,
-                "dalsi_krok": r.dalsi_krok,
-                "datum_dalsieho_kroku": r.datum_dalsieho_kroku,
-                "priorita": r.priorita,
-                "stav_leadu": r.stav_leadu,
-                "orientacna_cena": r.orientacna_cena,
-                "datum_realizacie": r.datum_realizacie,
-                "poznamky": r.poznamky,
-            }
-            data.append(d)
-        df = pd.DataFrame(data)
-        # Ensure consistent ISO formatting for date columns
-        for col in ["datum_povodneho_kontaktu", "datum_dalsieho_kroku", "datum_realizacie"]:
-            if col in df.columns:
-                dt = pd.to_datetime(df[col], errors="coerce")
-                df[col] = dt.dt.strftime("%Y-%m-%d")
-                df.loc[dt.isna(), col] = None
+        perf.count("rows_fetched", len(rows))
+        return leads_to_df([lead_to_dict(r) for r in rows])
+    finally:
+        session.close()
+
+
+def replace_lead_rows(df: "pd.DataFrame", records: List[Dict[str, Any]],
+                      deleted_ids=None) -> "pd.DataFrame":
+    """Return ``df`` with the rows of ``records`` replaced or appended by id
+    and the rows of ``deleted_ids`` dropped."""
+    import pandas as pd
+    if deleted_ids:
+        df = df[~df["id"].isin(list(deleted_ids))]
+    if not records:
         return df
+    patch = leads_to_df(records)
+    perf.count("frame_copies")
+    rest = df[~df["id"].isin(patch["id"])]
+    if rest.empty:
+        return patch.reset_index(drop=True)
+    return pd.concat([rest, patch[df.columns]], ignore_index=True).sort_values("id", ignore_index=True)
+
+
+# --- Change tracking ---
+
+@perf.timed("db.current_change_seq")
+def current_change_seq(SessionLocal) -> int:
+    """Return the latest change sequence number (0 for an untouched DB)."""
+    session: Session = SessionLocal()
+    try:
+        return session.query(func.max(LeadChange.seq)).scalar() or 0
     finally:
         session.close()
 
-def insert_lead(SessionLocal, payload: Dict[str, Any]) -> int:
+
+@perf.timed("db.fetch_lead_changes")
+def fetch_lead_changes(SessionLocal, since_seq: int, chunk_size: int = 500):
+    """Return ``(records, deleted_ids, seq)`` for leads changed after ``since_seq``.
+
+    ``records`` are the current rows of inserted/updated leads, ``deleted_ids``
+    the ids that no longer exist and ``seq`` the sequence to pass next time.
+    Returns None when the log no longer reaches back to ``since_seq`` (it was
+    pruned), in which case the caller has to reload the full table.
+    """
     session: Session = SessionLocal()
     try:
-        if is_duplicate_lead(session, payload):
-            return 0
-        obj = Lead(
-            meno_zakaznika=payload.get("meno_zakaznika"),
-            telefon=payload.get("telefon"),
-            email=payload.get("email"),
-            mesto=payload.get("mesto"),
-            typ_dopytu=payload.get("typ_dopytu"),
-            datum_povodneho_kontaktu=parse_date_safe(payload.get("datum_povodneho_kontaktu")),
-            stav_projektu=payload.get("stav_projektu"),
-            konkurencia=payload.get("konkurencia"),
-            cena_konkurencie=payload.get("cena_konkurencie"),
-            nasa_ponuka_orientacna=payload.get("nasa_ponuka_orientacna"),
-            reakcia_zakaznika=payload.get("reakcia_zakaznika"),
-            dalsi_krok=payload.get("dalsi_krok"),
-            datum_dalsieho_kroku=parse_date_safe(payload.get("datum_dalsieho_kroku")),
-            priorita=payload.get("priorita"),
-            stav_leadu=payload.get("stav_leadu"),
-            orientacna_cena=payload.get("orientacna_cena"),
-            datum_realizacie=parse_date_safe(payload.get("datum_realizacie")),
-            poznamky=payload.get("poznamky"),
-        )
-        session.add(obj)
-        session.commit()
-        return obj.id
+        # Read the high-water mark first: changes committed after it are
+        # picked up again by the next call, so merging stays idempotent.
+        seq = session.query(func.max(LeadChange.seq)).scalar() or 0
+        if seq <= since_seq:
+            return [], [], since_seq
+        oldest = session.query(func.min(LeadChange.seq)).scalar()
+        if oldest is not None and oldest > since_seq + 1:
+            return None
+        ids = [
+            rid for (rid,) in session.query(LeadChange.lead_id)
+            .filter(LeadChange.seq > since_seq).distinct()
+        ]
+        records = []
+        for i in range(0, len(ids), chunk_size):
+            rows = session.query(Lead).filter(Lead.id.in_(ids[i:i + chunk_size])).all()
+            records.extend(lead_to_dict(r) for r in rows)
+        perf.count("rows_fetched", len(records))
+        found = {r["id"] for r in records}
+        deleted = [rid for rid in ids if rid not in found]
+        return records, deleted, seq
     finally:
         session.close()
 
-def update_single_lead(SessionLocal, payload: Dict[str, Any]) -> int:
+
+def prune_lead_changes(SessionLocal, keep_last: int = 100_000) -> int:
+    """Delete all but the newest ``keep_last`` change-log entries."""
+    return run_write(SessionLocal, _prune_lead_changes_tx, keep_last)
+
+
+def _prune_lead_changes_tx(session: Session, keep_last: int) -> int:
+    seq = session.query(func.max(LeadChange.seq)).scalar() or 0
+    return session.query(LeadChange).filter(LeadChange.seq <= seq - keep_last).delete(
+        synchronize_session=False
+    )
+
+
+# --- Single-lead cache ---
+
+class LeadCache:
+    """Small thread-safe LRU cache of lead dicts keyed by id.
+
+    Streamlit runs every session in its own script thread, so the cache is
+    shared by all sessions of the server process.  Writers invalidate the ids
+    they touched after a successful commit.
+    """
+
+    def __init__(self, maxsize: int = 256):
+        self.maxsize = maxsize
+        self._data: "OrderedDict[int, Dict[str, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._generation = 0
+
+    @property
+    def generation(self) -> int:
+        return self._generation
+
+    def get(self, rid: int) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            rec = self._data.get(rid)
+            if rec is not None:
+                self._data.move_to_end(rid)
+            return rec
+
+    def put(self, rid: int, rec: Dict[str, Any], generation: Optional[int] = None) -> None:
+        """Store ``rec``; skipped when an invalidation happened since ``generation``."""
+        with self._lock:
+            if generation is not None and generation != self._generation:
+                return
+            self._data[rid] = rec
+            self._data.move_to_end(rid)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def invalidate(self, ids=None) -> None:
+        """Drop ``ids`` from the cache, or everything when ``ids`` is None."""
+        with self._lock:
+            self._generation += 1
+            if ids is None:
+                self._data.clear()
+                return
+            for rid in ids:
+                self._data.pop(rid, None)
+
+
+lead_cache = LeadCache()
+
+
+@perf.timed("db.get_lead")
+def get_lead(SessionLocal, rid: int) -> Optional[Dict[str, Any]]:
+    """Return one lead as a dict (dates as ``date``), or None if missing."""
+    rid = int(rid)
+    rec = lead_cache.get(rid)
+    if rec is not None:
+        return dict(rec)
+    generation = lead_cache.generation
     session: Session = SessionLocal()
     try:
-        rid = payload.get("id")
-        obj = session.query(Lead).filter(Lead.id == rid).first()
-        if not obj:
-            return 0
-        for key, value in payload.items():
-            if key == "id": 
-                continue
-            if key.startswith("datum") and value is not None:
-                value = parse_date_safe(value)
-            setattr(obj, key, value)
-        session.commit()
-        return 1
+        obj = session.get(Lead, rid)
+        if obj is None:
+            return None
+        rec = lead_to_dict(obj)
+        perf.count("rows_fetched")
     finally:
         session.close()
+    lead_cache.put(rid, rec, generation)
+    return dict(rec)
+
+
+# --- Writes ---
+
+WRITE_QUEUE = os.environ.get("REMARK_CRM_WRITE_QUEUE", "1").lower() not in ("0", "false", "no")
+IMPORT_CHUNK_SIZE = 200
+
+
+def _touch(session: Session, ids) -> None:
+    """Remember lead ids written in ``session``; dropped from the cache on commit."""
+    session.info.setdefault("touched_leads", set()).update(ids)
+
+
+# called as ``fn(session, ids)`` after a commit that wrote leads (see snapshot.attach)
+commit_listeners: List[Any] = []
+
+
+def _before_flush(session: Session, flush_context, instances) -> None:
+    leads = [obj for obj in session.new if isinstance(obj, Lead)]
+    leads += [obj for obj in session.dirty if isinstance(obj, Lead) and session.is_modified(obj)]
+    if leads:
+        # scored within the INSERT/UPDATE, not by a second UPDATE at commit
+        import scoring
+        scoring.score_objects(leads)
+
+
+def _before_commit(session: Session) -> None:
+    touched = session.info.get("touched_leads")
+    if touched:
+        # one batch for everything the transaction (or commit group) wrote
+        import scoring
+        scoring.rescore_tx(session, touched)
+
+
+def _after_commit(session: Session) -> None:
+    session.info.pop("scored_leads", None)
+    touched = session.info.pop("touched_leads", None)
+    if touched:
+        lead_cache.invalidate(touched)
+        for listener in commit_listeners:
+            listener(session, touched)
+
+
+def _after_rollback(session: Session) -> None:
+    session.info.pop("scored_leads", None)
+    session.info.pop("touched_leads", None)
 
-def update_leads_bulk(SessionLocal, updates: List[Dict[str, Any]]) -> int:
+
+def run_write(SessionLocal, fn, *args, **kwargs):
+    """Run ``fn(session, *args, **kwargs)`` as a committed write.
+
+    Goes through the database's :mod:`writequeue` coordinator (group commit
+    with other sessions' writes) unless ``REMARK_CRM_WRITE_QUEUE=0``.
+    """
+    if WRITE_QUEUE:
+        return writequeue.get_coordinator(SessionLocal).call(fn, *args, **kwargs)
     session: Session = SessionLocal()
-    updated = 0
     try:
-        for upd in updates:
-            rid = upd.get("id")
-            if not rid:
-                continue
-            obj = session.query(Lead).filter(Lead.id == rid).first()
-            if not obj:
-                continue
-            for k, v in upd.items():
-                if k == "id": 
-                    continue
-                if k.startswith("datum") and v is not None:
-                    v = parse_date_safe(v)
-                setattr(obj, k, v)
-            updated += 1
+        result = fn(session, *args, **kwargs)
         session.commit()
-        return updated
+        return result
+    finally:
+        session.close()
+
+
+def run_write_chunks(SessionLocal, fn, items: List[Any], chunk_size: int, *args, **kwargs) -> List[Any]:
+    """Run ``fn(session, chunk, *args, **kwargs)`` per chunk, one commit each.
+
+    Chunks are queued at bulk priority, so interactive writes of other
+    sessions get in between them.  Returns the per-chunk results; the first
+    error is raised after all chunks have finished.
+    """
+    if not WRITE_QUEUE:
+        return [run_write(SessionLocal, fn, items[i:i + chunk_size], *args, **kwargs)
+                for i in range(0, len(items), chunk_size)]
+    futures = writequeue.get_coordinator(SessionLocal).submit_chunks(fn, items, chunk_size, *args, **kwargs)
+    errors = [f.exception() for f in futures]
+    for error in errors:
+        if error is not None:
+            raise error
+    return [f.result() for f in futures]
+
+
+# --- Lead history ---
+
+def _event_value(value) -> Optional[str]:
+    if value is None:
+        return None
+    if isinstance(value, (date, datetime)):
+        return value.isoformat()
+    return str(value)
+
+
+def _change_events(rid: int, obj: Lead, changes: Dict[str, Any], ts: datetime) -> List[Dict[str, Any]]:
+    """Event rows for the tracked fields in ``changes`` (``obj`` holds old values)."""
+    return [
+        dict(lead_id=rid, ts=ts, field=key,
+             old_value=_event_value(getattr(obj, key)), new_value=_event_value(value))
+        for key, value in changes.items() if key in TRACKED_FIELDS
+    ]
+
+
+def _creation_events(objs: List[Lead], ts: datetime) -> List[Dict[str, Any]]:
+    """Initial events for freshly flushed leads, so stage durations have a start."""
+    return [
+        dict(lead_id=obj.id, ts=ts, field=key, old_value=None, new_value=_event_value(getattr(obj, key)))
+        for obj in objs for key in TRACKED_FIELDS if getattr(obj, key) is not None
+    ]
+
+
+def _record_events(session: Session, events: List[Dict[str, Any]]) -> None:
+    """Append ``events`` with a single executemany in the caller's transaction."""
+    if events:
+        session.execute(insert(LeadEvent), events)
+
+
+@perf.timed("db.fetch_lead_history")
+def fetch_lead_history(SessionLocal, rid: int) -> List[Dict[str, Any]]:
+    """Return the events of one lead, oldest first."""
+    session: Session = SessionLocal()
+    try:
+        rows = (
+            session.query(LeadEvent)
+            .filter(LeadEvent.lead_id == int(rid))
+            .order_by(LeadEvent.ts, LeadEvent.id)
+            .all()
+        )
+        return [
+            dict(ts=e.ts, field=e.field, old_value=e.old_value, new_value=e.new_value) for e in rows
+        ]
+    finally:
+        session.close()
+
+
+@perf.timed("db.fetch_status_events")
+def fetch_status_events(SessionLocal, since: Optional[datetime] = None,
+                        until: Optional[datetime] = None) -> "pd.DataFrame":
+    """Return ``stav_leadu`` events as a frame ordered by (lead_id, ts)."""
+    import pandas as pd
+    session: Session = SessionLocal()
+    try:
+        q = session.query(LeadEvent.lead_id, LeadEvent.ts, LeadEvent.old_value, LeadEvent.new_value).filter(
+            LeadEvent.field == "stav_leadu"
+        )
+        if since is not None:
+            q = q.filter(LeadEvent.ts >= since)
+        if until is not None:
+            q = q.filter(LeadEvent.ts < until)
+        rows = q.order_by(LeadEvent.lead_id, LeadEvent.ts, LeadEvent.id).all()
+        return pd.DataFrame(rows, columns=["lead_id", "ts", "old_value", "new_value"])
     finally:
         session.close()
 
+
+@perf.timed("db.insert_lead")
+def insert_lead(SessionLocal, payload: Dict[str, Any]) -> int:
+    """Insert a new lead unless it duplicates an existing one; returns its id (0 if skipped)."""
+    return run_write(SessionLocal, insert_lead_tx, payload)
+
+
+def insert_lead_tx(session: Session, payload: Dict[str, Any]) -> int:
+    if is_duplicate_lead(session, payload):
+        return 0
+    obj = Lead(
+        meno_zakaznika=payload.get("meno_zakaznika"),
+        telefon=payload.get("telefon"),
+        email=payload.get("email"),
+        mesto=payload.get("mesto"),
+        typ_dopytu=payload.get("typ_dopytu"),
+        datum_povodneho_kontaktu=parse_date_safe(payload.get("datum_povodneho_kontaktu")),
+        stav_projektu=payload.get("stav_projektu"),
+        konkurencia=payload.get("konkurencia"),
+        cena_konkurencie=payload.get("cena_konkurencie"),
+        nasa_ponuka_orientacna=payload.get("nasa_ponuka_orientacna"),
+        reakcia_zakaznika=payload.get("reakcia_zakaznika"),
+        dalsi_krok=payload.get("dalsi_krok"),
+        datum_dalsieho_kroku=parse_date_safe(payload.get("datum_dalsieho_kroku")),
+        priorita=payload.get("priorita"),
+        stav_leadu=payload.get("stav_leadu"),
+        orientacna_cena=payload.get("orientacna_cena"),
+        datum_realizacie=parse_date_safe(payload.get("datum_realizacie")),
+        poznamky=payload.get("poznamky"),
+    )
+    session.add(obj)
+    session.flush()
+    _record_events(session, _creation_events([obj], _utcnow()))
+    _touch(session, [obj.id])
+    return obj.id
+
+
+def insert_leads_tx(session: Session, payloads: List[Dict[str, Any]]) -> Tuple[int, int]:
+    """Insert import payloads, skipping duplicates (also within ``payloads``).
+    Returns ``(imported, skipped)``."""
+    ids = insert_leads_ids_tx(session, payloads)
+    imported = sum(1 for rid in ids if rid)
+    return imported, len(ids) - imported
+
+
+def insert_leads_ids_tx(session: Session, payloads: List[Dict[str, Any]]) -> List[int]:
+    """Like :func:`insert_leads_tx`, but return the new id of every payload
+    (0 for a skipped duplicate), in order."""
+    added = []
+    for payload in payloads:
+        if is_duplicate_lead(session, payload):
+            added.append(None)
+            continue
+        obj = Lead(**payload)
+        session.add(obj)
+        added.append(obj)
+    session.flush()
+    created = [obj for obj in added if obj is not None]
+    _record_events(session, _creation_events(created, _utcnow()))
+    _touch(session, [obj.id for obj in created])
+    return [obj.id if obj is not None else 0 for obj in added]
+
+
+def _insert_chunked(SessionLocal, payloads: List[Dict[str, Any]]) -> Tuple[int, int]:
+    results = run_write_chunks(SessionLocal, insert_leads_tx, payloads, IMPORT_CHUNK_SIZE)
+    return sum(r[0] for r in results), sum(r[1] for r in results)
+
+def _utcnow() -> datetime:
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+
+FLOAT_COLUMNS = ["cena_konkurencie", "nasa_ponuka_orientacna", "orientacna_cena"]
+
+
+def _normalize_value(key: str, value):
+    """Coerce a UI/grid value to what is stored in the ``key`` column."""
+    if value is None:
+        return None
+    if key.startswith("datum"):
+        return parse_date_safe(value)
+    if key in FLOAT_COLUMNS:
+        try:
+            value = float(value)
+        except (TypeError, ValueError):
+            return None
+        return None if value != value else value
+    if isinstance(value, float) and value != value:
+        return None
+    return value
+
+
+def _changed_columns(obj: Lead, payload: Dict[str, Any]) -> Dict[str, Any]:
+    """Return only the payload columns whose value differs from ``obj``."""
+    changes = {}
+    for key, value in payload.items():
+        if key in ("id", "version", "updated_at", "score") or not hasattr(Lead, key):
+            continue
+        value = _normalize_value(key, value)
+        if getattr(obj, key) != value:
+            changes[key] = value
+    return changes
+
+
+def _conditional_update(session: Session, obj: Lead, changes: Dict[str, Any], expected: Optional[int],
+                        score: Optional[Dict[str, float]] = None) -> bool:
+    """``UPDATE leads SET <changes> WHERE id=? [AND version=?]``; False on conflict.
+
+    ``score`` is :func:`scoring.score_change` of the edit when the caller
+    computed it for a batch already.
+    """
+    stmt = update(Lead).where(Lead.id == obj.id)
+    if expected is not None:
+        stmt = stmt.where(Lead.version == int(expected))
+    if score is None:
+        import scoring
+        score = scoring.score_change(obj, changes)
+    stmt = stmt.values(**changes, **score, version=Lead.version + 1, updated_at=_utcnow())
+    result = session.execute(stmt.execution_options(synchronize_session=False))
+    return result.rowcount == 1
+
+
+@perf.timed("db.update_single_lead")
+def update_single_lead(SessionLocal, payload: Dict[str, Any]) -> int:
+    """Write the changed columns of ``payload`` to lead ``payload["id"]``.
+
+    When ``payload`` carries the ``version`` the caller edited, the update is
+    conditional on it and :class:`LeadConflictError` is raised if somebody
+    else saved the lead in the meantime.  Returns 1 when the lead exists.
+    """
+    return run_write(SessionLocal, update_single_lead_tx, payload)
+
+
+def update_single_lead_tx(session: Session, payload: Dict[str, Any]) -> int:
+    rid = payload.get("id")
+    expected = payload.get("version")
+    obj = session.get(Lead, rid)
+    if not obj:
+        return 0
+    if expected is not None and obj.version != int(expected):
+        raise LeadConflictError(rid, int(expected), lead_to_dict(obj))
+    changes = _changed_columns(obj, payload)
+    if not changes:
+        return 1
+    events = _change_events(rid, obj, changes, _utcnow())
+    if not _conditional_update(session, obj, changes, expected):
+        # nothing of this job was written yet; the caller's transaction
+        # (possibly a group commit) is rolled back by the raise
+        current = session.get(Lead, rid, populate_existing=True)
+        raise LeadConflictError(rid, int(expected), lead_to_dict(current) if current else None)
+    _record_events(session, events)
+    _touch(session, [rid])
+    return 1
+
+
+@perf.timed("db.update_leads_bulk")
+def update_leads_bulk(SessionLocal, updates: List[Dict[str, Any]],
+                      conflicts: Optional[List[Dict[str, Any]]] = None) -> int:
+    """Apply partial updates to many leads in one transaction.
+
+    Rows whose ``version`` no longer matches are skipped; their current
+    records are appended to ``conflicts`` when a list is given.
+    """
+    updated, stale = run_write(SessionLocal, update_leads_bulk_tx, updates)
+    if conflicts is not None:
+        conflicts.extend(stale)
+    return updated
+
+
+def update_leads_bulk_tx(session: Session, updates: List[Dict[str, Any]]) -> Tuple[int, List[Dict[str, Any]]]:
+    """Returns ``(updated, conflicts)``."""
+    updated = 0
+    touched = []
+    conflicts = []
+    events = []
+    now = _utcnow()
+    ids = [upd.get("id") for upd in updates if upd.get("id")]
+    rows = {obj.id: obj for obj in session.query(Lead).filter(Lead.id.in_(ids))} if ids else {}
+    edits = []
+    for upd in updates:
+        obj = rows.get(upd.get("id"))
+        if obj is None:
+            continue
+        expected = upd.get("version")
+        if expected is not None and obj.version != int(expected):
+            conflicts.append(lead_to_dict(obj))
+            continue
+        changes = _changed_columns(obj, upd)
+        if changes:
+            edits.append((obj, expected, changes))
+    import scoring
+    scores = scoring.score_changes([(obj, changes) for obj, _, changes in edits])
+    for (obj, expected, changes), score in zip(edits, scores):
+        if not _conditional_update(session, obj, changes, expected, score):
+            conflicts.append({"id": obj.id})
+            continue
+        events.extend(_change_events(obj.id, obj, changes, now))
+        updated += 1
+        touched.append(obj.id)
+    _record_events(session, events)
+    _touch(session, touched)
+    return updated, conflicts
+
 # --- Importers ---
 
 EXCEL_SHEET = "Leads"
@@ -312,6 +962,7 @@ DB_COLUMNS = [
     "orientacna_cena","datum_realizacie","poznamky"
 ]
 
+@perf.timed("db.import_initial_from_excel")
 def import_initial_from_excel(SessionLocal, excel_path: str) -> Tuple[int,int]:
     """Import initial data from Excel sheet 'Leads' if DB is empty. Returns (imported, skipped)."""
     session: Session = SessionLocal()
@@ -340,136 +991,273 @@ def import_initial_from_excel(SessionLocal, excel_path: str) -> Tuple[int,int]:
     if "stav_leadu" in df.columns:
         df["stav_leadu"] = df["stav_leadu"].fillna("Open")
 
-    imported = 0
-    session = SessionLocal()
-    try:
-        for _, r in df.iterrows():
-            payload = {col: r.get(col, None) for col in DB_COLUMNS}
-            # Replace pandas NaN/NaT with Python ``None`` so SQLAlchemy doesn't
-            # attempt to insert them directly.
-            for k, v in payload.items():
-                if pd.isna(v):
-                    payload[k] = None
-            # parse dates
-            for dk in ["datum_povodneho_kontaktu","datum_dalsieho_kroku","datum_realizacie"]:
-                payload[dk] = parse_date_safe(payload.get(dk))
-            if is_duplicate_lead(session, payload):
-                continue
-            obj = Lead(**payload)
-            session.add(obj)
-            imported += 1
-        session.commit()
-    finally:
-        session.close()
+    payloads = []
+    for _, r in df.iterrows():
+        payload = {col: r.get(col, None) for col in DB_COLUMNS}
+        # Replace pandas NaN/NaT with Python ``None`` so SQLAlchemy doesn't
+        # attempt to insert them directly.
+        for k, v in payload.items():
+            if pd.isna(v):
+                payload[k] = None
+        # parse dates
+        for dk in ["datum_povodneho_kontaktu","datum_dalsieho_kroku","datum_realizacie"]:
+            payload[dk] = parse_date_safe(payload.get(dk))
+        payloads.append(payload)
+    imported, _ = _insert_chunked(SessionLocal, payloads)
     return (imported, 0)
 
-def import_from_excel_mapped(SessionLocal, file_or_buffer) -> Tuple[int,int]:
-    """Import leads from an Excel file with columns like 'Meno zákazníka',
-    'Telefón', etc. Returns (imported, skipped)."""
+# --- Mapped imports: one parse pass, a report, then the write ---
+#
+# The parsers below read the file once (CSV in chunks of IMPORT_PARSE_ROWS
+# rows) into insert payloads and, on the way, count what the cleanup would
+# lose: headers that map to no column, dates and prices that do not parse,
+# unknown priorita/stav values and rows without a name.  The importers write
+# the payloads right away; the app first shows ``preview_import`` and writes
+# the same payloads with ``commit_import`` once the user confirms.
+
+IMPORT_PARSE_ROWS = 5000
+DATE_COLUMNS = ["datum_povodneho_kontaktu", "datum_dalsieho_kroku", "datum_realizacie"]
+# rows listed in the report; the counts cover all of them
+IMPORT_REPORT_EXAMPLES = 20
+
+CSV_ALIASES = {
+    "meno":"meno_zakaznika","Meno":"meno_zakaznika","Meno zákazníka":"meno_zakaznika",
+    "Email":"email","email":"email",
+    "Phone":"telefon","Telefón":"telefon","Telefon":"telefon","phone":"telefon",
+    "Vytovorene":"datum_povodneho_kontaktu","Vytvorené":"datum_povodneho_kontaktu","Vytvorene":"datum_povodneho_kontaktu",
+}
+CSV_COLUMNS = ["meno_zakaznika","email","telefon","datum_povodneho_kontaktu"]
+
+
+def _new_import_report(source_columns, mapped_columns, known) -> Dict[str, Any]:
+    columns = [(str(src), dst if dst in known else None) for src, dst in zip(source_columns, mapped_columns)]
+    return {
+        "rows": 0,
+        "columns": columns,
+        "unmapped": [src for src, dst in columns if dst is None],
+        "missing_name": 0,
+        "bad_dates": {},
+        "bad_numbers": {},
+        "unknown_values": {},
+        "duplicates_in_file": 0,
+        "duplicates_in_db": 0,
+        "examples": [],
+    }
+
+
+def _check_import_chunk(df: "pd.DataFrame", report: Dict[str, Any], first_row: int) -> None:
+    """Count the values of a mapped, not yet cleaned chunk that the cleanup
+    would turn into empty cells (``first_row`` is the file row of ``df``'s
+    first row, for the examples)."""
     import pandas as pd
-    if isinstance(file_or_buffer, (str, bytes, os.PathLike)):
-        df = pd.read_excel(file_or_buffer, engine="openpyxl")
-    else:
-        df = pd.read_excel(file_or_buffer, engine="openpyxl")
+    from utils import PRIORITA_VALUES, STAV_LEADU_VALUES
 
-    df = normalize_columns_generic(df, COLUMN_ALIASES)
+    def note(kind, col, mask, what):
+        n = int(mask.sum())
+        if not n:
+            return
+        report[kind][col] = report[kind].get(col, 0) + n
+        room = IMPORT_REPORT_EXAMPLES - len(report["examples"])
+        for pos in mask.to_numpy().nonzero()[0][:max(room, 0)]:
+            report["examples"].append(f"riadok {first_row + pos}: {col} – {what} {df[col].iloc[pos]!r}")
+
+    def present(col):
+        values = df[col]
+        return values.notna() & (values.astype(str).str.strip() != "")
+
+    report["rows"] += len(df)
+    for col in DATE_COLUMNS:
+        if col in df.columns:
+            parsed = pd.to_datetime(df[col], errors="coerce")
+            note("bad_dates", col, present(col) & parsed.isna(), "neplatný dátum")
+    for col in FLOAT_COLUMNS:
+        if col in df.columns:
+            parsed = pd.to_numeric(df[col], errors="coerce")
+            note("bad_numbers", col, present(col) & parsed.isna(), "neplatné číslo")
+    for col, allowed in (("priorita", PRIORITA_VALUES), ("stav_leadu", STAV_LEADU_VALUES)):
+        if col in df.columns:
+            note("unknown_values", col, present(col) & ~df[col].isin(allowed), "neznáma hodnota")
+
+
+def _payloads_from_frame(df: "pd.DataFrame", columns, report: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """Insert payloads of a cleaned chunk; rows without a name are counted
+    in ``report["missing_name"]`` and left out."""
+    import pandas as pd
+    payloads = []
+    for rec in df.to_dict("records"):
+        if pd.isna(rec.get("meno_zakaznika")):
+            report["missing_name"] += 1
+            continue
+        payload = {col: rec.get(col) for col in columns}
+        for k, v in payload.items():
+            if pd.isna(v):
+                payload[k] = None
+        for dk in DATE_COLUMNS:
+            if dk in payload:
+                payload[dk] = parse_date_safe(payload[dk])
+        payloads.append(payload)
+    return payloads
+
+
+def _parse_excel_mapped(file_or_buffer) -> Tuple[List[Dict[str, Any]], Dict[str, Any]]:
+    import pandas as pd
+    # openpyxl loads the whole workbook anyway, so Excel is read in one piece
+    raw = pd.read_excel(file_or_buffer, engine="openpyxl")
+    df = normalize_columns_generic(raw, COLUMN_ALIASES)
+    report = _new_import_report(raw.columns, df.columns, DB_COLUMNS)
+    _check_import_chunk(df, report, first_row=2)
     df = clean_dataframe_for_db(df, DB_COLUMNS)
 
     if "priorita" in df.columns:
         df["priorita"] = df["priorita"].fillna("Stredná")
     if "stav_leadu" in df.columns:
         df["stav_leadu"] = df["stav_leadu"].fillna("Open")
+    return _payloads_from_frame(df, DB_COLUMNS, report), report
 
-    imported, skipped = 0, 0
-    session = SessionLocal()
-    try:
-        for _, r in df.iterrows():
-            if pd.isna(r.get("meno_zakaznika")):
-                skipped += 1
-                continue
-            payload = {col: r.get(col, None) for col in DB_COLUMNS}
-            for k, v in payload.items():
-                if pd.isna(v):
-                    payload[k] = None
-            for dk in ["datum_povodneho_kontaktu","datum_dalsieho_kroku","datum_realizacie"]:
-                payload[dk] = parse_date_safe(payload.get(dk))
-            if is_duplicate_lead(session, payload):
-                skipped += 1
-                continue
-            obj = Lead(**payload)
-            session.add(obj)
-            imported += 1
-        session.commit()
-    finally:
-        session.close()
-    return (imported, skipped)
 
-def import_from_csv_mapped(SessionLocal, file_or_buffer) -> Tuple[int,int]:
-    """Import from CSV with mapping:
-        CSV: 'Meno' -> meno_zakaznika, 'Email' -> email, 'Phone' -> telefon, 'Vytovorene' -> datum_povodneho_kontaktu
-    """
+def _parse_csv_chunks(file_or_buffer, **read_kw) -> Tuple[List[Dict[str, Any]], Dict[str, Any]]:
     import pandas as pd
+    payloads: List[Dict[str, Any]] = []
+    report = None
+    first_row = 2
+    for raw in pd.read_csv(file_or_buffer, chunksize=IMPORT_PARSE_ROWS, **read_kw):
+        df = normalize_columns_generic(raw, CSV_ALIASES)
+        if report is None:
+            report = _new_import_report(raw.columns, df.columns, CSV_COLUMNS)
+        # Keep only mapped columns
+        df = df[[c for c in CSV_COLUMNS if c in df.columns]].copy()
+        _check_import_chunk(df, report, first_row)
+        first_row += len(raw)
+
+        # Defaults
+        df["priorita"] = "Stredná"
+        df["stav_leadu"] = "Open"
+        if "datum_povodneho_kontaktu" in df.columns:
+            df["datum_povodneho_kontaktu"] = pd.to_datetime(df["datum_povodneho_kontaktu"], errors="coerce").dt.date
+        payloads.extend(_payloads_from_frame(df, CSV_COLUMNS + ["priorita", "stav_leadu"], report))
+    if report is None:  # header only
+        report = _new_import_report([], [], CSV_COLUMNS)
+    return payloads, report
+
+
+def _parse_csv_mapped(file_or_buffer) -> Tuple[List[Dict[str, Any]], Dict[str, Any]]:
+    """CSV: 'Meno' -> meno_zakaznika, 'Email' -> email, 'Phone' -> telefon,
+    'Vytovorene' -> datum_povodneho_kontaktu; the rest is ignored."""
     if isinstance(file_or_buffer, (str, bytes, os.PathLike)):
-        df = pd.read_csv(file_or_buffer)
-    else:
-        # Uploaded file-like
-        try:
-            df = pd.read_csv(file_or_buffer)
-        except Exception:
-            # reset and try semicolon separator
-            file_or_buffer.seek(0)
-            df = pd.read_csv(file_or_buffer, sep=";")
-
-    aliases = {
-        "meno":"meno_zakaznika","Meno":"meno_zakaznika","Meno zákazníka":"meno_zakaznika",
-        "Email":"email","email":"email",
-        "Phone":"telefon","Telefón":"telefon","Telefon":"telefon","phone":"telefon",
-        "Vytovorene":"datum_povodneho_kontaktu","Vytvorené":"datum_povodneho_kontaktu","Vytvorene":"datum_povodneho_kontaktu",
-    }
-    df = normalize_columns_generic(df, aliases)
+        return _parse_csv_chunks(file_or_buffer)
+    # Uploaded file-like
+    try:
+        return _parse_csv_chunks(file_or_buffer)
+    except Exception:
+        # reset and try semicolon separator
+        file_or_buffer.seek(0)
+        return _parse_csv_chunks(file_or_buffer, sep=";")
+
 
-    # Keep only mapped columns
-    keep = ["meno_zakaznika","email","telefon","datum_povodneho_kontaktu"]
-    df = df[[c for c in keep if c in df.columns]].copy()
+def _duplicate_sources(payloads: List[Dict[str, Any]], existing=()) -> List[Optional[str]]:
+    """Why ``insert_leads_tx`` would skip each payload: ``"db"`` when it
+    matches a row of ``existing``, ``"file"`` when it matches an earlier,
+    not skipped payload (>= 2 of the fields of :func:`is_duplicate_lead`),
+    None when it would be inserted.
 
-    # Defaults
-    df["priorita"] = "Stredná"
-    df["stav_leadu"] = "Open"
+    Any two of the fields include the name, phone or email, so candidates
+    are looked up by those three only.
+    """
+    keys = ("meno_zakaznika", "telefon", "email")
+    fields = keys + ("datum_povodneho_kontaktu",)
+    rows: List[Dict[str, Any]] = []
+    index: Dict[tuple, List[int]] = {}
+
+    def remember(row):
+        rows.append(row)
+        for k in keys:
+            if row.get(k):
+                index.setdefault((k, row[k]), []).append(len(rows) - 1)
 
-    # Parse date
-    if "datum_povodneho_kontaktu" in df.columns:
-        df["datum_povodneho_kontaktu"] = pd.to_datetime(df["datum_povodneho_kontaktu"], errors="coerce").dt.date
+    for row in existing:
+        remember(row)
+    n_existing = len(rows)
+    sources: List[Optional[str]] = []
+    for p in payloads:
+        p = dict(p, datum_povodneho_kontaktu=parse_date_safe(p.get("datum_povodneho_kontaktu")))
+        candidates = {j for k in keys if p.get(k) for j in index.get((k, p[k]), ())}
+        matched = [j for j in candidates if sum(1 for f in fields if p.get(f) and rows[j].get(f) == p[f]) >= 2]
+        if not matched:
+            sources.append(None)
+            remember(p)
+        else:
+            sources.append("db" if min(matched) < n_existing else "file")
+    return sources
 
-    imported, skipped = 0, 0
+
+def _existing_matches(SessionLocal, payloads: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Leads and archived leads sharing a name, phone or email with ``payloads``."""
+    cols = ("meno_zakaznika", "telefon", "email", "datum_povodneho_kontaktu")
+    values = {k: sorted({p[k] for p in payloads if p.get(k)}) for k in cols[:3]}
+    found: List[Dict[str, Any]] = []
     session: Session = SessionLocal()
     try:
-        for _, r in df.iterrows():
-            if pd.isna(r.get("meno_zakaznika")):
-                skipped += 1
-                continue
-            meno = r.get("meno_zakaznika")
-            email = r.get("email")
-            telefon = r.get("telefon")
-            dpc = r.get("datum_povodneho_kontaktu")
-            payload = dict(
-                meno_zakaznika=None if pd.isna(meno) else meno,
-                email=None if pd.isna(email) else email,
-                telefon=None if pd.isna(telefon) else telefon,
-                datum_povodneho_kontaktu=None if pd.isna(dpc) else dpc,
-                priorita="Stredná",
-                stav_leadu="Open",
-            )
-            if is_duplicate_lead(session, payload):
-                skipped += 1
-                continue
-            obj = Lead(**payload)
-            session.add(obj)
-            imported += 1
-        session.commit()
+        for model in (Lead, ArchivedLead):
+            for k, vals in values.items():
+                # SQLite's limit of bound parameters in one IN (...)
+                for i in range(0, len(vals), 500):
+                    q = select(*[getattr(model, c) for c in cols]).where(getattr(model, k).in_(vals[i:i + 500]))
+                    found.extend(dict(zip(cols, r)) for r in session.execute(q))
     finally:
         session.close()
+    return found
+
+
+@perf.timed("db.preview_import")
+def preview_import(SessionLocal, file_or_buffer, filename: str) -> Dict[str, Any]:
+    """Parse an Excel/CSV upload without writing anything.
 
-    return (imported, skipped)
+    Returns ``{"source", "payloads", "report"}``: the payloads
+    :func:`commit_import` writes and a report with the column mapping
+    (``columns``: ``[(header, column or None)]``), the counts of values
+    the cleanup empties (``bad_dates``, ``bad_numbers``; per column),
+    ``unknown_values``, ``missing_name`` rows, ``duplicates_in_file`` /
+    ``duplicates_in_db`` by the rule of :func:`is_duplicate_lead`,
+    ``to_import`` and up to ``IMPORT_REPORT_EXAMPLES`` example rows.
+    """
+    if filename.lower().endswith((".xls", ".xlsx")):
+        payloads, report = _parse_excel_mapped(file_or_buffer)
+    else:
+        payloads, report = _parse_csv_mapped(file_or_buffer)
+    sources = _duplicate_sources(payloads, _existing_matches(SessionLocal, payloads))
+    report["duplicates_in_db"] = sources.count("db")
+    report["duplicates_in_file"] = sources.count("file")
+    report["to_import"] = sources.count(None)
+    return {"source": filename, "payloads": payloads, "report": report}
+
+
+@perf.timed("db.commit_import")
+def commit_import(SessionLocal, preview: Dict[str, Any]) -> Tuple[int, int]:
+    """Write the payloads of :func:`preview_import`; returns (imported, skipped).
+
+    Duplicates are checked again, so leads written since the preview are
+    skipped as well.
+    """
+    imported, duplicates = _insert_chunked(SessionLocal, preview["payloads"])
+    return (imported, preview["report"]["missing_name"] + duplicates)
+
+
+@perf.timed("db.import_from_excel_mapped")
+def import_from_excel_mapped(SessionLocal, file_or_buffer) -> Tuple[int,int]:
+    """Import leads from an Excel file with columns like 'Meno zákazníka',
+    'Telefón', etc. Returns (imported, skipped)."""
+    payloads, report = _parse_excel_mapped(file_or_buffer)
+    imported, duplicates = _insert_chunked(SessionLocal, payloads)
+    return (imported, report["missing_name"] + duplicates)
+
+@perf.timed("db.import_from_csv_mapped")
+def import_from_csv_mapped(SessionLocal, file_or_buffer) -> Tuple[int,int]:
+    """Import from CSV with mapping:
+        CSV: 'Meno' -> meno_zakaznika, 'Email' -> email, 'Phone' -> telefon, 'Vytovorene' -> datum_povodneho_kontaktu
+    """
+    payloads, report = _parse_csv_mapped(file_or_buffer)
+    imported, duplicates = _insert_chunked(SessionLocal, payloads)
+    return (imported, report["missing_name"] + duplicates)
 
 def ensure_category_values(SessionLocal):
     """Optional: ensure there is at least one value for select boxes."""
@@ -0,0 +1,161 @@
+# -*- coding: utf-8 -*-
+"""Export of the filtered lead list to CSV and Excel.
+
+The filter panel and the full-text box of the grid are translated into a
+SQL condition (:func:`lead_filter`), and matching rows are read in id
+order in chunks of ``CHUNK_SIZE``, each chunk in its own short read, so
+memory stays flat and writers are never blocked for the whole export.
+Headers are :data:`utils.EXPORT_HEADERS`, so an export can be imported again.
+
+Usage from the command line::
+
+    python export.py --format xlsx --out leads.xlsx --stav Open --search novák
+"""
+import argparse
+import csv
+import io
+import sys
+import tempfile
+from datetime import date
+from typing import Iterator, List, Optional, Sequence
+
+from sqlalchemy import and_, func, or_, select, true
+from sqlalchemy.orm.session import Session
+
+from db import EXPORT_HEADERS, Lead
+
+CHUNK_SIZE = 1000
+
+# same columns as the full-text search above the grid
+SEARCH_COLUMNS = [
+    "meno_zakaznika", "telefon", "email", "mesto", "typ_dopytu", "stav_projektu",
+    "reakcia_zakaznika", "dalsi_krok", "poznamky",
+]
+
+EXPORT_COLUMNS = list(EXPORT_HEADERS)
+
+CSV_MIME = "text/csv"
+XLSX_MIME = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+
+
+def _like_escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+
+def lead_filter(stav_leadu: Sequence[str] = (), priorita: Sequence[str] = (),
+                typ_dopytu: Sequence[str] = (), mesto: Sequence[str] = (),
+                search: Optional[str] = None):
+    """SQL condition equivalent to the grid's filter panel and full-text box."""
+    conditions = []
+    for col, values in (("stav_leadu", stav_leadu), ("priorita", priorita),
+                        ("typ_dopytu", typ_dopytu), ("mesto", mesto)):
+        if values:
+            conditions.append(getattr(Lead, col).in_(list(values)))
+    q = (search or "").lower().strip()
+    if q:
+        # lower() is the Unicode-aware function registered in db._on_connect
+        pattern = f"%{_like_escape(q)}%"
+        conditions.append(or_(*[
+            func.lower(func.coalesce(getattr(Lead, c), "")).like(pattern, escape="\\") for c in SEARCH_COLUMNS
+        ]))
+    return and_(*conditions) if conditions else true()
+
+
+def iter_rows(SessionLocal, cond, chunk_size: int = CHUNK_SIZE) -> Iterator[List[tuple]]:
+    """Yield lists of row tuples (``EXPORT_COLUMNS`` order) matching ``cond``."""
+    cols = [getattr(Lead, c) for c in EXPORT_COLUMNS]
+    last_id = 0
+    while True:
+        session: Session = SessionLocal()
+        try:
+            rows = session.execute(
+                select(Lead.id, *cols).where(cond, Lead.id > last_id).order_by(Lead.id).limit(chunk_size)
+            ).all()
+        finally:
+            session.close()
+        if not rows:
+            return
+        last_id = rows[-1][0]
+        yield [tuple(r[1:]) for r in rows]
+        if len(rows) < chunk_size:
+            return
+
+
+def _csv_value(value):
+    if value is None:
+        return ""
+    if isinstance(value, date):
+        return value.isoformat()
+    return value
+
+
+def iter_csv(SessionLocal, cond, chunk_size: int = CHUNK_SIZE) -> Iterator[bytes]:
+    """Yield the CSV export chunk by chunk (UTF-8 with BOM, so Excel reads diacritics)."""
+    buf = io.StringIO()
+    writer = csv.writer(buf)
+    writer.writerow([EXPORT_HEADERS[c] for c in EXPORT_COLUMNS])
+    yield ("\ufeff" + buf.getvalue()).encode("utf-8")
+    for rows in iter_rows(SessionLocal, cond, chunk_size):
+        buf.seek(0)
+        buf.truncate()
+        writer.writerows([_csv_value(v) for v in row] for row in rows)
+        yield buf.getvalue().encode("utf-8")
+
+
+def write_csv(SessionLocal, cond, fh) -> None:
+    for chunk in iter_csv(SessionLocal, cond):
+        fh.write(chunk)
+
+
+def write_xlsx(SessionLocal, cond, fh) -> None:
+    """Write the export as .xlsx with openpyxl's write-only workbook (rows are
+    streamed to a temporary file instead of being kept as cell objects)."""
+    from openpyxl import Workbook
+
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet("Leads")
+    ws.append([EXPORT_HEADERS[c] for c in EXPORT_COLUMNS])
+    for rows in iter_rows(SessionLocal, cond):
+        for row in rows:
+            ws.append(row)
+    wb.save(fh)
+
+
+def export_file(SessionLocal, cond, fmt: str):
+    """Build the export into a spooled temporary file (kept in memory up to
+    8 MB, then on disk) and return it rewound, ready for a download."""
+    fh = tempfile.SpooledTemporaryFile(max_size=8 * 1024 * 1024)
+    if fmt == "xlsx":
+        write_xlsx(SessionLocal, cond, fh)
+    else:
+        write_csv(SessionLocal, cond, fh)
+    fh.seek(0)
+    return fh
+
+
+def main(argv=None):
+    from db import get_engine_session
+
+    parser = argparse.ArgumentParser(description="Export leadov do CSV / Excelu")
+    parser.add_argument("--format", choices=["csv", "xlsx"], default="csv")
+    parser.add_argument("--out", default="-", help="výstupný súbor (- = stdout, len CSV)")
+    parser.add_argument("--stav", action="append", default=[], help="stav leadu (opakovateľné)")
+    parser.add_argument("--priorita", action="append", default=[])
+    parser.add_argument("--typ", action="append", default=[])
+    parser.add_argument("--mesto", action="append", default=[])
+    parser.add_argument("--search", default=None, help="full-text ako v gride")
+    args = parser.parse_args(argv)
+
+    _, SessionLocal = get_engine_session()
+    cond = lead_filter(args.stav, args.priorita, args.typ, args.mesto, args.search)
+    if args.out == "-":
+        if args.format != "csv":
+            parser.error("xlsx vyžaduje --out")
+        write_csv(SessionLocal, cond, sys.stdout.buffer)
+        return
+    with open(args.out, "wb") as fh:
+        (write_xlsx if args.format == "xlsx" else write_csv)(SessionLocal, cond, fh)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,100 @@
+# -*- coding: utf-8 -*-
+"""Process-wide cache of built Plotly figures.
+
+The Summary page draws the same charts on every rerun, although they only
+change when the data does.  :func:`figure` keys a chart by its id, the
+parameters it was drawn with and the change sequence number of the data
+(``db.current_change_seq``) and keeps the built ``Figure`` in an LRU
+bounded by the total size of the figures' JSON specs
+(``REMARK_CRM_FIGURE_CACHE_MB``, default 32).  On a hit neither the
+statistics behind the chart nor ``plotly.express`` run, and the cached
+object is returned as it is – no ``Figure`` is constructed or validated::
+
+    fig = figcache.figure(SessionLocal, "summary.priority", (), seq,
+                          lambda: px.pie(stats.counts_by(df, "priorita"), ...))
+    st.plotly_chart(fig, use_container_width=True)
+
+One figure is shared by every session of the process, so it is read-only:
+hand it to ``st.plotly_chart`` (which only copies it with ``to_dict``)
+and put any ``update_layout`` and the like into ``build``.
+"""
+import os
+import threading
+from collections import OrderedDict
+from typing import TYPE_CHECKING, Callable, Hashable, Optional, Tuple
+
+import perf
+
+if TYPE_CHECKING:
+    import plotly.graph_objects as go
+
+FIGURE_CACHE_BYTES = int(float(os.environ.get("REMARK_CRM_FIGURE_CACHE_MB", "32")) * 1024 * 1024)
+
+
+class FigureCache:
+    """Thread-safe LRU of figures bounded by the total size of their JSON
+    specs in bytes."""
+
+    def __init__(self, max_bytes: int = FIGURE_CACHE_BYTES):
+        self.max_bytes = max_bytes
+        self._data: "OrderedDict[Hashable, Tuple[go.Figure, int]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._bytes = 0
+
+    @property
+    def size_bytes(self) -> int:
+        return self._bytes
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def get(self, key: Hashable) -> Optional["go.Figure"]:
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return None
+            self._data.move_to_end(key)
+            return entry[0]
+
+    def put(self, key: Hashable, fig: "go.Figure") -> None:
+        """Store ``fig``; one whose spec is larger than the whole cache is not kept."""
+        size = len(fig.to_json().encode("utf-8"))
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            old = self._data.pop(key, None)
+            if old is not None:
+                self._bytes -= old[1]
+            self._data[key] = (fig, size)
+            self._bytes += size
+            while self._bytes > self.max_bytes:
+                _, (_, evicted) = self._data.popitem(last=False)
+                self._bytes -= evicted
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+            self._bytes = 0
+
+
+figure_cache = FigureCache()
+
+
+def figure(SessionLocal, chart_id: str, params: Hashable, seq: int,
+           build: Callable[[], "go.Figure"]) -> "go.Figure":
+    """Return chart ``chart_id`` for data at change sequence ``seq``.
+
+    ``params`` holds everything besides the data the chart depends on
+    (e.g. the trend period) and must be hashable.  ``build`` draws the
+    figure on a miss.  The result is shared; do not modify it.
+    """
+    key = (str(SessionLocal.kw["bind"].url), chart_id, params, seq)
+    fig = figure_cache.get(key)
+    if fig is not None:
+        perf.count("figure_cache_hits")
+        return fig
+    perf.count("figure_cache_misses")
+    with perf.span(f"figcache.build.{chart_id}"):
+        fig = build()
+    figure_cache.put(key, fig)
+    return fig
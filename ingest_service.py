@@ -0,0 +1,241 @@
+# -*- coding: utf-8 -*-
+"""HTTP endpoint for leads from the web form and other integrations.
+
+    python ingest_service.py --port 8765
+
+``POST /leads`` takes one lead (a JSON object with the DB column names,
+e.g. ``{"meno_zakaznika": "Ján Novák", "telefon": "+421905..."}``) or a
+batch (a JSON list, or ``{"leads": [...]}``).  Every item is validated
+with the rules of the "Nový lead" dialog (:func:`utils.validate_new_lead`)
+and skipped when it duplicates an existing lead or an earlier item of the
+batch by the same >= 2 field rule as :func:`db.is_duplicate_lead`.  The
+response has one result per item, in order::
+
+    {"results": [{"status": "created", "id": 812},
+                 {"status": "duplicate"},
+                 {"status": "invalid", "errors": ["Uveďte telefón alebo email."]}],
+     "created": 1, "duplicates": 1, "invalid": 1}
+
+Inserts go through the write queue (:func:`db.run_write`): single leads
+from concurrent requests are group-committed together, batches are
+written in chunks of ``db.IMPORT_CHUNK_SIZE``.  ``GET /health`` answers
+``{"status": "ok"}``.  A ``POST`` needs a ``Content-Length`` header (411
+without it, 400 when it is not a non-negative integer).  When ``REMARK_CRM_INGEST_TOKEN`` is set, requests
+need the header ``Authorization: Bearer <token>``.
+"""
+import argparse
+import hmac
+import json
+import logging
+import math
+import os
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Tuple
+
+from sqlalchemy import Date, Float
+
+from db import IMPORT_CHUNK_SIZE, Lead, insert_leads_ids_tx, run_write, run_write_chunks
+from utils import EXPORT_HEADERS, parse_date_safe, slovak_tz_now_date, validate_new_lead
+
+log = logging.getLogger("remark_crm.ingest")
+
+INGEST_TOKEN = os.environ.get("REMARK_CRM_INGEST_TOKEN") or None
+MAX_BODY_BYTES = 5 * 1024 * 1024
+MAX_BATCH = 1000
+
+# columns a client may send; id, version, updated_at and score are the database's
+INPUT_COLUMNS = {
+    c.name: c.type for c in Lead.__table__.columns if c.name not in ("id", "version", "updated_at", "score")
+}
+
+# the dialog's preselected values
+DEFAULTS = {"priorita": "Stredná", "stav_leadu": "Open"}
+
+
+def payload_from_json(item: Any) -> Tuple[Dict[str, Any], List[str]]:
+    """Coerce one JSON lead to a DB payload; returns ``(payload, errors)``."""
+    if not isinstance(item, dict):
+        return {}, ["Položka musí byť JSON objekt."]
+    errors = []
+    unknown = sorted(set(item) - set(INPUT_COLUMNS))
+    if unknown:
+        errors.append(f"Neznáme polia: {', '.join(unknown)}.")
+    payload: Dict[str, Any] = {}
+    for key, type_ in INPUT_COLUMNS.items():
+        value = item.get(key)
+        label = EXPORT_HEADERS.get(key, key)
+        if value is None or (isinstance(value, str) and not value.strip()):
+            payload[key] = None
+        elif isinstance(type_, Date):
+            parsed = parse_date_safe(value)
+            if parsed is None:
+                errors.append(f"{label}: neplatný dátum {value!r}.")
+            payload[key] = parsed
+        elif isinstance(type_, Float):
+            try:
+                if isinstance(value, bool):
+                    raise ValueError
+                number = float(value)
+                # "nan", "inf" and 1e400 parse, but are no amount
+                if not math.isfinite(number):
+                    raise ValueError
+                payload[key] = number
+            except (TypeError, ValueError):
+                errors.append(f"{label}: neplatné číslo {value!r}.")
+                payload[key] = None
+        else:
+            payload[key] = str(value).strip()
+    for key, value in DEFAULTS.items():
+        payload[key] = payload[key] or value
+    # the dialog preselects today as well
+    payload["datum_povodneho_kontaktu"] = payload["datum_povodneho_kontaktu"] or slovak_tz_now_date()
+    return payload, errors + validate_new_lead(payload)
+
+
+def ingest(SessionLocal, items: List[Any]) -> Dict[str, Any]:
+    """Validate, deduplicate and insert ``items``; returns the response body."""
+    results: List[Dict[str, Any]] = []
+    valid: List[Tuple[int, Dict[str, Any]]] = []
+    for i, item in enumerate(items):
+        payload, errors = payload_from_json(item)
+        if errors:
+            results.append({"status": "invalid", "errors": errors})
+        else:
+            results.append({})
+            valid.append((i, payload))
+
+    payloads = [p for _, p in valid]
+    if len(payloads) == 1:
+        ids = run_write(SessionLocal, insert_leads_ids_tx, payloads)
+    elif payloads:
+        chunks = run_write_chunks(SessionLocal, insert_leads_ids_tx, payloads, IMPORT_CHUNK_SIZE)
+        ids = [rid for chunk in chunks for rid in chunk]
+    else:
+        ids = []
+    for (i, _), rid in zip(valid, ids):
+        results[i] = {"status": "created", "id": rid} if rid else {"status": "duplicate"}
+
+    created = sum(1 for r in results if r["status"] == "created")
+    return {
+        "results": results,
+        "created": created,
+        "duplicates": len(valid) - created,
+        "invalid": len(items) - len(valid),
+    }
+
+
+class IngestHandler(BaseHTTPRequestHandler):
+    server_version = "RemarkIngest/1.0"
+    # keep-alive, so integrations can reuse one connection; without
+    # TCP_NODELAY the body waits for the ACK of the headers (~40 ms)
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+
+    def log_message(self, format, *args):
+        log.debug("%s - %s", self.address_string(), format % args)
+
+    def _send(self, status: int, body: Dict[str, Any]) -> None:
+        data = json.dumps(body, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _authorized(self) -> bool:
+        if INGEST_TOKEN is None:
+            return True
+        return hmac.compare_digest(self.headers.get("Authorization", ""), f"Bearer {INGEST_TOKEN}")
+
+    def do_GET(self):
+        if self.path.rstrip("/") == "/health":
+            self._send(200, {"status": "ok"})
+        else:
+            self._send(404, {"error": "Neznáma adresa."})
+
+    def do_POST(self):
+        if self.path.rstrip("/") != "/leads":
+            self._send(404, {"error": "Neznáma adresa."})
+            return
+        if not self._authorized():
+            self._send(401, {"error": "Chýba alebo nesedí token."})
+            return
+        raw_length = self.headers.get("Content-Length")
+        if raw_length is None:
+            # the body, if any, cannot be told apart from the next request
+            self.close_connection = True
+            self._send(411, {"error": "Chýba hlavička Content-Length."})
+            return
+        try:
+            length = int(raw_length)
+            if length < 0:
+                raise ValueError
+        except ValueError:
+            self.close_connection = True
+            self._send(400, {"error": f"Neplatná hlavička Content-Length: {raw_length!r}."})
+            return
+        if length > MAX_BODY_BYTES:
+            self.close_connection = True
+            self._send(413, {"error": f"Telo požiadavky je väčšie ako {MAX_BODY_BYTES} B."})
+            return
+        try:
+            body = json.loads(self.rfile.read(length) or b"null")
+        except (UnicodeDecodeError, json.JSONDecodeError) as e:
+            self._send(400, {"error": f"Neplatný JSON: {e}"})
+            return
+        if isinstance(body, dict) and isinstance(body.get("leads"), list):
+            items = body["leads"]
+        elif isinstance(body, list):
+            items = body
+        elif isinstance(body, dict):
+            items = [body]
+        else:
+            self._send(400, {"error": "Očakáva sa JSON objekt alebo zoznam leadov."})
+            return
+        if len(items) > MAX_BATCH:
+            self._send(413, {"error": f"Najviac {MAX_BATCH} leadov v jednej požiadavke."})
+            return
+        try:
+            self._send(200, ingest(self.server.SessionLocal, items))
+        except Exception as e:
+            # chunks written before the failure stay committed; a retry of
+            # the whole batch reports them as duplicates
+            log.exception("Zápis leadov zlyhal")
+            self._send(500, {"error": f"{type(e).__name__}: {e}"})
+
+
+class IngestServer(ThreadingHTTPServer):
+    daemon_threads = True
+    # the default backlog of 5 resets connections under a burst of clients
+    request_queue_size = 128
+
+
+def make_server(SessionLocal, host: str = "127.0.0.1", port: int = 8765) -> IngestServer:
+    server = IngestServer((host, port), IngestHandler)
+    server.SessionLocal = SessionLocal
+    return server
+
+
+def main(argv=None):
+    from db import get_engine_session, init_db
+
+    parser = argparse.ArgumentParser(description="HTTP služba na príjem leadov (web formulár, integrácie)")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+    engine, SessionLocal = get_engine_session()
+    init_db(engine)
+    server = make_server(SessionLocal, args.host, args.port)
+    log.info("Príjem leadov na http://%s:%d/leads", args.host, server.server_port)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
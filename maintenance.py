@@ -0,0 +1,409 @@
+# -*- coding: utf-8 -*-
+"""Routine maintenance of the SQLite file.
+
+Dedup deletes, archive moves and the change log leave free pages behind
+and make the planner statistics stale.  :func:`run_maintenance` looks at
+the database (:func:`database_stats`) and runs what is due:
+
+* ``PRAGMA optimize`` – every run, cheap,
+* ``ANALYZE`` – when there are no statistics yet, when more than
+  ``ANALYZE_CHANGE_RATIO`` of the leads changed since the last ANALYZE or
+  after ``ANALYZE_MAX_AGE_DAYS``,
+* ``PRAGMA incremental_vacuum`` – when the free-page ratio exceeds
+  ``REMARK_CRM_FREELIST_RATIO`` (default 0.1); needs ``auto_vacuum =
+  INCREMENTAL``, which :func:`db.init_db` sets on new databases (older
+  files are converted once with ``python maintenance.py --vacuum``),
+* pruning of ``lead_changes`` to the newest ``KEEP_CHANGES`` entries,
+* recomputing every lead's score (:func:`scoring.rescore_all`) once per
+  calendar day, since the next-step points depend on the date,
+* ``PRAGMA quick_check``.
+
+Writing tasks go through the write queue, the vacuum in steps of
+``VACUUM_STEP_PAGES`` pages, so the app's edits get in between.  Every
+task is recorded in ``maintenance_runs`` with the file size before and
+after as soon as it finished, a run that raised as a ``failed`` row; the
+timings of a few typical queries (:data:`PROBES`) before and after the
+run are logged as well.
+
+The app calls :func:`maybe_run_scheduled` on every rerun; it starts a
+background run when the last one is older than
+``REMARK_CRM_MAINTENANCE_HOURS`` (default 24, 0 disables the schedule),
+or only the rescore when the day changed since the last one.  When the
+next run is due is kept in memory, so most reruns do not query
+``maintenance_runs`` at all; after a failure it waits
+``FAILED_RETRY_HOURS``.
+
+Usage from the command line::
+
+    python maintenance.py            # run what is due
+    python maintenance.py --force    # run every task
+    python maintenance.py --stats    # only print the statistics
+    python maintenance.py --vacuum   # full VACUUM (blocks the app while it runs)
+"""
+import argparse
+import json
+import logging
+import os
+import threading
+import time
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional
+
+from sqlalchemy import text
+from sqlalchemy.orm.session import Session
+
+from db import (
+    MaintenanceRun, current_change_seq, prune_lead_changes, run_write, run_write_chunks, _utcnow,
+)
+from utils import slovak_tz_now_date
+
+log = logging.getLogger("remark_crm.maintenance")
+
+MAINTENANCE_INTERVAL_HOURS = float(os.environ.get("REMARK_CRM_MAINTENANCE_HOURS", "24"))
+FREELIST_THRESHOLD = float(os.environ.get("REMARK_CRM_FREELIST_RATIO", "0.1"))
+ANALYZE_CHANGE_RATIO = 0.2
+ANALYZE_MAX_AGE_DAYS = 7
+KEEP_CHANGES = 100_000
+VACUUM_STEP_PAGES = 500
+# a failed scheduled run is retried after this many hours
+FAILED_RETRY_HOURS = 1.0
+
+TABLES = ["leads", "leads_archive", "lead_events", "lead_changes"]
+AUTO_VACUUM_MODES = {0: "none", 1: "full", 2: "incremental"}
+
+# typical statements of the app, timed before and after a run
+PROBES = {
+    "count_leads": "SELECT COUNT(*) FROM leads",
+    "filter_status": "SELECT id FROM leads WHERE stav_leadu = 'Open' AND priorita = 'Vysoká'",
+    "dedup_phone": "SELECT id FROM leads WHERE telefon = '+421 900 000 000'",
+    "lead_history": "SELECT * FROM lead_events WHERE lead_id = 1 ORDER BY ts",
+    "status_events": "SELECT lead_id, ts FROM lead_events WHERE field = 'stav_leadu' ORDER BY lead_id, ts",
+}
+
+
+def _db_path(SessionLocal) -> Optional[str]:
+    return SessionLocal.kw["bind"].url.database
+
+
+def _file_size(SessionLocal) -> Optional[int]:
+    path = _db_path(SessionLocal)
+    return os.path.getsize(path) if path and os.path.exists(path) else None
+
+
+def database_stats(SessionLocal) -> Dict[str, Any]:
+    """Page counts, free-page ratio, auto_vacuum mode, file size and row counts."""
+    session: Session = SessionLocal()
+    try:
+        pragma = lambda name: session.execute(text(f"PRAGMA {name}")).scalar()
+        page_count = pragma("page_count")
+        freelist = pragma("freelist_count")
+        stats = {
+            "page_size": pragma("page_size"),
+            "page_count": page_count,
+            "freelist_count": freelist,
+            "freelist_ratio": round(freelist / page_count, 4) if page_count else 0.0,
+            "auto_vacuum": AUTO_VACUUM_MODES.get(pragma("auto_vacuum"), "?"),
+            "file_bytes": _file_size(SessionLocal),
+            "has_stats": bool(session.execute(
+                text("SELECT 1 FROM sqlite_master WHERE name = 'sqlite_stat1'")
+            ).scalar()),
+            "tables": {},
+        }
+        for table in TABLES:
+            stats["tables"][table] = session.execute(text(f"SELECT COUNT(*) FROM {table}")).scalar()
+        return stats
+    finally:
+        session.close()
+
+
+def probe_queries(SessionLocal, repeat: int = 3) -> Dict[str, float]:
+    """Best-of-``repeat`` time in ms of each statement in :data:`PROBES`."""
+    session: Session = SessionLocal()
+    try:
+        timings = {}
+        for name, sql in PROBES.items():
+            best = None
+            for _ in range(repeat):
+                t0 = time.perf_counter()
+                session.execute(text(sql)).fetchall()
+                ms = (time.perf_counter() - t0) * 1000
+                best = ms if best is None else min(best, ms)
+            timings[name] = round(best, 3)
+        return timings
+    finally:
+        session.close()
+
+
+def last_run(SessionLocal, task: str) -> Optional[Dict[str, Any]]:
+    session: Session = SessionLocal()
+    try:
+        row = (
+            session.query(MaintenanceRun)
+            .filter(MaintenanceRun.task == task)
+            .order_by(MaintenanceRun.ts.desc())
+            .first()
+        )
+        if row is None:
+            return None
+        return dict(ts=row.ts, seconds=row.seconds, size_before=row.size_before,
+                    size_after=row.size_after, details=json.loads(row.details or "{}"))
+    finally:
+        session.close()
+
+
+def plan_tasks(SessionLocal, stats: Dict[str, Any], now: datetime, force: bool = False) -> Dict[str, str]:
+    """Return ``{task: reason}`` for the tasks that are due."""
+    tasks = {"optimize": "vždy"}
+    seq = current_change_seq(SessionLocal)
+    last_analyze = last_run(SessionLocal, "analyze")
+    if force:
+        tasks["analyze"] = "vynútené"
+    elif not stats["has_stats"] or last_analyze is None:
+        tasks["analyze"] = "chýbajú štatistiky"
+    else:
+        changed = seq - last_analyze["details"].get("seq", 0)
+        rows = max(stats["tables"]["leads"], 1)
+        if changed / rows >= ANALYZE_CHANGE_RATIO:
+            tasks["analyze"] = f"{changed} zmien od poslednej analýzy"
+        elif now - last_analyze["ts"] >= timedelta(days=ANALYZE_MAX_AGE_DAYS):
+            tasks["analyze"] = f"staršia ako {ANALYZE_MAX_AGE_DAYS} dní"
+    if stats["auto_vacuum"] == "incremental" and stats["freelist_count"] and (
+        force or stats["freelist_ratio"] >= FREELIST_THRESHOLD
+    ):
+        tasks["incremental_vacuum"] = f"voľné strany {stats['freelist_ratio']:.1%}"
+    if stats["tables"]["lead_changes"] > KEEP_CHANGES:
+        tasks["prune_changes"] = f"{stats['tables']['lead_changes']} záznamov v lead_changes"
+    if force or rescore_due(SessionLocal):
+        tasks["rescore"] = "nový deň"
+    tasks["quick_check"] = "vždy"
+    return tasks
+
+
+# --- tasks (session-level, run through the write queue) ---
+
+def _optimize_tx(session: Session) -> None:
+    session.execute(text("PRAGMA optimize"))
+
+
+def _analyze_tx(session: Session) -> None:
+    session.execute(text("ANALYZE"))
+
+
+def _vacuum_step_tx(session: Session, pages: List[int]) -> int:
+    conn = session.connection()
+    before = conn.exec_driver_sql("PRAGMA freelist_count").scalar()
+    # incremental_vacuum frees one page per step, but sqlite3 steps a
+    # statement without result columns only once
+    for _ in range(min(int(pages[0]), before)):
+        conn.exec_driver_sql("PRAGMA incremental_vacuum(1)")
+    return before - conn.exec_driver_sql("PRAGMA freelist_count").scalar()
+
+
+def _record_tx(session: Session, rows: List[Dict[str, Any]]) -> None:
+    session.add_all([MaintenanceRun(**r) for r in rows])
+
+
+def _quick_check(SessionLocal) -> str:
+    session: Session = SessionLocal()
+    try:
+        rows = session.execute(text("PRAGMA quick_check")).fetchall()
+        return "ok" if [r[0] for r in rows] == ["ok"] else "; ".join(r[0] for r in rows[:10])
+    finally:
+        session.close()
+
+
+def _record(SessionLocal, row: Dict[str, Any]) -> None:
+    run_write(SessionLocal, _record_tx, [dict(row, details=json.dumps(row["details"], ensure_ascii=False))])
+
+
+def run_maintenance(SessionLocal, force: bool = False, only: Optional[List[str]] = None) -> Dict[str, Any]:
+    """Run the due tasks (those of them in ``only``, when given) and return a
+    report (stats and probe timings before/after, one entry per task).
+
+    Each task is recorded as soon as it finished.  When a step raises, a
+    ``failed`` row naming it is recorded before the error propagates, so
+    the tasks done so far are kept and the scheduler can back off.
+    """
+    now = _utcnow()
+    step = "plan"
+    try:
+        stats_before = database_stats(SessionLocal)
+        probes_before = probe_queries(SessionLocal)
+        tasks = plan_tasks(SessionLocal, stats_before, now, force)
+        if only is not None:
+            tasks = {task: reason for task, reason in tasks.items() if task in only}
+        results = []
+        for task, reason in tasks.items():
+            step = task
+            size_before = _file_size(SessionLocal)
+            t0 = time.perf_counter()
+            details: Dict[str, Any] = {"reason": reason}
+            if task == "optimize":
+                run_write(SessionLocal, _optimize_tx)
+            elif task == "analyze":
+                details["seq"] = current_change_seq(SessionLocal)
+                run_write(SessionLocal, _analyze_tx)
+            elif task == "incremental_vacuum":
+                steps = -(-stats_before["freelist_count"] // VACUUM_STEP_PAGES)
+                freed = run_write_chunks(SessionLocal, _vacuum_step_tx, [VACUUM_STEP_PAGES] * steps, 1)
+                details["pages_freed"] = sum(freed)
+            elif task == "prune_changes":
+                details["removed"] = prune_lead_changes(SessionLocal, keep_last=KEEP_CHANGES)
+            elif task == "rescore":
+                # numpy is only needed here; the CLI tools start without it
+                import scoring
+                today = slovak_tz_now_date()
+                details["day"] = today.isoformat()
+                details["changed"] = scoring.rescore_all(SessionLocal, today)
+            elif task == "quick_check":
+                details["result"] = _quick_check(SessionLocal)
+                if details["result"] != "ok":
+                    log.error("PRAGMA quick_check: %s", details["result"])
+            r = dict(ts=now, task=task, seconds=round(time.perf_counter() - t0, 3),
+                     size_before=size_before, size_after=_file_size(SessionLocal), details=details)
+            _record(SessionLocal, r)
+            results.append(r)
+            log.info("Údržba %s (%s): %.2f s, súbor %s -> %s B", task, reason,
+                     r["seconds"], r["size_before"], r["size_after"])
+        step = "probes"
+        probes_after = probe_queries(SessionLocal)
+        stats_after = database_stats(SessionLocal)
+    except Exception as e:
+        _record(SessionLocal, dict(ts=_utcnow(), task="failed", seconds=None, size_before=None,
+                                   size_after=_file_size(SessionLocal),
+                                   details={"step": step, "error": f"{type(e).__name__}: {e}"}))
+        raise
+    log.info("Časy dotazov pred/po (ms): %s",
+             ", ".join(f"{k} {probes_before[k]:.1f}/{probes_after[k]:.1f}" for k in PROBES))
+    return {
+        "stats_before": stats_before,
+        "stats_after": stats_after,
+        "probes_before": probes_before,
+        "probes_after": probes_after,
+        "tasks": results,
+    }
+
+
+def full_vacuum(SessionLocal, incremental: bool = True) -> Dict[str, Any]:
+    """Rebuild the file with ``VACUUM`` (optionally switching it to
+    ``auto_vacuum = INCREMENTAL``).  Holds the database for the whole run,
+    so it is only offered from the command line."""
+    engine = SessionLocal.kw["bind"]
+    size_before = _file_size(SessionLocal)
+    t0 = time.perf_counter()
+    with engine.connect() as conn:
+        if incremental:
+            conn.exec_driver_sql("PRAGMA auto_vacuum = INCREMENTAL")
+        conn.exec_driver_sql("VACUUM")
+    seconds = round(time.perf_counter() - t0, 3)
+    row = dict(ts=_utcnow(), task="vacuum", seconds=seconds, size_before=size_before,
+               size_after=_file_size(SessionLocal), details=json.dumps({"reason": "ručne"}))
+    run_write(SessionLocal, _record_tx, [row])
+    return row
+
+
+# --- Scheduling ---
+
+_running = threading.Lock()
+last_report: Optional[Dict[str, Any]] = None
+# database url -> (UTC time of the next check, local day it was made on);
+# until then maybe_run_scheduled answers without touching the database
+_next_check: Dict[str, tuple] = {}
+
+
+def maintenance_due(SessionLocal, interval_hours: float = MAINTENANCE_INTERVAL_HOURS) -> bool:
+    if interval_hours <= 0:
+        return False
+    last = last_run(SessionLocal, "optimize")
+    return last is None or _utcnow() - last["ts"] >= timedelta(hours=interval_hours)
+
+
+def rescore_due(SessionLocal) -> bool:
+    """True when the scores were last recomputed on an earlier (local) day."""
+    last = last_run(SessionLocal, "rescore")
+    return last is None or last["details"].get("day") != slovak_tz_now_date().isoformat()
+
+
+def _schedule(SessionLocal, now: datetime, today: str) -> Optional[bool]:
+    """``True`` for a full run, ``False`` for just the rescore, ``None``
+    when nothing is due; remembers when to look again in the latter case."""
+    key = str(SessionLocal.kw["bind"].url)
+    failed = last_run(SessionLocal, "failed")
+    if failed is not None and now - failed["ts"] < timedelta(hours=FAILED_RETRY_HOURS):
+        _next_check[key] = (failed["ts"] + timedelta(hours=FAILED_RETRY_HOURS), today)
+        return None
+    last = last_run(SessionLocal, "optimize")
+    interval = timedelta(hours=MAINTENANCE_INTERVAL_HOURS)
+    if last is None or now - last["ts"] >= interval:
+        return True
+    if rescore_due(SessionLocal):
+        return False
+    _next_check[key] = (last["ts"] + interval, today)
+    return None
+
+
+def maybe_run_scheduled(SessionLocal) -> bool:
+    """Start a background maintenance run if the schedule says one is due
+    (just the rescore when only the day changed).
+
+    The database is only asked once the remembered next check time or the
+    local day has passed; after a failed run the next attempt waits
+    ``FAILED_RETRY_HOURS``.
+    """
+    if _running.locked() or MAINTENANCE_INTERVAL_HOURS <= 0:
+        return False
+    key = str(SessionLocal.kw["bind"].url)
+    now, today = _utcnow(), slovak_tz_now_date().isoformat()
+    stamp = _next_check.get(key)
+    if stamp is not None and now < stamp[0] and stamp[1] == today:
+        return False
+    full = _schedule(SessionLocal, now, today)
+    if full is None:
+        return False
+    if not _running.acquire(blocking=False):
+        return False
+
+    def work():
+        global last_report
+        try:
+            last_report = run_maintenance(SessionLocal, only=None if full else ["rescore"])
+            _next_check.pop(key, None)
+        except Exception:
+            log.exception("Údržba databázy zlyhala")
+            _next_check[key] = (_utcnow() + timedelta(hours=FAILED_RETRY_HOURS), today)
+        finally:
+            _running.release()
+
+    threading.Thread(target=work, name="remark-maintenance", daemon=True).start()
+    return True
+
+
+def main(argv=None):
+    from db import get_engine_session, init_db
+
+    parser = argparse.ArgumentParser(description="Údržba databázy CRM")
+    parser.add_argument("--force", action="store_true", help="spustiť všetky úlohy")
+    parser.add_argument("--stats", action="store_true", help="len vypísať štatistiky")
+    parser.add_argument("--vacuum", action="store_true",
+                        help="úplný VACUUM a prepnutie na auto_vacuum=INCREMENTAL (blokuje aplikáciu)")
+    args = parser.parse_args(argv)
+
+    engine, SessionLocal = get_engine_session()
+    init_db(engine)
+    if args.stats:
+        print(json.dumps(database_stats(SessionLocal), indent=2, ensure_ascii=False))
+        return
+    if args.vacuum:
+        row = full_vacuum(SessionLocal)
+        print(f"VACUUM: {row['seconds']:.2f} s, {row['size_before']} -> {row['size_after']} B")
+        return
+    report = run_maintenance(SessionLocal, force=args.force)
+    for r in report["tasks"]:
+        print(f"{r['task']:20s} {r['seconds']:7.2f} s  {r['size_before']} -> {r['size_after']} B  "
+              f"{json.dumps(r['details'], ensure_ascii=False)}")
+    for name in PROBES:
+        print(f"{name:20s} {report['probes_before'][name]:8.2f} -> {report['probes_after'][name]:8.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+# -*- coding: utf-8 -*-
+"""Value lists for the filter panel and the grid's select editors.
+
+The distinct values of the category columns are read with ``SELECT
+DISTINCT`` (a scan of the column's index, not of the table) and kept in a
+process-wide cache stamped with the change sequence number they were read
+at.  Every write to ``leads`` moves the sequence (see
+``db.LEAD_CHANGE_TRIGGERS``), so a rerun that already knows the current
+sequence gets the lists without touching the database.
+"""
+import threading
+from typing import Dict, List, Optional
+
+from sqlalchemy import select
+from sqlalchemy.orm.session import Session
+
+import perf
+from db import Lead, current_change_seq
+from utils import PRIORITA_VALUES, STAV_LEADU_VALUES
+
+OPTION_COLUMNS = ["stav_leadu", "priorita", "stav_projektu", "typ_dopytu", "mesto"]
+
+# always offered, even before any lead uses them
+DEFAULTS = {
+    "stav_leadu": STAV_LEADU_VALUES,
+    "priorita": PRIORITA_VALUES,
+}
+
+_lock = threading.Lock()
+# database url -> (seq, {column: sorted values})
+_cache: Dict[str, tuple] = {}
+
+
+def _read_distinct(SessionLocal) -> Dict[str, List[str]]:
+    session: Session = SessionLocal()
+    try:
+        values = {}
+        for col in OPTION_COLUMNS:
+            column = getattr(Lead, col)
+            rows = session.execute(select(column).where(column.isnot(None)).distinct()).scalars().all()
+            perf.count("rows_fetched", len(rows))
+            values[col] = sorted(v for v in rows if str(v).strip() != "")
+        return values
+    finally:
+        session.close()
+
+
+@perf.timed("options.distinct_values")
+def distinct_values(SessionLocal, seq: Optional[int] = None) -> Dict[str, List[str]]:
+    """Return ``{column: sorted non-blank values}`` for ``OPTION_COLUMNS``.
+
+    ``seq`` is the change sequence the caller has already read (e.g. the
+    one its lead frame is synced to); without it the current one is
+    queried.  Cached lists at least as new as ``seq`` are returned as is.
+    """
+    key = str(SessionLocal.kw["bind"].url)
+    if seq is None:
+        seq = current_change_seq(SessionLocal)
+    with _lock:
+        cached = _cache.get(key)
+    if cached is not None and cached[0] >= seq:
+        return cached[1]
+    # the sequence is read before the values, so a write in between only
+    # makes the stored stamp older than the data, never newer
+    fresh_seq = current_change_seq(SessionLocal)
+    values = _read_distinct(SessionLocal)
+    with _lock:
+        cached = _cache.get(key)
+        if cached is None or cached[0] < fresh_seq:
+            _cache[key] = (fresh_seq, values)
+    return values
+
+
+def filter_options(SessionLocal, seq: Optional[int] = None) -> Dict[str, List[str]]:
+    """Options of the filter panel: values in use, defaults only when none is."""
+    values = distinct_values(SessionLocal, seq)
+    return {
+        col: values[col] or DEFAULTS.get(col, [])
+        for col in ("stav_leadu", "priorita", "typ_dopytu", "mesto")
+    }
+
+
+def editor_options(SessionLocal, seq: Optional[int] = None) -> Dict[str, List[str]]:
+    """Values of the grid's ``agSelectCellEditor`` columns: values in use plus defaults."""
+    values = distinct_values(SessionLocal, seq)
+    return {
+        col: sorted(set(values[col]) | set(DEFAULTS.get(col, [])))
+        for col in ("stav_leadu", "priorita", "stav_projektu", "typ_dopytu")
+    }
+
@@ -1,91 +1,120 @@
 
 # -*- coding: utf-8 -*-
-import pandas as pd
-from datetime import date, datetime, timedelta
-import pytz
 import streamlit as st
-import plotly.express as px
 
-from db import get_engine_session, fetch_leads_df
+import perf
+import sqlprofile
+
+from db import get_engine_session, current_change_seq, fetch_leads_df, fetch_status_events
 from utils import slovak_tz_now_date, badges_counts
+import figcache
+import snapshot
+import stats
 
 st.set_page_config(page_title="REMARK CRM - Summary", page_icon="📈", layout="wide")
+perf.begin_run("summary")
 
 st.title("📈 Summary & Štatistiky")
 
+perf.section("summary.load")
 engine, SessionLocal = get_engine_session()
-df = fetch_leads_df(SessionLocal)
+# archived leads are part of the statistics; the shared snapshot is used
+# when no write happened since it was published
+seq = current_change_seq(SessionLocal)
+snap = snapshot.read(SessionLocal, "leads_all") if snapshot.SNAPSHOT_ENABLED else None
+if snap is not None and snap[0] >= seq:
+    df = snap[1]
+else:
+    df = fetch_leads_df(SessionLocal, include_archived=True)
+    snapshot.request_publish(SessionLocal)
 today = slovak_tz_now_date()
 
 if df.empty:
     st.info("Zatiaľ nemáme žiadne dáta.")
     st.stop()
 
+
+def _px():
+    # imported only when a chart is not in the figure cache (plotly.express
+    # is the heaviest import of the page)
+    import plotly.express as px
+    return px
+
+
+def chart(chart_id, build, params=()):
+    """Draw a chart from the figure cache, keyed by the data's change seq."""
+    st.plotly_chart(figcache.figure(SessionLocal, chart_id, params, seq, build), use_container_width=True)
+
+
+perf.section("summary.status")
 # --- Počty podľa stavu leadu + konverzná miera ---
 col1, col2 = st.columns([2,1])
 with col1:
-    counts_state = df["stav_leadu"].fillna("Neznáme").value_counts().reset_index()
-    counts_state.columns = ["stav_leadu", "počet"]
-    fig1 = px.bar(counts_state, x="stav_leadu", y="počet", title="Počty leadov podľa stavu", text="počet")
-    st.plotly_chart(fig1, use_container_width=True)
+    chart("summary.status", lambda: _px().bar(
+        stats.counts_by(df, "stav_leadu"), x="stav_leadu", y="počet", title="Počty leadov podľa stavu", text="počet"))
 with col2:
-    total = len(df)
-    converted = (df["stav_leadu"] == "Converted").sum()
-    conv_rate = (converted / total * 100) if total else 0
+    conv_rate = stats.conversion_rate(df)
     st.metric("Konverzná miera", f"{conv_rate:.1f}%",
               help="Podiel Converted zo všetkých leadov")
 
+perf.section("summary.priority")
 # --- Počty podľa priority ---
-counts_prio = df["priorita"].fillna("Neznáme").value_counts().reset_index()
-counts_prio.columns = ["priorita", "počet"]
-fig2 = px.pie(counts_prio, names="priorita", values="počet", title="Počty podľa priority", hole=0.35)
-st.plotly_chart(fig2, use_container_width=True)
+chart("summary.priority", lambda: _px().pie(
+    stats.counts_by(df, "priorita"), names="priorita", values="počet", title="Počty podľa priority", hole=0.35))
 
+perf.section("summary.typ_mesto")
 # --- Počty podľa typ_dopytu a mesto ---
 col3, col4 = st.columns(2)
 with col3:
-    counts_typ = df["typ_dopytu"].fillna("Neznáme").value_counts().reset_index()
-    counts_typ.columns = ["typ_dopytu", "počet"]
-    fig3 = px.bar(counts_typ, x="typ_dopytu", y="počet", title="Počty podľa typu dopytu", text="počet")
-    st.plotly_chart(fig3, use_container_width=True)
+    chart("summary.typ_dopytu", lambda: _px().bar(
+        stats.counts_by(df, "typ_dopytu"), x="typ_dopytu", y="počet", title="Počty podľa typu dopytu", text="počet"))
 with col4:
-    counts_city = df["mesto"].fillna("Neznáme").value_counts().reset_index()
-    counts_city.columns = ["mesto", "počet"]
-    fig4 = px.bar(counts_city, x="mesto", y="počet", title="Počty podľa mesta", text="počet")
-    st.plotly_chart(fig4, use_container_width=True)
+    chart("summary.mesto", lambda: _px().bar(
+        stats.counts_by(df, "mesto"), x="mesto", y="počet", title="Počty podľa mesta", text="počet"))
 
+perf.section("summary.days")
 # --- Priemerné dni od pôvodného kontaktu po realizáciu (len Converted) ---
-df_conv = df[df["stav_leadu"] == "Converted"].copy()
-if not df_conv.empty:
-    d1 = pd.to_datetime(df_conv["datum_povodneho_kontaktu"], errors="coerce")
-    d2 = pd.to_datetime(df_conv["datum_realizacie"], errors="coerce")
-    days = (d2 - d1).dt.days.dropna()
-    avg_days = days.mean() if not days.empty else 0
+avg_days = stats.avg_days_to_realization(df)
+if avg_days is not None:
     st.metric("Priemerné dni od kontaktu po realizáciu", f"{avg_days:.1f} dňa")
 else:
     st.info("Žiadne 'Converted' leady pre výpočet priemerných dní.")
 
+perf.section("summary.stage_durations")
+# --- Trvanie stavov z histórie leadov ---
+# events are written with the lead change that caused them, so the change
+# seq versions them; open stages last until now, hence the day
+stages = stats.stage_report((str(engine.url), seq, today), lambda: fetch_status_events(SessionLocal))
+if stages is not None:
+    col_s1, col_s2 = st.columns([2, 1])
+    with col_s1:
+        chart("summary.stage_durations", lambda: _px().bar(
+            stages["summary"], x="stav_leadu", y="priemer dní", text="počet",
+            title="Priemerná doba v stave (z histórie zmien)"),
+            params=(today,))
+    with col_s2:
+        open_to_conv = stages["open_to_converted"]
+        if not open_to_conv.empty:
+            st.metric("Open → Converted (priemer)", f"{open_to_conv.mean():.1f} dňa",
+                      help=f"Z histórie zmien, {len(open_to_conv)} leadov")
+        st.dataframe(stages["funnel"], hide_index=True, use_container_width=True)
+
 st.markdown("---")
 
+perf.section("summary.prices")
 # --- Porovnanie ponúk ---
-price_cols = ["nasa_ponuka_orientacna", "cena_konkurencie"]
-df_prices = df[price_cols].copy().dropna(how="all")
-if not df_prices.empty:
-    df_long = df_prices.melt(value_vars=price_cols, var_name="typ", value_name="cena").dropna()
-    df_long["typ"] = df_long["typ"].map({
-        "nasa_ponuka_orientacna": "Naša ponuka",
-        "cena_konkurencie": "Cena konkurencie"
-    })
+df_long = stats.prices_long(df)
+if not df_long.empty:
     col5, col6 = st.columns(2)
     with col5:
-        fig_box = px.box(df_long, x="typ", y="cena", points="all", title="Porovnanie: Naša ponuka vs. konkurencia (boxplot)")
-        st.plotly_chart(fig_box, use_container_width=True)
+        chart("summary.prices_box", lambda: _px().box(
+            df_long, x="typ", y="cena", points="all", title="Porovnanie: Naša ponuka vs. konkurencia (boxplot)"))
     with col6:
-        fig_strip = px.strip(df_long, x="typ", y="cena", title="Rozptyl cien (strip)")
-        st.plotly_chart(fig_strip, use_container_width=True)
+        chart("summary.prices_strip", lambda: _px().strip(df_long, x="typ", y="cena", title="Rozptyl cien (strip)"))
 else:
     st.info("Chýbajú údaje o cenách pre porovnanie.")
 
+perf.section("summary.badges")
 # --- Počet blížiacich sa krokov ---
 overdue, today_cnt, next7 = badges_counts(df, today)
 c7, c8, c9 = st.columns(3)
@@ -93,17 +122,17 @@ c7.metric("Po termíne", overdue)
 c8.metric("Dnes", today_cnt)
 c9.metric("Najbližších 7 dní", next7)
 
+perf.section("summary.trend")
 # --- Trend nových leadov ---
-df["dpc"] = pd.to_datetime(df["datum_povodneho_kontaktu"], errors="coerce")
-df_valid = df.dropna(subset=["dpc"]).copy()
-if not df_valid.empty:
+if df["datum_povodneho_kontaktu"].notna().any():
     period = st.radio("Zoskupiť podľa", ["Týždne","Mesiace"], horizontal=True, index=1)
-    if period == "Týždne":
-        df_valid["period"] = df_valid["dpc"].dt.to_period("W").dt.to_timestamp()
-    else:
-        df_valid["period"] = df_valid["dpc"].dt.to_period("M").dt.to_timestamp()
-    trend = df_valid.groupby("period").size().reset_index(name="počet")
-    fig_trend = px.line(trend, x="period", y="počet", markers=True, title="Trend nových leadov")
-    st.plotly_chart(fig_trend, use_container_width=True)
+    freq = "W" if period == "Týždne" else "M"
+    chart("summary.trend", lambda: _px().line(
+        stats.lead_trend(df, freq), x="period", y="počet", markers=True, title="Trend nových leadov"),
+        params=(freq,))
 else:
     st.info("Chýbajú dátumy pôvodného kontaktu pre zobrazenie trendu.")
+
+perf.render_panel(st)
+sqlprofile.render_panel(st)
+perf.end_run()
@@ -0,0 +1,186 @@
+# -*- coding: utf-8 -*-
+"""Lightweight per-rerun timing spans and counters.
+
+Enabled with ``REMARK_CRM_PERF=1``; ``REMARK_CRM_PERF_LOG=/path/perf.jsonl``
+additionally appends one JSON line per script run.  When disabled,
+:func:`timed` returns the function unchanged and :func:`span` returns a
+shared no-op object, so instrumented code pays only an attribute lookup.
+
+Streamlit executes every script run in its own thread, so the current run
+is kept in a ``threading.local``::
+
+    perf.begin_run("app")
+    perf.section("app.filters")     # top-level section, ends at the next one
+    with perf.span("app.grid"):
+        ...
+    perf.count("frame_copies")
+    perf.render_panel(st)   # sidebar expander
+    perf.end_run()
+"""
+import functools
+import json
+import os
+import threading
+import time
+from datetime import datetime, timezone
+
+ENABLED = os.environ.get("REMARK_CRM_PERF", "").lower() not in ("", "0", "false", "no")
+LOG_PATH = os.environ.get("REMARK_CRM_PERF_LOG")
+
+_local = threading.local()
+_log_lock = threading.Lock()
+
+
+class RunStats:
+    """Spans and counters collected during one script run."""
+
+    def __init__(self, page: str):
+        self.page = page
+        self.started = time.perf_counter()
+        self.spans = []  # (name, depth, ms)
+        self.counters = {}
+        self.depth = 0
+        self.open_section = None  # (span index, t0)
+
+    def close_section(self):
+        if self.open_section is not None:
+            index, t0 = self.open_section
+            name = self.spans[index][0]
+            self.spans[index] = (name, 0, (time.perf_counter() - t0) * 1000)
+            self.open_section = None
+            self.depth = 0
+
+    def as_dict(self):
+        return {
+            "ts": datetime.now(timezone.utc).isoformat(timespec="milliseconds"),
+            "page": self.page,
+            "total_ms": round((time.perf_counter() - self.started) * 1000, 2),
+            "spans": [{"name": n, "depth": d, "ms": round(ms, 2)} for n, d, ms in self.spans],
+            "counters": dict(self.counters),
+        }
+
+
+class _Span:
+    __slots__ = ("name", "run", "t0", "index")
+
+    def __init__(self, name):
+        self.name = name
+
+    def __enter__(self):
+        self.run = getattr(_local, "run", None)
+        if self.run is not None:
+            self.index = len(self.run.spans)
+            self.run.spans.append((self.name, self.run.depth, 0.0))
+            self.run.depth += 1
+        self.t0 = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        if self.run is not None:
+            ms = (time.perf_counter() - self.t0) * 1000
+            self.run.depth -= 1
+            self.run.spans[self.index] = (self.name, self.run.depth, ms)
+        return False
+
+
+class _NoopSpan:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NOOP = _NoopSpan()
+
+
+def begin_run(page: str) -> None:
+    if ENABLED:
+        _local.run = RunStats(page)
+
+
+def current():
+    """The :class:`RunStats` of the running script, or None."""
+    return getattr(_local, "run", None)
+
+
+def span(name: str):
+    """Context manager timing a block of the current run."""
+    return _Span(name) if ENABLED else _NOOP
+
+
+def section(name: str) -> None:
+    """Start a top-level section of the script, closing the previous one.
+
+    Lets a top-to-bottom Streamlit script be split into timed parts without
+    re-indenting it under ``with`` blocks.
+    """
+    if ENABLED:
+        run = getattr(_local, "run", None)
+        if run is not None:
+            run.close_section()
+            run.open_section = (len(run.spans), time.perf_counter())
+            run.spans.append((name, 0, 0.0))
+            run.depth = 1
+
+
+def count(name: str, n=1) -> None:
+    if ENABLED:
+        run = getattr(_local, "run", None)
+        if run is not None:
+            run.counters[name] = run.counters.get(name, 0) + n
+
+
+def timed(name=None):
+    """Decorator wrapping a function in a :func:`span` (no-op when disabled)."""
+    def decorate(fn):
+        if not ENABLED:
+            return fn
+        label = name or f"{fn.__module__}.{fn.__name__}"
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with _Span(label):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorate
+
+
+def install_sql_counter(engine) -> None:
+    """Count SQL statements executed on ``engine`` into the current run."""
+    if not ENABLED:
+        return
+    from sqlalchemy import event
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        count("sql_statements")
+
+
+def end_run() -> None:
+    """Finish the current run and append it to ``REMARK_CRM_PERF_LOG``."""
+    run = getattr(_local, "run", None)
+    if run is None:
+        return
+    _local.run = None
+    run.close_section()
+    if LOG_PATH:
+        line = json.dumps(run.as_dict(), ensure_ascii=False)
+        with _log_lock, open(LOG_PATH, "a", encoding="utf-8") as fh:
+            fh.write(line + "\n")
+
+
+def render_panel(st) -> None:
+    """Show spans and counters of the current run in the sidebar."""
+    run = getattr(_local, "run", None)
+    if run is None:
+        return
+    run.close_section()
+    data = run.as_dict()
+    with st.sidebar.expander(f"⏱️ Výkon: {data['total_ms']:.0f} ms", expanded=False):
+        for s in data["spans"]:
+            st.text(f"{'  ' * s['depth']}{s['name']}: {s['ms']:.1f} ms")
+        if data["counters"]:
+            st.json(data["counters"])
@@ -0,0 +1,188 @@
+# -*- coding: utf-8 -*-
+"""Lead score: how urgent it is to call a lead today.
+
+The score is stored in ``leads.score`` (indexed), so "who to call first"
+is ``ORDER BY score DESC LIMIT n`` (:func:`top_leads_to_call`) instead of
+a sort in the browser.  It adds up, for open leads:
+
+* priorita – ``PRIORITY_POINTS``,
+* the next step – ``OVERDUE_POINTS`` plus a point per day overdue (up to
+  ``OVERDUE_CAP_DAYS``), ``TODAY_POINTS`` when due today, up to
+  ``SOON_POINTS`` within ``SOON_DAYS`` days, ``NO_STEP_POINTS`` when no
+  step is planned,
+* the deal size – up to ``VALUE_POINTS`` on a log scale of
+  max(orientacna_cena, nasa_ponuka_orientacna),
+* the price gap – up to ±``GAP_POINTS`` when our offer is cheaper/dearer
+  than the competitor's,
+
+and multiplies the sum by ``STATE_WEIGHT`` of stav_leadu (Converted, Lost
+and unknown states score 0).  :func:`compute_scores` does this for whole
+arrays at once.
+
+A lead's score is written together with the lead: new leads get it just
+before they are flushed (:func:`score_objects`, ``db._before_flush``) and
+edits that touch a ``SCORE_COLUMNS`` column set it in the same UPDATE
+(:func:`score_change`), so a write logs one row in ``lead_changes``.  Just
+before a commit, the leads the transaction wrote are checked once more
+(``db._before_commit``) for writes that bypass both.
+
+Once a day the ``rescore`` maintenance task recomputes all leads, because
+the next-step points depend on the date.  It reads every lead, but only
+updates those whose rounded score moved – mostly leads with a step due
+within ``SOON_DAYS`` days or overdue – and each of them logs one ``U`` in
+``lead_changes``, which snapshots and saved views then re-read.
+"""
+from datetime import date
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+from sqlalchemy import select, update
+from sqlalchemy.orm.session import Session
+
+from db import Lead, run_write_chunks, _touch
+from utils import slovak_tz_now_date
+
+STATE_WEIGHT = {"Open": 1.0, "Cold": 0.5}
+PRIORITY_POINTS = {"Vysoká": 40.0, "Stredná": 20.0, "Nízka": 5.0}
+UNKNOWN_PRIORITY_POINTS = 10.0
+OVERDUE_POINTS = 25.0
+OVERDUE_CAP_DAYS = 30
+TODAY_POINTS = 30.0
+SOON_POINTS = 15.0
+SOON_DAYS = 7
+NO_STEP_POINTS = 10.0
+VALUE_POINTS = 20.0
+VALUE_FULL = 50_000.0  # deal size that gets all VALUE_POINTS
+GAP_POINTS = 10.0
+
+SCORE_COLUMNS = [
+    "id", "priorita", "stav_leadu", "datum_dalsieho_kroku",
+    "orientacna_cena", "nasa_ponuka_orientacna", "cena_konkurencie",
+]
+
+RESCORE_CHUNK = 2000
+# SQLite's limit of bound parameters in one IN (...)
+_IN_CHUNK = 500
+
+
+def _floats(values: Sequence[Any]) -> np.ndarray:
+    return np.array([np.nan if v is None else v for v in values], dtype=float)
+
+
+def compute_scores(rows: Dict[str, Sequence[Any]], today: date) -> np.ndarray:
+    """Scores for the columns ``rows`` (lists of equal length, keyed by
+    ``SCORE_COLUMNS`` names; dates as ``date`` or None)."""
+    weight = np.array([STATE_WEIGHT.get(s, 0.0) for s in rows["stav_leadu"]])
+    prio = np.array([PRIORITY_POINTS.get(p, UNKNOWN_PRIORITY_POINTS) for p in rows["priorita"]])
+
+    t = today.toordinal()
+    days = np.array([np.nan if d is None else d.toordinal() - t for d in rows["datum_dalsieho_kroku"]])
+    with np.errstate(invalid="ignore"):
+        urgency = np.select(
+            [np.isnan(days), days < 0, days == 0, days <= SOON_DAYS],
+            [
+                NO_STEP_POINTS,
+                OVERDUE_POINTS + np.minimum(-days, OVERDUE_CAP_DAYS),
+                TODAY_POINTS,
+                SOON_POINTS * (SOON_DAYS + 1 - days) / SOON_DAYS,
+            ],
+            default=0.0,
+        )
+
+    offer = _floats(rows["nasa_ponuka_orientacna"])
+    value = np.fmax(_floats(rows["orientacna_cena"]), offer)
+    value_pts = VALUE_POINTS * np.clip(np.log1p(np.nan_to_num(value) / 1000) / np.log1p(VALUE_FULL / 1000), 0, 1)
+
+    competitor = _floats(rows["cena_konkurencie"])
+    with np.errstate(invalid="ignore", divide="ignore"):
+        gap = (competitor - offer) / competitor
+    gap_pts = GAP_POINTS * np.clip(np.nan_to_num(gap, nan=0.0, posinf=0.0, neginf=0.0), -1, 1)
+
+    return np.round(weight * (prio + urgency + value_pts + gap_pts), 2)
+
+
+def score_objects(objs: Sequence[Lead], today: Optional[date] = None) -> None:
+    """Set ``score`` of ORM leads from their current attributes."""
+    if not objs:
+        return
+    columns = {c: [getattr(obj, c) for obj in objs] for c in SCORE_COLUMNS}
+    for obj, score in zip(objs, compute_scores(columns, today or slovak_tz_now_date())):
+        obj.score = float(score)
+
+
+def score_change(obj: Lead, changes: Dict[str, Any], today: Optional[date] = None) -> Dict[str, float]:
+    """``{"score": new}`` when writing ``changes`` to ``obj`` moves its
+    score, else ``{}``; meant for the values of the edit's UPDATE."""
+    return score_changes([(obj, changes)], today)[0]
+
+
+def score_changes(edits: Sequence[Tuple[Lead, Dict[str, Any]]],
+                  today: Optional[date] = None) -> List[Dict[str, float]]:
+    """:func:`score_change` for many ``(obj, changes)`` edits at once."""
+    result: List[Dict[str, float]] = [{} for _ in edits]
+    scored = [i for i, (_, changes) in enumerate(edits) if changes.keys() & set(SCORE_COLUMNS)]
+    if not scored:
+        return result
+    columns = {c: [edits[i][1][c] if c in edits[i][1] else getattr(edits[i][0], c) for i in scored]
+               for c in SCORE_COLUMNS}
+    for i, new in zip(scored, compute_scores(columns, today or slovak_tz_now_date())):
+        old = edits[i][0].score
+        if old is None or abs(old - new) > 0.005:
+            result[i] = {"score": float(new)}
+    return result
+
+
+def rescore_tx(session: Session, ids, today: Optional[date] = None) -> int:
+    """Recompute the score of leads ``ids``; returns how many changed.
+
+    Leads whose stored score already matches (to the rounding) are not
+    updated, so they log nothing in ``lead_changes``.
+    """
+    today = today or slovak_tz_now_date()
+    ids = sorted(set(ids) - session.info.get("scored_leads", set()))
+    cols = [getattr(Lead, c) for c in SCORE_COLUMNS]
+    changed: List[Dict[str, Any]] = []
+    for i in range(0, len(ids), _IN_CHUNK):
+        rows = session.execute(select(*cols, Lead.score).where(Lead.id.in_(ids[i:i + _IN_CHUNK]))).all()
+        if not rows:
+            continue
+        columns = dict(zip(SCORE_COLUMNS + ["score"], zip(*rows)))
+        scores = compute_scores(columns, today)
+        changed.extend(
+            {"id": rid, "score": float(new)}
+            for rid, old, new in zip(columns["id"], columns["score"], scores)
+            if old is None or abs(old - new) > 0.005
+        )
+    if changed:
+        # ORM bulk UPDATE by primary key: version and updated_at stay as they are
+        session.execute(update(Lead), changed)
+        _touch(session, [c["id"] for c in changed])
+    session.info.setdefault("scored_leads", set()).update(ids)
+    return len(changed)
+
+
+def rescore_all(SessionLocal, today: Optional[date] = None) -> int:
+    """Recompute every lead's score (the nightly run); returns how many changed."""
+    session: Session = SessionLocal()
+    try:
+        ids = [rid for (rid,) in session.execute(select(Lead.id).order_by(Lead.id))]
+    finally:
+        session.close()
+    today = today or slovak_tz_now_date()
+    return sum(run_write_chunks(SessionLocal, rescore_tx, ids, RESCORE_CHUNK, today=today))
+
+
+def top_leads_to_call(SessionLocal, n: int = 10) -> List[Dict[str, Any]]:
+    """The ``n`` open leads with the highest score (one scan of ``ix_leads_score``)."""
+    session: Session = SessionLocal()
+    try:
+        rows = session.execute(
+            select(Lead.id, Lead.meno_zakaznika, Lead.telefon, Lead.email, Lead.priorita, Lead.stav_leadu,
+                   Lead.dalsi_krok, Lead.datum_dalsieho_kroku, Lead.score)
+            .where(Lead.score > 0)
+            .order_by(Lead.score.desc())
+            .limit(n)
+        ).mappings().all()
+        return [dict(r) for r in rows]
+    finally:
+        session.close()
@@ -0,0 +1,244 @@
+# -*- coding: utf-8 -*-
+"""Arrow snapshots of the lead tables shared by all server processes.
+
+After writes the lead table (``leads``) and the statistics view
+(``leads_all``) are published as uncompressed Arrow IPC files next to the
+database, e.g. ``/data/remark_crm.leads.arrow``.  A file is written under a
+temporary name and moved into place with ``os.replace``, so readers see
+either the old or the new snapshot, never a partial one.  Its schema
+metadata carries the change sequence number it was read at.
+
+Readers memory-map the file: the string and number buffers of the frame
+point into the mapping instead of being copied (strings are read as the
+Arrow-backed string dtype on pandas 2 as well), so every session of a
+process shares one frame and the page cache is shared by all replicas on
+the host.  Changes committed after the snapshot's sequence are merged on
+top by the caller (``db.fetch_lead_changes``), exactly as for a frame
+read from SQL.
+
+``REMARK_CRM_SNAPSHOT=0`` turns snapshots off.  Usage from the command
+line::
+
+    python snapshot.py            # publish now (skipped when up to date)
+    python snapshot.py --force
+"""
+import argparse
+import logging
+import os
+import threading
+import time
+from typing import TYPE_CHECKING, Dict, Optional, Tuple
+
+import pyarrow as pa
+
+from db import Lead, commit_listeners, current_change_seq, fetch_leads_df
+
+if TYPE_CHECKING:
+    import pandas as pd
+
+log = logging.getLogger("remark_crm.snapshot")
+
+SNAPSHOT_ENABLED = os.environ.get("REMARK_CRM_SNAPSHOT", "1").lower() not in ("0", "false", "no")
+
+# snapshot name -> include archived leads (fetch_leads_df)
+TABLES = {"leads": False, "leads_all": True}
+
+# writes arriving within this window are covered by one publish
+PUBLISH_DELAY_S = 0.5
+
+SEQ_KEY = b"remark_crm.seq"
+# files written before a column was added to the model are ignored
+COLUMNS_KEY = b"remark_crm.columns"
+
+
+def _columns_stamp() -> bytes:
+    return ",".join(c.name for c in Lead.__table__.columns).encode()
+
+
+def _arrow_types(arrow_type):
+    """Keep string columns Arrow-backed (the ``str`` dtype of pandas 3), so
+    ``to_pandas`` wraps their buffers instead of building Python objects;
+    pandas 2 would otherwise default to ``object``."""
+    if not (pa.types.is_string(arrow_type) or pa.types.is_large_string(arrow_type)):
+        return None
+    import pandas as pd
+    try:
+        return pd.StringDtype("pyarrow", na_value=float("nan"))
+    except TypeError:  # pandas 2.2
+        return pd.StringDtype("pyarrow_numpy")
+
+
+def _stamp_seq(meta) -> int:
+    meta = meta or {}
+    if meta.get(COLUMNS_KEY) != _columns_stamp():
+        return -1
+    return int(meta.get(SEQ_KEY, b"-1"))
+
+
+def snapshot_path(SessionLocal, name: str) -> Optional[str]:
+    """Path of snapshot ``name`` next to the database file (None for in-memory DBs)."""
+    database = SessionLocal.kw["bind"].url.database
+    if not database or database == ":memory:":
+        return None
+    return f"{os.path.splitext(database)[0]}.{name}.arrow"
+
+
+def _file_seq(path: str) -> int:
+    """Sequence stamp of the snapshot at ``path``, -1 when there is none."""
+    try:
+        with pa.memory_map(path) as source:
+            return _stamp_seq(pa.ipc.open_file(source).schema.metadata)
+    except (FileNotFoundError, pa.ArrowInvalid):
+        return -1
+
+
+def publish(SessionLocal, force: bool = False) -> Dict[str, int]:
+    """Write the snapshots that are older than the current change sequence.
+
+    Returns ``{name: seq}`` of the files written.
+    """
+    # read before the rows: a write in between leaves the stamp older than
+    # the data, and readers merge those changes again (idempotent)
+    seq = current_change_seq(SessionLocal)
+    written = {}
+    for name, include_archived in TABLES.items():
+        path = snapshot_path(SessionLocal, name)
+        if path is None or (not force and _file_seq(path) >= seq):
+            continue
+        table = pa.Table.from_pandas(fetch_leads_df(SessionLocal, include_archived=include_archived),
+                                     preserve_index=False)
+        table = table.replace_schema_metadata({
+            **(table.schema.metadata or {}), SEQ_KEY: str(seq).encode(), COLUMNS_KEY: _columns_stamp(),
+        })
+        tmp = f"{path}.{os.getpid()}.tmp"
+        try:
+            with pa.OSFile(tmp, "wb") as sink, pa.ipc.new_file(sink, table.schema) as writer:
+                writer.write_table(table)
+            # another process may have published a newer one meanwhile
+            if not force and _file_seq(path) > seq:
+                os.remove(tmp)
+                continue
+            os.replace(tmp, path)
+        except BaseException:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+            raise
+        written[name] = seq
+    if written:
+        log.info("Snapshot %s publikovaný (seq %d)", ", ".join(written), seq)
+    return written
+
+
+# --- Reading ---
+
+_read_lock = threading.Lock()
+# path -> (file identity, seq, frame)
+_frames: Dict[str, Tuple[tuple, int, "pd.DataFrame"]] = {}
+
+
+def read(SessionLocal, name: str) -> Optional[Tuple[int, "pd.DataFrame"]]:
+    """Return ``(seq, frame)`` of snapshot ``name``, or None when there is none.
+
+    The frame is memory-mapped and shared by every caller in the process
+    until a newer file is published, so it must be treated as read-only.
+    """
+    path = snapshot_path(SessionLocal, name)
+    if path is None:
+        return None
+    try:
+        st = os.stat(path)
+    except FileNotFoundError:
+        return None
+    ident = (st.st_ino, st.st_mtime_ns, st.st_size)
+    with _read_lock:
+        cached = _frames.get(path)
+        if cached is not None and cached[0] == ident:
+            return cached[1], cached[2]
+        try:
+            table = pa.ipc.open_file(pa.memory_map(path)).read_all()
+        except (FileNotFoundError, pa.ArrowInvalid):
+            # replaced between stat and open; the next call picks it up
+            return None
+        seq = _stamp_seq(table.schema.metadata)
+        if seq < 0:
+            return None
+        frame = table.to_pandas(split_blocks=True, types_mapper=_arrow_types)
+        _frames[path] = (ident, seq, frame)
+        return seq, frame
+
+
+# --- Background publishing ---
+
+_state_lock = threading.Lock()
+_pending: Dict[str, object] = {}  # database url -> SessionLocal
+_failed = set()
+_worker: Optional[threading.Thread] = None
+_attached: Dict[str, object] = {}
+
+
+def _work():
+    global _worker
+    while True:
+        time.sleep(PUBLISH_DELAY_S)
+        with _state_lock:
+            if not _pending:
+                _worker = None
+                return
+            jobs = list(_pending.items())
+            _pending.clear()
+        for key, SessionLocal in jobs:
+            try:
+                publish(SessionLocal)
+            except Exception:
+                # e.g. a read-only data directory; readers fall back to SQL
+                log.exception("Publikovanie snapshotu zlyhalo, snapshoty sú v tomto procese vypnuté")
+                with _state_lock:
+                    _failed.add(key)
+
+
+def request_publish(SessionLocal) -> None:
+    """Publish the snapshots shortly, in a background thread of this process."""
+    global _worker
+    if not SNAPSHOT_ENABLED:
+        return
+    key = str(SessionLocal.kw["bind"].url)
+    with _state_lock:
+        if key in _failed:
+            return
+        _pending[key] = SessionLocal
+        if _worker is None:
+            _worker = threading.Thread(target=_work, name="remark-snapshot", daemon=True)
+            _worker.start()
+
+
+def _on_commit(session, ids) -> None:
+    SessionLocal = _attached.get(str(session.get_bind().url))
+    if SessionLocal is not None:
+        request_publish(SessionLocal)
+
+
+def attach(SessionLocal) -> None:
+    """Republish the snapshots after every write committed through ``SessionLocal``."""
+    if _on_commit not in commit_listeners:
+        commit_listeners.append(_on_commit)
+    _attached[str(SessionLocal.kw["bind"].url)] = SessionLocal
+
+
+def main(argv=None):
+    from db import get_engine_session, init_db
+
+    parser = argparse.ArgumentParser(description="Publikovanie Arrow snapshotov tabuľky leadov")
+    parser.add_argument("--force", action="store_true", help="zapísať aj keď je snapshot aktuálny")
+    args = parser.parse_args(argv)
+
+    engine, SessionLocal = get_engine_session()
+    init_db(engine)
+    written = publish(SessionLocal, force=args.force)
+    for name in TABLES:
+        path = snapshot_path(SessionLocal, name)
+        state = f"zapísaný (seq {written[name]})" if name in written else f"aktuálny (seq {_file_seq(path)})"
+        print(f"{path}: {state}")
+
+
+if __name__ == "__main__":
+    main()
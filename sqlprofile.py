@@ -0,0 +1,220 @@
+# -*- coding: utf-8 -*-
+"""Opt-in SQL statement profiler.
+
+Enabled with ``REMARK_CRM_SQLPROFILE=1``.  The profiler listens to the
+engine's ``before_cursor_execute``/``after_cursor_execute`` events and
+
+* aggregates statements by normalised shape (literals and ``IN`` lists
+  folded), with counts and latency percentiles,
+* flags N+1 patterns: the same shape executed ``REMARK_CRM_SQLPROFILE_NPLUS1``
+  (default 10) or more times within one unit of work (one connection
+  checkout, i.e. one session transaction),
+* logs statements slower than ``REMARK_CRM_SQLPROFILE_SLOW_MS`` (default 50)
+  together with their ``EXPLAIN QUERY PLAN``.
+
+``REMARK_CRM_SQLPROFILE_OUT=/path/report.json`` writes the report at exit;
+:func:`render_panel` shows it in the Streamlit sidebar.
+"""
+import atexit
+import json
+import logging
+import os
+import random
+import re
+import threading
+import time
+from collections import Counter, deque
+
+log = logging.getLogger("remark_crm.sql")
+
+ENABLED = os.environ.get("REMARK_CRM_SQLPROFILE", "").lower() not in ("", "0", "false", "no")
+SLOW_MS = float(os.environ.get("REMARK_CRM_SQLPROFILE_SLOW_MS", "50"))
+NPLUS1_THRESHOLD = int(os.environ.get("REMARK_CRM_SQLPROFILE_NPLUS1", "10"))
+OUT_PATH = os.environ.get("REMARK_CRM_SQLPROFILE_OUT")
+
+_WS = re.compile(r"\s+")
+_STRING = re.compile(r"'(?:[^']|'')*'")
+_NUMBER = re.compile(r"\b\d+(?:\.\d+)?\b")
+_IN_LIST = re.compile(r"\bIN\s*\((?:\s*\?\s*,)*\s*\?\s*\)", re.IGNORECASE)
+_POSTCOMPILE = re.compile(r"\(__\[POSTCOMPILE_\w+\]\)")
+_VALUES_LIST = re.compile(r"(VALUES\s*\([^()]*\))(?:\s*,\s*\([^()]*\))+", re.IGNORECASE)
+
+
+def normalize_sql(statement: str) -> str:
+    """Fold literals, ``IN`` lists and multi-row ``VALUES`` into one shape."""
+    s = _WS.sub(" ", statement).strip()
+    s = _STRING.sub("?", s)
+    s = _NUMBER.sub("?", s)
+    s = _POSTCOMPILE.sub("(?...)", s)
+    s = _IN_LIST.sub("IN (?...)", s)
+    s = _VALUES_LIST.sub(r"\1, ...", s)
+    return s
+
+
+def percentile(sorted_values, pct: float) -> float:
+    if not sorted_values:
+        return 0.0
+    k = (len(sorted_values) - 1) * pct / 100
+    lo = int(k)
+    hi = min(lo + 1, len(sorted_values) - 1)
+    return sorted_values[lo] + (sorted_values[hi] - sorted_values[lo]) * (k - lo)
+
+
+class ShapeStats:
+    """Count, total time and a bounded latency sample of one statement shape."""
+
+    SAMPLE_SIZE = 1000
+
+    def __init__(self):
+        self.count = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+        self.samples = []
+
+    def add(self, ms: float, rng: random.Random) -> None:
+        self.count += 1
+        self.total_ms += ms
+        self.max_ms = max(self.max_ms, ms)
+        if len(self.samples) < self.SAMPLE_SIZE:
+            self.samples.append(ms)
+        else:
+            # reservoir sampling keeps percentiles representative
+            j = rng.randrange(self.count)
+            if j < self.SAMPLE_SIZE:
+                self.samples[j] = ms
+
+
+class StatementProfiler:
+    def __init__(self, slow_ms: float = SLOW_MS, nplus1_threshold: int = NPLUS1_THRESHOLD):
+        self.slow_ms = slow_ms
+        self.nplus1_threshold = nplus1_threshold
+        self.shapes = {}
+        self.slow = deque(maxlen=100)
+        self.nplus1 = deque(maxlen=100)
+        self._lock = threading.Lock()
+        self._rng = random.Random(0)
+
+    # --- engine events ---
+
+    def attach(self, engine) -> None:
+        from sqlalchemy import event
+
+        event.listen(engine, "before_cursor_execute", self._before)
+        event.listen(engine, "after_cursor_execute", self._after)
+        event.listen(engine.pool, "checkout", self._checkout)
+        event.listen(engine.pool, "checkin", self._checkin)
+
+    def _checkout(self, dbapi_conn, record, proxy):
+        record.info["sqlprofile_uow"] = Counter()
+
+    def _checkin(self, dbapi_conn, record):
+        uow = record.info.pop("sqlprofile_uow", None)
+        if not uow:
+            return
+        for shape, n in uow.items():
+            if n >= self.nplus1_threshold:
+                with self._lock:
+                    self.nplus1.append({"shape": shape, "count": n, "ts": time.time()})
+                log.warning("N+1: %d× v jednej transakcii: %s", n, shape)
+
+    def _before(self, conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("sqlprofile_t0", []).append(time.perf_counter())
+
+    def _after(self, conn, cursor, statement, parameters, context, executemany):
+        starts = conn.info.get("sqlprofile_t0")
+        if not starts:
+            return
+        ms = (time.perf_counter() - starts.pop()) * 1000
+        shape = normalize_sql(statement)
+        with self._lock:
+            stats = self.shapes.get(shape)
+            if stats is None:
+                stats = self.shapes[shape] = ShapeStats()
+            stats.add(ms, self._rng)
+        uow = conn.info.get("sqlprofile_uow")
+        if uow is not None:
+            uow[shape] += 1
+        if ms >= self.slow_ms:
+            plan = None if executemany else self._explain(cursor, statement, parameters)
+            entry = {"ms": round(ms, 2), "shape": shape, "plan": plan, "ts": time.time()}
+            with self._lock:
+                self.slow.append(entry)
+            log.warning("Pomalý SQL (%.1f ms): %s\n%s", ms, shape, "\n".join(plan or []))
+
+    @staticmethod
+    def _explain(cursor, statement, parameters):
+        if not statement.lstrip().upper().startswith(("SELECT", "UPDATE", "DELETE", "WITH")):
+            return None
+        try:
+            plan_cursor = cursor.connection.cursor()
+            try:
+                plan_cursor.execute("EXPLAIN QUERY PLAN " + statement, parameters or ())
+                return [row[-1] for row in plan_cursor.fetchall()]
+            finally:
+                plan_cursor.close()
+        except Exception as e:  # the plan is diagnostics only
+            return [f"EXPLAIN zlyhal: {e}"]
+
+    # --- reporting ---
+
+    def report(self):
+        with self._lock:
+            shapes = [(shape, s.count, s.total_ms, s.max_ms, sorted(s.samples)) for shape, s in self.shapes.items()]
+            slow = list(self.slow)
+            nplus1 = list(self.nplus1)
+        statements = [
+            {
+                "shape": shape,
+                "count": count,
+                "total_ms": round(total, 2),
+                "p50_ms": round(percentile(samples, 50), 3),
+                "p95_ms": round(percentile(samples, 95), 3),
+                "p99_ms": round(percentile(samples, 99), 3),
+                "max_ms": round(max_ms, 2),
+            }
+            for shape, count, total, max_ms, samples in shapes
+        ]
+        statements.sort(key=lambda r: r["total_ms"], reverse=True)
+        return {"statements": statements, "slow": slow, "nplus1": nplus1}
+
+    def dump_json(self, path: str) -> None:
+        with open(path, "w", encoding="utf-8") as fh:
+            json.dump(self.report(), fh, indent=2, ensure_ascii=False)
+
+    def reset(self) -> None:
+        with self._lock:
+            self.shapes.clear()
+            self.slow.clear()
+            self.nplus1.clear()
+
+
+PROFILER = StatementProfiler()
+_attached = set()
+
+
+def maybe_attach(engine) -> None:
+    """Attach the global profiler to ``engine`` when profiling is enabled."""
+    if ENABLED and id(engine) not in _attached:
+        _attached.add(id(engine))
+        PROFILER.attach(engine)
+
+
+def render_panel(st, top: int = 10) -> None:
+    """Show the heaviest statement shapes and N+1 flags in the sidebar."""
+    if not ENABLED:
+        return
+    rep = PROFILER.report()
+    with st.sidebar.expander(f"🧮 SQL profil ({len(rep['statements'])} tvarov)", expanded=False):
+        for r in rep["statements"][:top]:
+            st.text(f"{r['count']}× Σ{r['total_ms']:.0f} ms p95 {r['p95_ms']:.1f} ms")
+            st.code(r["shape"], language="sql")
+        if rep["nplus1"]:
+            st.warning(f"N+1 vzory: {len(rep['nplus1'])}")
+            for r in list(rep["nplus1"])[-5:]:
+                st.text(f"{r['count']}× {r['shape'][:120]}")
+        if rep["slow"]:
+            st.caption(f"Pomalé príkazy (≥ {PROFILER.slow_ms:.0f} ms): {len(rep['slow'])}")
+
+
+if ENABLED and OUT_PATH:
+    atexit.register(PROFILER.dump_json, OUT_PATH)
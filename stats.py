@@ -0,0 +1,131 @@
+# -*- coding: utf-8 -*-
+"""Aggregations behind the Summary page.
+
+Kept free of Streamlit and Plotly so the benchmark suite can time them on
+synthetic data.
+"""
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, Optional
+
+import pandas as pd
+
+PRICE_LABELS = {
+    "nasa_ponuka_orientacna": "Naša ponuka",
+    "cena_konkurencie": "Cena konkurencie",
+}
+
+
+def counts_by(df: pd.DataFrame, col: str) -> pd.DataFrame:
+    """Lead counts per value of ``col`` (missing values as "Neznáme")."""
+    counts = df[col].fillna("Neznáme").value_counts().reset_index()
+    counts.columns = [col, "počet"]
+    return counts
+
+
+def conversion_rate(df: pd.DataFrame) -> float:
+    """Share of Converted leads in percent."""
+    total = len(df)
+    converted = (df["stav_leadu"] == "Converted").sum()
+    return (converted / total * 100) if total else 0
+
+
+def avg_days_to_realization(df: pd.DataFrame):
+    """Average days from first contact to realisation of Converted leads,
+    or None when there are no Converted leads."""
+    df_conv = df[df["stav_leadu"] == "Converted"]
+    if df_conv.empty:
+        return None
+    d1 = pd.to_datetime(df_conv["datum_povodneho_kontaktu"], errors="coerce")
+    d2 = pd.to_datetime(df_conv["datum_realizacie"], errors="coerce")
+    days = (d2 - d1).dt.days.dropna()
+    return days.mean() if not days.empty else 0
+
+
+def prices_long(df: pd.DataFrame) -> pd.DataFrame:
+    """Our offer vs. competitor price in long format (``typ``, ``cena``)."""
+    price_cols = list(PRICE_LABELS)
+    df_prices = df[price_cols].dropna(how="all")
+    if df_prices.empty:
+        return pd.DataFrame(columns=["typ", "cena"])
+    df_long = df_prices.melt(value_vars=price_cols, var_name="typ", value_name="cena").dropna()
+    df_long["typ"] = df_long["typ"].map(PRICE_LABELS)
+    return df_long
+
+
+def lead_trend(df: pd.DataFrame, period: str = "M") -> pd.DataFrame:
+    """New leads per week (``"W"``) or month (``"M"``) of first contact."""
+    dpc = pd.to_datetime(df["datum_povodneho_kontaktu"], errors="coerce").dropna()
+    if dpc.empty:
+        return pd.DataFrame(columns=["period", "počet"])
+    periods = dpc.dt.to_period(period).dt.to_timestamp()
+    return periods.groupby(periods).size().rename_axis("period").reset_index(name="počet")
+
+
+def stage_durations(events: pd.DataFrame, now=None) -> pd.DataFrame:
+    """Per status event the days until the next status change of the lead.
+
+    ``events`` are ``stav_leadu`` events ordered by (lead_id, ts) as returned
+    by :func:`db.fetch_status_events`; the current status lasts until ``now``.
+    """
+    if now is None:
+        now = pd.Timestamp.now(tz="UTC").tz_localize(None)
+    ev = events.copy()
+    ev["koniec"] = ev.groupby("lead_id")["ts"].shift(-1).fillna(now)
+    ev["dni"] = (ev["koniec"] - ev["ts"]).dt.total_seconds() / 86400
+    ev["stav_leadu"] = ev["new_value"].fillna("Neznáme")
+    return ev
+
+
+def stage_summary(ev: pd.DataFrame) -> pd.DataFrame:
+    """Mean/median days and count per status from :func:`stage_durations`."""
+    summary = ev.groupby("stav_leadu")["dni"].agg(["mean", "median", "count"]).reset_index()
+    summary.columns = ["stav_leadu", "priemer dní", "medián dní", "počet"]
+    return summary
+
+
+def open_to_converted_days(ev: pd.DataFrame) -> pd.Series:
+    """Days from the first Open to the first Converted event per lead."""
+    first_open = ev[ev["new_value"] == "Open"].groupby("lead_id")["ts"].min()
+    first_conv = ev[ev["new_value"] == "Converted"].groupby("lead_id")["ts"].min()
+    days = (first_conv - first_open).dropna().dt.total_seconds() / 86400
+    return days[days >= 0]
+
+
+def funnel_counts(ev: pd.DataFrame) -> pd.DataFrame:
+    """Number of distinct leads that ever reached each status."""
+    return ev.groupby("stav_leadu")["lead_id"].nunique().rename("leadov").reset_index()
+
+
+_stage_lock = threading.Lock()
+# key -> stage report; a few keys, since sessions of one process share the data version
+_stage_cache: "OrderedDict[Hashable, Optional[Dict[str, Any]]]" = OrderedDict()
+STAGE_CACHE_SIZE = 8
+
+
+def stage_report(key: Hashable, load_events: Callable[[], pd.DataFrame]) -> Optional[Dict[str, Any]]:
+    """:func:`stage_summary`, :func:`open_to_converted_days` and
+    :func:`funnel_counts` of the events ``load_events()`` returns (None when
+    there are none), computed once per ``key``.
+
+    The key has to change with the events, e.g. ``(database url, change
+    sequence number, day)``; the returned frames are shared, read-only.
+    """
+    with _stage_lock:
+        if key in _stage_cache:
+            _stage_cache.move_to_end(key)
+            return _stage_cache[key]
+    events = load_events()
+    report = None
+    if not events.empty:
+        ev = stage_durations(events)
+        report = {
+            "summary": stage_summary(ev),
+            "open_to_converted": open_to_converted_days(ev),
+            "funnel": funnel_counts(ev),
+        }
+    with _stage_lock:
+        _stage_cache[key] = report
+        while len(_stage_cache) > STAGE_CACHE_SIZE:
+            _stage_cache.popitem(last=False)
+    return report
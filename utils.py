@@ -1,14 +1,19 @@
 # -*- coding: utf-8 -*-
 from datetime import datetime, date
-import pandas as pd
-import numpy as np
-import pytz
+from typing import TYPE_CHECKING
+import math
 import re
 from unidecode import unidecode
 
+# pandas is imported inside the helpers that need it, so db.py and the CLI
+# tools (backup, maintenance, export) start without it
+if TYPE_CHECKING:
+    import pandas as pd
+
 TZ = "Europe/Bratislava"
 
 def slovak_tz_now_date() -> date:
+    import pytz
     return datetime.now(pytz.timezone(TZ)).date()
 
 def normalize_text_basic(s: str) -> str:
@@ -16,7 +21,7 @@ def normalize_text_basic(s: str) -> str:
         return ""
     return unidecode(str(s)).strip().lower()
 
-def normalize_columns_generic(df: pd.DataFrame, aliases: dict) -> pd.DataFrame:
+def normalize_columns_generic(df: "pd.DataFrame", aliases: dict) -> "pd.DataFrame":
     """Lowercase, remove accents, map via aliases to target names."""
     new_cols = []
     for c in df.columns:
@@ -31,11 +36,21 @@ def normalize_columns_generic(df: pd.DataFrame, aliases: dict) -> pd.DataFrame:
     df.columns = new_cols
     return df
 
-def normalize_df_columns(df: pd.DataFrame) -> pd.DataFrame:
+def normalize_df_columns(df: "pd.DataFrame") -> "pd.DataFrame":
     df = df.copy()
     df.columns = [re.sub(r"\s+", "_", normalize_text_basic(c)) for c in df.columns]
     return df
 
+def is_missing(val) -> bool:
+    """True for None, "", NaN, NaT and pd.NA (without importing pandas)."""
+    if val is None:
+        return True
+    if isinstance(val, str):
+        return val in ("", "NaT", "nat")
+    if isinstance(val, float):
+        return val != val
+    return type(val).__name__ in ("NaTType", "NAType")
+
 def parse_date_safe(val):
     """Parse input into a ``date`` or return ``None``.
 
@@ -46,18 +61,27 @@ def parse_date_safe(val):
     process robust we explicitly treat any "not a time"/"not a number" values
     as ``None`` before attempting the conversion.
     """
-    if val in [None, "", "NaT", "nat"] or pd.isna(val):
+    if is_missing(val):
         return None
+    if isinstance(val, datetime):  # also pd.Timestamp
+        return val.date()
     if isinstance(val, date):
         return val
+    if isinstance(val, str):
+        try:
+            return datetime.fromisoformat(val.strip()).date()
+        except ValueError:
+            pass
+    import pandas as pd
     try:
         dt = pd.to_datetime(val, errors="coerce")
         return None if pd.isna(dt) else dt.date()
     except Exception:
         return None
 
-def clean_dataframe_for_db(df: pd.DataFrame, ordered_cols) -> pd.DataFrame:
+def clean_dataframe_for_db(df: "pd.DataFrame", ordered_cols) -> "pd.DataFrame":
     """Ensure only DB columns, cast numeric and date fields."""
+    import pandas as pd
     df = df.copy()
     # keep only known columns
     keep = [c for c in ordered_cols if c in df.columns]
@@ -73,6 +97,7 @@ def clean_dataframe_for_db(df: pd.DataFrame, ordered_cols) -> pd.DataFrame:
     return df
 
 def badges_counts(df, today):
+    import pandas as pd
     d = pd.to_datetime(df["datum_dalsieho_kroku"], errors="coerce")
     # Uistíme sa, že today je pandas Timestamp
     today_ts = pd.to_datetime(today)
@@ -81,19 +106,58 @@ def badges_counts(df, today):
     next7 = (d.notna() & (d > today_ts) & (d <= today_ts + pd.Timedelta(days=7))).sum()
     return overdue, today_cnt, next7
 
-def categories_from_db(df: pd.DataFrame):
-    def uniq(col):
-        return sorted([x for x in df.get(col, pd.Series(dtype=object)).dropna().unique().tolist() if str(x).strip() != "" ])
-    return {
-        "stav_leadu": uniq("stav_leadu") or ["Open","Cold","Converted","Lost"],
-        "priorita": uniq("priorita") or ["Vysoká","Stredná","Nízka"],
-        "typ_dopytu": uniq("typ_dopytu"),
-        "mesto": uniq("mesto"),
-    }
-
-def unique_sorted(values):
-    try:
-        vals = [v for v in values if v is not None and str(v).strip() != ""]
-        return sorted(list(dict.fromkeys(vals)))
-    except Exception:
-        return []
+
+# Human column headers used by exports and validation messages; they map back
+# through db.COLUMN_ALIASES, so an exported file can be imported again.
+EXPORT_HEADERS = {
+    "meno_zakaznika": "Meno zákazníka",
+    "telefon": "Telefón",
+    "email": "Email",
+    "mesto": "Mesto",
+    "typ_dopytu": "Typ dopytu",
+    "datum_povodneho_kontaktu": "Dátum pôvodného kontaktu",
+    "stav_projektu": "Stav projektu",
+    "konkurencia": "Kto je konkurencia",
+    "cena_konkurencie": "Cena konkurencie",
+    "nasa_ponuka_orientacna": "Naša ponuka (orientačná)",
+    "reakcia_zakaznika": "Reakcia zákazníka",
+    "dalsi_krok": "Dohodnutý ďalší krok",
+    "datum_dalsieho_kroku": "Dátum ďalšieho kroku",
+    "priorita": "Priorita",
+    "stav_leadu": "Stav leadu",
+    "orientacna_cena": "Orientačná cena (€)",
+    "datum_realizacie": "Dátum realizácie",
+    "poznamky": "Poznámky",
+}
+
+STAV_LEADU_VALUES = ["Open", "Cold", "Converted", "Lost"]
+PRIORITA_VALUES = ["Vysoká", "Stredná", "Nízka"]
+
+def validate_new_lead(payload: dict) -> list:
+    """Rules of the "Nový lead" dialog (also used by the ingest service).
+
+    Returns the error messages; an empty list means the lead can be saved.
+    """
+    def text(key):
+        return str(payload.get(key) or "").strip()
+
+    errors = []
+    if not text("meno_zakaznika"):
+        errors.append("Meno zákazníka je povinné.")
+    if not text("telefon") and not text("email"):
+        errors.append("Uveďte telefón alebo email.")
+    if not payload.get("datum_povodneho_kontaktu"):
+        errors.append("Dátum pôvodného kontaktu je povinný.")
+    if payload.get("priorita") not in (None, "", *PRIORITA_VALUES):
+        errors.append(f"Priorita musí byť jedna z: {', '.join(PRIORITA_VALUES)}.")
+    if payload.get("stav_leadu") not in (None, "", *STAV_LEADU_VALUES):
+        errors.append(f"Stav leadu musí byť jeden z: {', '.join(STAV_LEADU_VALUES)}.")
+    for key in ("cena_konkurencie", "nasa_ponuka_orientacna", "orientacna_cena"):
+        value = payload.get(key)
+        if value is None:
+            continue
+        if not math.isfinite(value):
+            errors.append(f"{EXPORT_HEADERS[key]} musí byť konečné číslo.")
+        elif value < 0:
+            errors.append(f"{EXPORT_HEADERS[key]} nesmie byť záporná.")
+    return errors
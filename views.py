@@ -0,0 +1,193 @@
+# -*- coding: utf-8 -*-
+"""Saved views: named filter + full-text + sort combinations of the grid.
+
+A view is a row of ``saved_views``.  The ids of the leads it matches are
+read with the SQL condition of the export (:func:`export.lead_filter`) and
+kept in a process-wide cache stamped with the change sequence number they
+were read at.  When the sequence moves, only the leads logged in
+``lead_changes`` since the stamp are checked again, so opening a view is
+an id lookup in the session's lead frame instead of filtering it::
+
+    view = views.get_view(SessionLocal, view_id)
+    ids = views.view_ids(SessionLocal, view, st.session_state["leads_seq"])
+    df = df_all[df_all["id"].isin(ids)]
+
+The sort is stored with the view and applied by the grid.
+"""
+import json
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, FrozenSet, List, Optional, Sequence, Tuple
+
+from sqlalchemy import func, select
+from sqlalchemy.orm.session import Session
+
+import perf
+from db import Lead, LeadChange, SavedView, _utcnow, current_change_seq, run_write
+from export import lead_filter
+
+FILTER_COLUMNS = ["stav_leadu", "priorita", "typ_dopytu", "mesto"]
+SORT_DIRECTIONS = ("asc", "desc")
+
+# more changed leads than this are cheaper to re-run the whole filter for
+INCREMENTAL_LIMIT = 5000
+# SQLite's limit of bound parameters in one IN (...)
+_IN_CHUNK = 500
+
+
+def _row_to_dict(row: SavedView) -> Dict[str, Any]:
+    return {
+        "id": row.id,
+        "name": row.name,
+        "filters": json.loads(row.filters or "{}"),
+        "search": row.search or "",
+        "sort": [tuple(s) for s in json.loads(row.sort or "[]")],
+        "updated_at": row.updated_at,
+    }
+
+
+def list_views(SessionLocal) -> List[Dict[str, Any]]:
+    """All saved views ordered by name."""
+    session: Session = SessionLocal()
+    try:
+        return [_row_to_dict(r) for r in session.query(SavedView).order_by(SavedView.name)]
+    finally:
+        session.close()
+
+
+def get_view(SessionLocal, view_id: int) -> Optional[Dict[str, Any]]:
+    session: Session = SessionLocal()
+    try:
+        row = session.get(SavedView, int(view_id))
+        return _row_to_dict(row) if row is not None else None
+    finally:
+        session.close()
+
+
+def normalize_definition(filters: Dict[str, Sequence[str]], search: Optional[str],
+                         sort: Sequence[Sequence[str]] = ()) -> Tuple[Dict[str, List[str]], str, List[tuple]]:
+    """Canonical ``(filters, search, sort)``: known columns only, sorted
+    values, no empty lists, stripped search text."""
+    filters = {col: sorted(filters[col]) for col in FILTER_COLUMNS if filters.get(col)}
+    sort = [(col, direction) for col, direction in sort if col in Lead.__table__.columns and direction in SORT_DIRECTIONS]
+    return filters, (search or "").strip(), sort
+
+
+def save_view(SessionLocal, name: str, filters: Dict[str, Sequence[str]], search: Optional[str] = None,
+              sort: Sequence[Sequence[str]] = ()) -> int:
+    """Create the view ``name`` or redefine it when it exists; returns its id."""
+    name = (name or "").strip()
+    if not name:
+        raise ValueError("Pohľad musí mať názov.")
+    return run_write(SessionLocal, save_view_tx, name, *normalize_definition(filters, search, sort))
+
+
+def save_view_tx(session: Session, name: str, filters: Dict[str, List[str]], search: str,
+                 sort: List[tuple]) -> int:
+    row = session.query(SavedView).filter(SavedView.name == name).one_or_none()
+    if row is None:
+        row = SavedView(name=name)
+        session.add(row)
+    row.filters = json.dumps(filters, ensure_ascii=False)
+    row.search = search or None
+    row.sort = json.dumps(sort)
+    row.updated_at = _utcnow()
+    session.flush()
+    return row.id
+
+
+def delete_view(SessionLocal, view_id: int) -> int:
+    removed = run_write(SessionLocal, delete_view_tx, int(view_id))
+    with _lock:
+        for key in [k for k in _cache if k[1] == int(view_id)]:
+            del _cache[key]
+    return removed
+
+
+def delete_view_tx(session: Session, view_id: int) -> int:
+    return session.query(SavedView).filter(SavedView.id == view_id).delete(synchronize_session=False)
+
+
+def matches_view(view: Dict[str, Any], filters: Dict[str, Sequence[str]], search: Optional[str],
+                 sort: Sequence[Sequence[str]] = ()) -> bool:
+    """Whether the panel's current state is exactly ``view``'s definition."""
+    return normalize_definition(filters, search, sort) == (view["filters"], view["search"], view["sort"])
+
+
+# --- Cached id sets ---
+
+_lock = threading.Lock()
+# (database url, view id) -> (definition stamp, seq, ids)
+_cache: "OrderedDict[tuple, Tuple[Any, int, FrozenSet[int]]]" = OrderedDict()
+_CACHE_SIZE = 256
+
+
+def _condition(view: Dict[str, Any]):
+    f = view["filters"]
+    return lead_filter(*(f.get(col, ()) for col in FILTER_COLUMNS), view["search"])
+
+
+def _all_ids(session: Session, view: Dict[str, Any]) -> FrozenSet[int]:
+    ids = frozenset(session.execute(select(Lead.id).where(_condition(view))).scalars())
+    perf.count("rows_fetched", len(ids))
+    return ids
+
+
+def _changed_since(session: Session, since_seq: int, seq: int) -> Optional[List[int]]:
+    """Leads logged between ``since_seq`` and ``seq``; None when the log
+    was pruned past ``since_seq`` or they are too many to check one by one."""
+    oldest = session.query(func.min(LeadChange.seq)).scalar()
+    if oldest is None or oldest > since_seq + 1:
+        return None
+    ids = [rid for (rid,) in session.query(LeadChange.lead_id)
+           .filter(LeadChange.seq > since_seq, LeadChange.seq <= seq).distinct()]
+    return ids if len(ids) <= INCREMENTAL_LIMIT else None
+
+
+@perf.timed("views.view_ids")
+def view_ids(SessionLocal, view: Dict[str, Any], seq: Optional[int] = None) -> FrozenSet[int]:
+    """Ids of the leads matching ``view``.
+
+    ``seq`` is the change sequence the caller has already read (e.g. the
+    one its lead frame is synced to); cached ids at least as new are
+    returned as is.  Older ones are brought up to date through the change
+    log, or read again when it no longer reaches back far enough.
+    """
+    key = (str(SessionLocal.kw["bind"].url), view["id"])
+    stamp = view["updated_at"]
+    if seq is None:
+        seq = current_change_seq(SessionLocal)
+    with _lock:
+        cached = _cache.get(key)
+        if cached is not None and cached[0] == stamp and cached[1] >= seq:
+            _cache.move_to_end(key)
+            perf.count("view_cache_hits")
+            return cached[2]
+    session: Session = SessionLocal()
+    try:
+        # the sequence is read before the rows, so a write in between only
+        # makes the stored stamp older than the data, never newer
+        fresh_seq = session.query(func.max(LeadChange.seq)).scalar() or 0
+        changed = None
+        if cached is not None and cached[0] == stamp:
+            changed = _changed_since(session, cached[1], fresh_seq)
+        if changed is None:
+            ids = _all_ids(session, view)
+        else:
+            matching = set()
+            cond = _condition(view)
+            for i in range(0, len(changed), _IN_CHUNK):
+                chunk = changed[i:i + _IN_CHUNK]
+                matching.update(session.execute(select(Lead.id).where(Lead.id.in_(chunk), cond)).scalars())
+            ids = frozenset((cached[2] - set(changed)) | matching)
+            perf.count("view_incremental_checks", len(changed))
+    finally:
+        session.close()
+    with _lock:
+        current = _cache.get(key)
+        if current is None or current[0] != stamp or current[1] < fresh_seq:
+            _cache[key] = (stamp, fresh_seq, ids)
+            _cache.move_to_end(key)
+            while len(_cache) > _CACHE_SIZE:
+                _cache.popitem(last=False)
+    return ids
@@ -0,0 +1,181 @@
+# -*- coding: utf-8 -*-
+"""Serialized writes with group commit.
+
+SQLite allows one writer at a time.  Instead of every Streamlit script
+thread opening its own write transaction and waiting for the file lock,
+writes are handed to a single writer thread per database::
+
+    coordinator = get_coordinator(SessionLocal)
+    n = coordinator.call(update_leads_bulk_tx, updates)        # waits
+    fut = coordinator.submit(insert_lead_tx, payload)          # Future
+    futs = coordinator.submit_chunks(insert_leads_tx, payloads, 200)
+
+A job is ``fn(session, *args, **kwargs)``; it must not commit.  The writer
+takes whatever interactive jobs are queued and runs them in one transaction
+(group commit).  If any job of a group raises, the group is rolled back and
+its jobs are re-run one transaction each, so a failing job only fails its
+own future.
+
+Bulk work (imports, archiving) is queued in chunks at ``BULK`` priority.
+Queued interactive jobs always run first and a group contains at most one
+bulk chunk, so a large import never holds up an inline edit for longer
+than one chunk.
+"""
+import itertools
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from typing import Any, Callable, Dict, List
+
+INTERACTIVE = 0
+BULK = 1
+_STOP = 9
+
+MAX_GROUP = 64
+IDLE_EXIT_S = 60.0
+
+
+class _Job:
+    __slots__ = ("fn", "args", "kwargs", "priority", "future", "queued")
+
+    def __init__(self, fn, args, kwargs, priority):
+        self.fn = fn
+        self.args = args
+        self.kwargs = kwargs
+        self.priority = priority
+        self.future = Future()
+        self.queued = time.perf_counter()
+
+
+class WriteCoordinator:
+    """Single writer thread executing queued jobs in group commits.
+
+    The thread is started on the first submit and exits after
+    ``idle_exit_s`` without work, so idle databases cost no thread.
+    """
+
+    def __init__(self, SessionLocal, max_group: int = MAX_GROUP, idle_exit_s: float = IDLE_EXIT_S):
+        self._SessionLocal = SessionLocal
+        self.max_group = max_group
+        self.idle_exit_s = idle_exit_s
+        self._queue = queue.PriorityQueue()
+        self._seq = itertools.count()
+        self._lock = threading.Lock()
+        self._thread = None
+        self.stats = {"jobs": 0, "groups": 0, "retries": 0, "max_group": 0, "max_wait_ms": 0.0}
+
+    # --- submitting ---
+
+    def submit(self, fn: Callable, *args, priority: int = INTERACTIVE, **kwargs) -> Future:
+        """Queue ``fn(session, *args, **kwargs)`` and return its Future."""
+        job = _Job(fn, args, kwargs, priority)
+        if threading.current_thread() is self._thread:
+            raise RuntimeError("write job submitted from the writer thread")
+        with self._lock:
+            self._queue.put((priority, next(self._seq), job))
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="remark-writer", daemon=True)
+                self._thread.start()
+        return job.future
+
+    def call(self, fn: Callable, *args, priority: int = INTERACTIVE, **kwargs) -> Any:
+        """Run ``fn`` through the queue and wait for its result."""
+        return self.submit(fn, *args, priority=priority, **kwargs).result()
+
+    def submit_chunks(self, fn: Callable, items: List[Any], chunk_size: int, *args, **kwargs) -> List[Future]:
+        """Queue ``fn(session, chunk, *args, **kwargs)`` per chunk of ``items`` at BULK priority."""
+        return [
+            self.submit(fn, items[i:i + chunk_size], *args, priority=BULK, **kwargs)
+            for i in range(0, len(items), chunk_size)
+        ]
+
+    def stop(self, timeout: float = None) -> None:
+        """Let queued jobs finish and stop the writer thread."""
+        with self._lock:
+            thread = self._thread
+            if thread is None:
+                return
+            self._queue.put((_STOP, next(self._seq), None))
+        thread.join(timeout)
+
+    # --- writer thread ---
+
+    def _run(self):
+        while True:
+            try:
+                _, _, job = self._queue.get(timeout=self.idle_exit_s)
+            except queue.Empty:
+                with self._lock:
+                    if self._queue.empty():
+                        self._thread = None
+                        return
+                continue
+            if job is None:
+                with self._lock:
+                    self._thread = None
+                return
+            group = [job]
+            while len(group) < self.max_group and group[-1].priority == INTERACTIVE:
+                try:
+                    _, _, nxt = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if nxt is None:
+                    # keep the stop marker behind the jobs still queued
+                    self._queue.put((_STOP, next(self._seq), None))
+                    break
+                group.append(nxt)
+            group = [j for j in group if j.future.set_running_or_notify_cancel()]
+            if group:
+                self._note_group(group)
+                self._execute(group)
+
+    def _note_group(self, group):
+        now = time.perf_counter()
+        stats = self.stats
+        stats["jobs"] += len(group)
+        stats["groups"] += 1
+        stats["max_group"] = max(stats["max_group"], len(group))
+        stats["max_wait_ms"] = max(stats["max_wait_ms"], max((now - j.queued) * 1000 for j in group))
+
+    def _execute(self, group):
+        session = self._SessionLocal()
+        error = None
+        try:
+            results = []
+            for job in group:
+                results.append(job.fn(session, *job.args, **job.kwargs))
+                # the next job must see rows as stored, not objects this job
+                # loaded before its UPDATE statements
+                session.flush()
+                session.expire_all()
+            session.commit()
+        except BaseException as exc:
+            session.rollback()
+            error = exc
+        finally:
+            session.close()
+        if error is None:
+            for job, result in zip(group, results):
+                job.future.set_result(result)
+        elif len(group) == 1:
+            group[0].future.set_exception(error)
+        else:
+            self.stats["retries"] += 1
+            for job in group:
+                self._execute([job])
+
+
+_coordinators: Dict[str, WriteCoordinator] = {}
+_registry_lock = threading.Lock()
+
+
+def get_coordinator(SessionLocal) -> WriteCoordinator:
+    """Return the process-wide coordinator for the database of ``SessionLocal``."""
+    key = str(SessionLocal.kw["bind"].url)
+    with _registry_lock:
+        coordinator = _coordinators.get(key)
+        if coordinator is None:
+            coordinator = _coordinators[key] = WriteCoordinator(SessionLocal)
+        return coordinator